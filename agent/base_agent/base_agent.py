@@ -83,7 +83,13 @@ class DeepSeekChatOpenAI(ChatOpenAI):
 
 from prompts.agent_prompt import STOP_SIGNAL, get_agent_system_prompt
 from tools.general_tools import (extract_conversation, extract_tool_messages,
-                                 get_config_value, write_config_value)
+                                 get_config_value, update_config,
+                                 write_config_value)
+from tools.inprocess_tools import load_agent_tools
+from tools.mcp_context import runtime_env_path, set_context_headers
+from tools.mcp_transport import mcp_connection
+from tools.position_ledger import (flush_position_ledgers, format_positions,
+                                   get_position_ledger)
 from tools.price_tools import add_no_trade_record
 
 # Load environment variables
@@ -291,24 +297,12 @@ class BaseAgent:
         self.position_file = os.path.join(self.data_path, "position", "position.jsonl")
 
     def _get_default_mcp_config(self) -> Dict[str, Dict[str, Any]]:
-        """Get default MCP configuration"""
+        """Get default MCP configuration (TCP or Unix socket, see MCP_TRANSPORT)"""
         return {
-            "math": {
-                "transport": "streamable_http",
-                "url": f"http://localhost:{os.getenv('MATH_HTTP_PORT', '8000')}/mcp",
-            },
-            "stock_local": {
-                "transport": "streamable_http",
-                "url": f"http://localhost:{os.getenv('GETPRICE_HTTP_PORT', '8003')}/mcp",
-            },
-            "search": {
-                "transport": "streamable_http",
-                "url": f"http://localhost:{os.getenv('SEARCH_HTTP_PORT', '8004')}/mcp",
-            },
-            "trade": {
-                "transport": "streamable_http",
-                "url": f"http://localhost:{os.getenv('TRADE_HTTP_PORT', '8002')}/mcp",
-            },
+            "math": mcp_connection("math", os.getenv('MATH_HTTP_PORT', '8000')),
+            "stock_local": mcp_connection("price", os.getenv('GETPRICE_HTTP_PORT', '8003')),
+            "search": mcp_connection("search", os.getenv('SEARCH_HTTP_PORT', '8004')),
+            "trade": mcp_connection("trade", os.getenv('TRADE_HTTP_PORT', '8002')),
         }
 
     async def initialize(self) -> None:
@@ -324,11 +318,8 @@ class BaseAgent:
             print("⚠️  OpenAI base URL not set, using default")
 
         try:
-            # Create MCP client
-            self.client = MultiServerMCPClient(self.mcp_config)
-
-            # Get tools
-            self.tools = await self.client.get_tools()
+            # Create MCP client for remote servers and load in-process tools
+            self.client, self.tools = await load_agent_tools(self.mcp_config)
             if not self.tools:
                 print("⚠️  Warning: No MCP tools loaded. MCP services may not be running.")
                 print(f"   MCP configuration: {self.mcp_config}")
@@ -368,6 +359,17 @@ class BaseAgent:
 
         print(f"✅ Agent {self.signature} initialization completed")
 
+    def _set_trading_context(self, today_date: str) -> None:
+        """Send this agent's signature, date, market and log path with every following MCP tool call"""
+        set_context_headers(
+            self.mcp_config,
+            SIGNATURE=self.signature,
+            TODAY_DATE=today_date,
+            MARKET=self.market,
+            LOG_PATH=self.base_log_path,
+            RUNTIME_ENV_PATH=runtime_env_path(),
+        )
+
     def _setup_logging(self, today_date: str) -> str:
         """Set up log file path"""
         log_path = os.path.join(self.base_log_path, self.signature, "log", today_date)
@@ -408,7 +410,9 @@ class BaseAgent:
 
         # Set up logging
         log_file = self._setup_logging(today_date)
-        write_config_value("LOG_FILE", log_file)
+        if get_config_value("LOG_FILE") != log_file:
+            update_config(LOG_FILE=log_file)
+        self._set_trading_context(today_date)
         # Update system prompt
         self.agent = create_agent(
             self.model,
@@ -482,6 +486,8 @@ class BaseAgent:
                 print(f"❌ NameError: {e}")
                 raise
             write_config_value("IF_TRADE", False)
+        # 会话结束：把本进程追加的持仓记录落盘（POSITION_FSYNC=group 时），并保存买入数量检查点
+        flush_position_ledgers()
 
     def register_agent(self) -> None:
         """Register new agent, create initial positions"""
@@ -499,6 +505,8 @@ class BaseAgent:
         # Create initial positions
         init_position = {symbol: 0 for symbol in self.stock_symbols}
         init_position["CASH"] = self.initial_cash
+        # POSITION_MODE=sparse 时只写入 CASH，未持有的标的不落盘
+        init_position = format_positions(init_position)
 
         with open(self.position_file, "w") as f:  # Use "w" mode to ensure creating new file
             f.write(json.dumps({"date": self.init_date, "id": 0, "positions": init_position}) + "\n")
@@ -520,27 +528,17 @@ class BaseAgent:
         Returns:
             List of trading dates (excluding weekends and holidays)
         """
-        from tools.price_tools import is_trading_day
+        from tools.price_tools import get_trading_dates_between
 
-        dates = []
         max_date = None
 
         if not os.path.exists(self.position_file):
             self.register_agent()
             max_date = init_date
         else:
-            # Read existing position file, find latest date
-            with open(self.position_file, "r") as f:
-                for line in f:
-                    doc = json.loads(line)
-                    current_date = doc["date"]
-                    if max_date is None:
-                        max_date = current_date
-                    else:
-                        current_date_obj = datetime.strptime(current_date, "%Y-%m-%d")
-                        max_date_obj = datetime.strptime(max_date, "%Y-%m-%d")
-                        if current_date_obj > max_date_obj:
-                            max_date = current_date
+            # Latest date in the position file, from the process-wide ledger index
+            latest = get_position_ledger(self.position_file).get_latest()
+            max_date = latest["date"] if latest else init_date
 
         # Check if new dates need to be processed
         max_date_obj = datetime.strptime(max_date, "%Y-%m-%d")
@@ -549,18 +547,8 @@ class BaseAgent:
         if end_date_obj <= max_date_obj:
             return []
 
-        # Generate trading date list, filtered by actual trading days
-        trading_dates = []
-        current_date = max_date_obj + timedelta(days=1)
-
-        while current_date <= end_date_obj:
-            date_str = current_date.strftime("%Y-%m-%d")
-            # Check if this is an actual trading day in merged.jsonl
-            if is_trading_day(date_str, market=self.market):
-                trading_dates.append(date_str)
-            current_date += timedelta(days=1)
-
-        return trading_dates
+        # Slice the precomputed trading calendar for (max_date, end_date]
+        return get_trading_dates_between(max_date, end_date, market=self.market)
 
     async def run_with_retry(self, today_date: str) -> None:
         """Run method with retry"""
@@ -604,8 +592,8 @@ class BaseAgent:
             print(f"🔄 Processing {self.signature} - Date: {date}")
 
             # Set configuration
-            write_config_value("TODAY_DATE", date)
-            write_config_value("SIGNATURE", self.signature)
+            # One atomic config write per session: date, signature and the session log file
+            update_config(TODAY_DATE=date, SIGNATURE=self.signature, LOG_FILE=self._setup_logging(date))
 
             try:
                 await self.run_with_retry(date)
@@ -621,20 +609,18 @@ class BaseAgent:
         if not os.path.exists(self.position_file):
             return {"error": "Position file does not exist"}
 
-        positions = []
-        with open(self.position_file, "r") as f:
-            for line in f:
-                positions.append(json.loads(line))
+        # The ledger rebuilds full positions from snapshot + delta records
+        ledger = get_position_ledger(self.position_file)
+        latest_position = ledger.get_latest()
 
-        if not positions:
+        if latest_position is None:
             return {"error": "No position records"}
 
-        latest_position = positions[-1]
         return {
             "signature": self.signature,
             "latest_date": latest_position.get("date"),
-            "positions": latest_position.get("positions", {}),
-            "total_records": len(positions),
+            "positions": dict(latest_position.get("positions", {})),
+            "total_records": ledger.count,
         }
 
     def __str__(self) -> str:
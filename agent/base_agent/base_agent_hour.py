@@ -20,7 +20,8 @@ import sys
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.insert(0, project_root)
 
-from tools.general_tools import extract_conversation, extract_tool_messages, get_config_value, write_config_value
+from tools.general_tools import extract_conversation, extract_tool_messages, get_config_value, update_config
+from tools.position_ledger import get_position_ledger
 from tools.price_tools import add_no_trade_record
 from prompts.agent_prompt import get_agent_system_prompt, STOP_SIGNAL
 
@@ -50,7 +51,9 @@ class BaseAgent_Hour(BaseAgent):
         
         # Set up logging
         log_file = self._setup_logging(today_date)
-        write_config_value("LOG_FILE", log_file)
+        if get_config_value("LOG_FILE") != log_file:
+            update_config(LOG_FILE=log_file)
+        self._set_trading_context(today_date)
         
         # Update system prompt
         from langchain.agents import create_agent
@@ -135,59 +138,21 @@ class BaseAgent_Hour(BaseAgent):
         else:
             raise ValueError("Only support hour-level trading. Please use YYYY-MM-DD HH:MM:SS format.")
         
-        # Get merged.jsonl path
-        base_dir = Path(__file__).resolve().parents[2]
-        merged_file = base_dir / "data" / "merged.jsonl"
-        
-        if not merged_file.exists():
-            return []
-        
-        # Collect all timestamps from merged.jsonl
-        all_timestamps = set()
-        
-        with merged_file.open("r", encoding="utf-8") as f:
-            for line in f:
-                if not line.strip():
-                    continue
-                try:
-                    doc = json.loads(line)
-                    # 查找所有以 "Time Series" 开头的键
-                    for key, value in doc.items():
-                        if key.startswith("Time Series"):
-                            if isinstance(value, dict):
-                                all_timestamps.update(value.keys())
-                            break
-                except Exception:
-                    continue
-        
-        if not all_timestamps:
+        from tools.price_tools import get_market_store
+
+        # Hourly bar times come from the precomputed trading calendar
+        store = get_market_store(self.market)
+        if store is None:
             return []
+
         # Determine min_datetime based on init_date and last processed date in position file
         min_datetime = init_dt
         
         last_processed_dt = None
         if os.path.exists(self.position_file):
-            max_date = None
-            with open(self.position_file, "r") as f:
-                for line in f:
-                    doc = json.loads(line)
-                    current_date = doc['date']
-                    if max_date is None:
-                        max_date = current_date
-                    else:
-                        if ' ' in current_date:
-                            current_date_obj = datetime.strptime(current_date, "%Y-%m-%d %H:%M:%S")
-                        else:
-                            current_date_obj = datetime.strptime(current_date, "%Y-%m-%d")
-                        
-                        if ' ' in max_date:
-                            max_date_obj = datetime.strptime(max_date, "%Y-%m-%d %H:%M:%S")
-                        else:
-                            max_date_obj = datetime.strptime(max_date, "%Y-%m-%d")
-                        
-                        if current_date_obj > max_date_obj:
-                            max_date = current_date
-            
+            # Latest date in the position file, from the process-wide ledger index
+            latest = get_position_ledger(self.position_file).get_latest()
+            max_date = latest["date"] if latest else None
             if max_date:
                 if has_time:
                     last_processed_dt = datetime.strptime(max_date, "%Y-%m-%d %H:%M:%S")
@@ -205,34 +170,10 @@ class BaseAgent_Hour(BaseAgent):
             if not has_time:
                 last_processed_dt = last_processed_dt.date()
         
-        # Filter timestamps within the range
-        trading_times = []
-        if not has_time:
-            min_datetime = min_datetime.date()
-            end_dt = end_dt.date()
-    
-        for ts_str in all_timestamps:
-            try:
-                if has_time:
-                    ts_dt = datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S")
-                else:
-                    ts_dt = datetime.strptime(ts_str, "%Y-%m-%d").date()
-                # Check if timestamp is in range with boundary rules
-                in_lower = False
-                if last_processed_dt is None:
-                    in_lower = ts_dt >= min_datetime
-                else:
-                    in_lower = ts_dt > min_datetime
-                if in_lower and ts_dt <= end_dt:
-                    trading_times.append(ts_str)
-                    
-            except Exception as e:
-                print(f"❌ Error processing timestamp: {ts_str}")
-                print(e)
-                continue
-        
-        # Sort and remove duplicates
-        trading_times = sorted(list(set(trading_times)))
+        # Slice the calendar: strictly after the last processed time, otherwise from init_date
+        lower = min_datetime.strftime("%Y-%m-%d %H:%M:%S")
+        upper = end_dt.strftime("%Y-%m-%d %H:%M:%S")
+        trading_times = store.calendar_between(lower, upper, include_start=last_processed_dt is None)
         if REGISTER:
             print("REGISTER date will not be considered")
             trading_times = trading_times[1:]
@@ -261,8 +202,8 @@ class BaseAgent_Hour(BaseAgent):
             print(f"🔄 Processing {self.signature} - Date: {date}")
             
             # Set configuration
-            write_config_value("TODAY_DATE", date)
-            write_config_value("SIGNATURE", self.signature)
+            # One atomic config write per session: date, signature and the session log file
+            update_config(TODAY_DATE=date, SIGNATURE=self.signature, LOG_FILE=self._setup_logging(date))
             
             try:
                 await self.run_with_retry(date)
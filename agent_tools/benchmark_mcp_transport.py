@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+MCP transport latency benchmark
+Starts tool_math.py once over localhost TCP and once over a Unix domain socket and times `add`
+calls through the same streamable HTTP client the agents use. Two patterns are measured:
+"session" opens a new MCP session per call (what MultiServerMCPClient tools do), "call" reuses
+one initialized session.
+
+Usage:
+    python agent_tools/benchmark_mcp_transport.py [--calls 200] [--port 8790]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from mcp import ClientSession
+from mcp.client.streamable_http import (create_mcp_http_client,
+                                        streamablehttp_client)
+
+from tools.mcp_transport import (get_socket_path, is_service_listening,
+                                 uds_client_factory)
+
+
+def start_math_server(transport: str, port: int, socket_dir: str) -> subprocess.Popen:
+    env = dict(os.environ, MCP_TRANSPORT=transport, MATH_HTTP_PORT=str(port), MCP_SOCKET_DIR=socket_dir)
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(project_root, "agent_tools", "tool_math.py")],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    os.environ["MCP_SOCKET_DIR"] = socket_dir
+    deadline = time.time() + 30
+    while not is_service_listening("math", port, transport):
+        if process.poll() is not None or time.time() > deadline:
+            process.kill()
+            raise RuntimeError(f"❌ tool_math.py failed to start with MCP_TRANSPORT={transport}")
+        time.sleep(0.2)
+    return process
+
+
+async def time_calls(url: str, factory, calls: int, reuse_session: bool) -> List[float]:
+    latencies = []
+
+    async def call(session: ClientSession, i: int) -> None:
+        result = await session.call_tool("add", {"a": i, "b": 1})
+        if result.isError:
+            raise RuntimeError(f"❌ add failed: {result.content}")
+
+    if reuse_session:
+        async with streamablehttp_client(url, httpx_client_factory=factory) as (read, write, _):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                for i in range(calls):
+                    start = time.perf_counter()
+                    await call(session, i)
+                    latencies.append(time.perf_counter() - start)
+        return latencies
+
+    for i in range(calls):
+        start = time.perf_counter()
+        async with streamablehttp_client(url, httpx_client_factory=factory) as (read, write, _):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                await call(session, i)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def run_patterns(url: str, factory, calls: int) -> Dict[str, List[float]]:
+    latencies = {}
+    for pattern, reuse_session in (("session", False), ("call", True)):
+        # 预热：首次调用包含导入与连接建立开销
+        await time_calls(url, factory, 5, reuse_session)
+        latencies[pattern] = await time_calls(url, factory, calls, reuse_session)
+    return latencies
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    return {
+        "mean": statistics.mean(ordered) * 1000,
+        "p50": ordered[len(ordered) // 2] * 1000,
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare MCP tool call latency over TCP and Unix sockets")
+    parser.add_argument("--calls", type=int, default=200, help="Timed calls per transport and pattern")
+    parser.add_argument("--port", type=int, default=8790, help="Port of the TCP server")
+    args = parser.parse_args()
+
+    socket_dir = tempfile.mkdtemp(prefix="mcp-bench-")
+    results = {}
+    for transport in ("http", "uds"):
+        process = start_math_server(transport, args.port, socket_dir)
+        try:
+            if transport == "uds":
+                url, factory = "http://localhost/mcp", uds_client_factory(get_socket_path("math"))
+            else:
+                url, factory = f"http://localhost:{args.port}/mcp", create_mcp_http_client
+            for pattern, latencies in asyncio.run(run_patterns(url, factory, args.calls)).items():
+                results[(transport, pattern)] = summarize(latencies)
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+    print(f"\n📊 MCP tool call latency over {args.calls} calls (ms)")
+    print(f"{'pattern':<10}{'transport':<11}{'mean':>9}{'p50':>9}{'p95':>9}")
+    for pattern in ("session", "call"):
+        for transport in ("http", "uds"):
+            stats = results[(transport, pattern)]
+            print(f"{pattern:<10}{transport:<11}{stats['mean']:>9.2f}{stats['p50']:>9.2f}{stats['p95']:>9.2f}")
+        speedup = results[("http", pattern)]["mean"] / results[("uds", pattern)]["mean"]
+        print(f"{'':<10}{'uds speedup':<11}{speedup:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
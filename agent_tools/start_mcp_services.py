@@ -16,11 +16,18 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# Add project root to Python path to import tools module
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools.mcp_transport import (get_mcp_transport, get_socket_path,
+                                 is_service_listening)
+
 
 class MCPServiceManager:
     def __init__(self):
         self.services = {}
         self.running = True
+        # "http" (localhost ports) or "uds" (Unix sockets in MCP_SOCKET_DIR), inherited by the services
+        self.transport = get_mcp_transport()
 
         # Set default ports
         self.ports = {
@@ -69,8 +76,17 @@ class MCPServiceManager:
         except:
             return False
 
+    def endpoint(self, service_id, config):
+        """Address a service listens on"""
+        if self.transport == "uds":
+            return f"unix:{get_socket_path(service_id)}"
+        return f"Port: {config['port']}"
+
     def check_port_conflicts(self):
         """Check for port conflicts before starting services"""
+        if self.transport == "uds":
+            return self.check_socket_conflicts()
+
         conflicts = []
         for service_id, config in self.service_configs.items():
             port = config["port"]
@@ -105,6 +121,21 @@ class MCPServiceManager:
                 return False
         return True
 
+    def check_socket_conflicts(self):
+        """Check for sockets already served by running services (stale socket files are removed by the servers)"""
+        conflicts = [
+            (config["name"], get_socket_path(service_id))
+            for service_id, config in self.service_configs.items()
+            if is_service_listening(service_id, config["port"], "uds")
+        ]
+        if conflicts:
+            print("⚠️  Socket conflicts detected:")
+            for name, socket_path in conflicts:
+                print(f"   - {name}: {socket_path} is already in use")
+            print("\n💡 Tip: Stop the conflicting services or set MCP_SOCKET_DIR to another directory")
+            return False
+        return True
+
     def start_service(self, service_id, config):
         """Start a single service"""
         script_path = config["script"]
@@ -125,7 +156,7 @@ class MCPServiceManager:
 
             self.services[service_id] = {"process": process, "name": service_name, "port": port, "log_file": log_file}
 
-            print(f"✅ {service_name} service started (PID: {process.pid}, Port: {port})")
+            print(f"✅ {service_name} service started (PID: {process.pid}, {self.endpoint(service_id, config)})")
             return True
 
         except Exception as e:
@@ -145,17 +176,8 @@ class MCPServiceManager:
         if process.poll() is not None:
             return False
 
-        # Check if port is responding (simple check)
-        try:
-            import socket
-
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(1)
-            result = sock.connect_ex(("localhost", port))
-            sock.close()
-            return result == 0
-        except:
-            return False
+        # Check if port / socket is responding (simple check)
+        return is_service_listening(service_id, port, self.transport)
 
     def start_all_services(self):
         """Start all services"""
@@ -167,9 +189,9 @@ class MCPServiceManager:
             print("\n❌ Cannot start services due to port conflicts")
             return
 
-        print(f"\n📊 Port configuration:")
+        print(f"\n📊 Port configuration (transport: {self.transport}):")
         for service_id, config in self.service_configs.items():
-            print(f"  - {config['name']}: {config['port']}")
+            print(f"  - {config['name']}: {self.endpoint(service_id, config)}")
 
         print("\n🔄 Starting services...")
 
@@ -216,7 +238,11 @@ class MCPServiceManager:
         """Print service information"""
         print("\n📋 Service information:")
         for service_id, service in self.services.items():
-            print(f"  - {service['name']}: http://localhost:{service['port']} (PID: {service['process'].pid})")
+            if self.transport == "uds":
+                address = f"http+unix://{get_socket_path(service_id)}"
+            else:
+                address = f"http://localhost:{service['port']}"
+            print(f"  - {service['name']}: {address} (PID: {service['process'].pid})")
 
         print(f"\n📁 Log files location: {self.log_dir.absolute()}")
         print("\n🛑 Press Ctrl+C to stop all services")
@@ -274,11 +300,11 @@ class MCPServiceManager:
             if service_id in self.services:
                 service = self.services[service_id]
                 if self.check_service_health(service_id):
-                    print(f"✅ {config['name']} service running normally (Port: {config['port']})")
+                    print(f"✅ {config['name']} service running normally ({self.endpoint(service_id, config)})")
                 else:
-                    print(f"❌ {config['name']} service abnormal (Port: {config['port']})")
+                    print(f"❌ {config['name']} service abnormal ({self.endpoint(service_id, config)})")
             else:
-                print(f"❌ {config['name']} service not started (Port: {config['port']})")
+                print(f"❌ {config['name']} service not started ({self.endpoint(service_id, config)})")
 
 
 def main():
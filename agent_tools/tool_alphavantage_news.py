@@ -13,6 +13,8 @@ from datetime import datetime, timedelta
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from tools.general_tools import get_config_value
+from tools.mcp_context import install_trading_context
+from tools.mcp_transport import run_mcp_server
 
 logger = logging.getLogger(__name__)
 
@@ -217,6 +219,7 @@ class AlphaVantageNewsTool:
 
 
 mcp = FastMCP("Search")
+install_trading_context(mcp)
 
 
 @mcp.tool()
@@ -313,7 +316,7 @@ if __name__ == "__main__":
     # Run with streamable-http, support configuring host and port through environment variables to avoid conflicts
     print("Running Alpha Vantage News Tool as search tool")
     port = int(os.getenv("SEARCH_HTTP_PORT", "8001"))
-    mcp.run(transport="streamable-http", port=port)
+    run_mcp_server(mcp, "search", port)
 
     # results = get_market_news(query="AAPL", tickers="AAPL", topics="technology")
     # print(results)
@@ -5,7 +5,6 @@ from typing import Any, Dict, List, Optional
 from fastmcp import FastMCP
 
 from typing import Dict, List, Optional, Any
-import fcntl
 from pathlib import Path
 # Add project root directory to Python path
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -13,32 +12,17 @@ sys.path.insert(0, project_root)
 import json
 
 from tools.general_tools import get_config_value, write_config_value
+from tools.mcp_context import install_trading_context
+from tools.mcp_transport import run_mcp_server
+from tools.position_ledger import format_positions, open_position_ledger
+from tools.position_lock import get_position_lock
 from tools.price_tools import (get_latest_position, get_open_prices,
                                get_yesterday_date,
                                get_yesterday_open_and_close_price,
                                get_yesterday_profit)
 
 mcp = FastMCP("CryptoTradeTools")
-
-def _position_lock(signature: str):
-    """Context manager for file-based lock to serialize position updates per signature."""
-    class _Lock:
-        def __init__(self, name: str):
-            base_dir = Path(project_root) / "data" / "agent_data" / name
-            base_dir.mkdir(parents=True, exist_ok=True)
-            self.lock_path = base_dir / ".position.lock"
-            # Ensure lock file exists
-            self._fh = open(self.lock_path, "a+")
-        def __enter__(self):
-            fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX)
-            return self
-        def __exit__(self, exc_type, exc, tb):
-            try:
-                fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
-            finally:
-                self._fh.close()
-    return _Lock(signature)
-
+install_trading_context(mcp)
 
 
 @mcp.tool()
@@ -102,8 +86,8 @@ def buy_crypto(symbol: str, amount: float) -> Dict[str, Any]:
     # Step 2: Get current latest position and operation ID
     # get_latest_position returns two values: position dictionary and current maximum operation ID
     # This ID is used to ensure each operation has a unique identifier
-    # Acquire lock for atomic read-modify-write on positions
-    with _position_lock(signature):
+    ledger = open_position_ledger(signature)
+    with get_position_lock(signature), ledger.transaction():
         try:
             current_position, current_action_id = get_latest_position(today_date, signature)
         except Exception as e:
@@ -149,32 +133,22 @@ def buy_crypto(symbol: str, amount: float) -> Dict[str, Any]:
             new_position["CASH"] = round(cash_left, 4)
 
             # Increase crypto position quantity with 4 decimal precision
-            new_position[symbol] = round(new_position[symbol] + amount, 4)
+            new_position[symbol] = round(new_position.get(symbol, 0) + amount, 4)
+            new_position = format_positions(new_position)
 
             # Step 6: Record transaction to position.jsonl file
-            # Build file path: {project_root}/data/{log_path}/{signature}/position/position.jsonl
-            # Use append mode ("a") to write new transaction record
+            # File path: data/{log_path}/{signature}/position/position.jsonl (see tools/position_ledger.py)
+            # Appending through the ledger (position.jsonl or the SQLite store, see POSITION_BACKEND) keeps its index current
             # Each operation ID increments by 1, ensuring uniqueness of operation sequence
-            log_path = get_config_value("LOG_PATH", "./data/agent_data")
-            if log_path.startswith("./data/"):
-                log_path = log_path[7:]  # Remove "./data/" prefix
-            position_file_path = os.path.join(project_root, "data", log_path, signature, "position", "position.jsonl")
-            with open(position_file_path, "a") as f:
-                # Write JSON format transaction record, containing date, operation ID, transaction details and updated position
-                print(
-                    f"Writing to position.jsonl: {json.dumps({'date': today_date, 'id': current_action_id + 1, 'this_action':{'action':'buy_crypto','symbol':symbol,'amount':amount},'positions': new_position})}"
-                )
-                f.write(
-                    json.dumps(
-                        {
-                            "date": today_date,
-                            "id": current_action_id + 1,
-                            "this_action": {"action": "buy_crypto", "symbol": symbol, "amount": amount},
-                            "positions": new_position,
-                        }
-                    )
-                    + "\n"
-                )
+            record = {
+                "date": today_date,
+                "id": current_action_id + 1,
+                "this_action": {"action": "buy_crypto", "symbol": symbol, "amount": amount},
+                "positions": new_position,
+            }
+            # Write JSON format transaction record, containing date, operation ID, transaction details and updated position
+            print(f"Writing to position.jsonl: {json.dumps(record)}")
+            ledger.append(record)
             # Step 7: Return updated position
             write_config_value("IF_TRADE", True)
             print("IF_TRADE", get_config_value("IF_TRADE"))
@@ -243,7 +217,8 @@ def sell_crypto(symbol: str, amount: float) -> Dict[str, Any]:
     # Step 2: Get current latest position and operation ID
     # get_latest_position returns two values: position dictionary and current maximum operation ID
     # This ID is used to ensure each operation has a unique identifier
-    with _position_lock(signature):
+    ledger = open_position_ledger(signature)
+    with get_position_lock(signature), ledger.transaction():
         try:
             current_position, current_action_id = get_latest_position(today_date, signature)
         except Exception as e:
@@ -294,31 +269,22 @@ def sell_crypto(symbol: str, amount: float) -> Dict[str, Any]:
         # Increase cash balance: sell price × sell quantity with 4 decimal precision
         # Use get method to ensure CASH field exists, default to 0 if not present
         new_position["CASH"] = round(new_position.get("CASH", 0) + this_symbol_price * amount, 4)
+        # POSITION_MODE=sparse drops the symbol once it is sold out
+        new_position = format_positions(new_position)
 
         # Step 6: Record transaction to position.jsonl file
-        # Build file path: {project_root}/data/{log_path}/{signature}/position/position.jsonl
-        # Use append mode ("a") to write new transaction record
+        # File path: data/{log_path}/{signature}/position/position.jsonl (see tools/position_ledger.py)
+        # Appending through the ledger (position.jsonl or the SQLite store, see POSITION_BACKEND) keeps its index current
         # Each operation ID increments by 1, ensuring uniqueness of operation sequence
-        log_path = get_config_value("LOG_PATH", "./data/agent_data")
-        if log_path.startswith("./data/"):
-            log_path = log_path[7:]  # Remove "./data/" prefix
-        position_file_path = os.path.join(project_root, "data", log_path, signature, "position", "position.jsonl")
-        with open(position_file_path, "a") as f:
-            # Write JSON format transaction record, containing date, operation ID and updated position
-            print(
-                f"Writing to position.jsonl: {json.dumps({'date': today_date, 'id': current_action_id + 1, 'this_action':{'action':'sell_crypto','symbol':symbol,'amount':amount},'positions': new_position})}"
-            )
-            f.write(
-                json.dumps(
-                    {
-                        "date": today_date,
-                        "id": current_action_id + 1,
-                        "this_action": {"action": "sell_crypto", "symbol": symbol, "amount": amount},
-                        "positions": new_position,
-                    }
-                )
-                + "\n"
-            )
+        record = {
+            "date": today_date,
+            "id": current_action_id + 1,
+            "this_action": {"action": "sell_crypto", "symbol": symbol, "amount": amount},
+            "positions": new_position,
+        }
+        # Write JSON format transaction record, containing date, operation ID and updated position
+        print(f"Writing to position.jsonl: {json.dumps(record)}")
+        ledger.append(record)
 
         # Step 7: Return updated position
         write_config_value("IF_TRADE", True)
@@ -332,4 +298,4 @@ if __name__ == "__main__":
     # new_result = sell_crypto("BTC-USDT", 0.05)
     # print(new_result)
     port = int(os.getenv("CRYPTO_HTTP_PORT", "8014"))
-    mcp.run(transport="streamable-http", port=port)
\ No newline at end of file
+    run_mcp_server(mcp, "crypto", port)
\ No newline at end of file
@@ -21,6 +21,11 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 from tools.general_tools import get_config_value
+from tools.mcp_context import install_trading_context
+from tools.mcp_transport import run_mcp_server
+from tools.merged_index import read_symbol_doc
+
+install_trading_context(mcp)
 
 
 def _workspace_data_path(filename: str, symbol: Optional[str] = None) -> Path:
@@ -120,50 +125,44 @@ def get_price_local_daily(symbol: str, date: str) -> Dict[str, Any]:
     if not data_path.exists():
         return {"error": f"Data file not found: {data_path}", "symbol": symbol, "date": date}
 
-    with data_path.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            doc = json.loads(line)
-            meta = doc.get("Meta Data", {})
-            if meta.get("2. Symbol") != symbol:
-                continue
-            series = doc.get("Time Series (Daily)", {})
-            day = series.get(date)
-            if day is None:
-                sample_dates = sorted(series.keys(), reverse=True)[:5]
-                return {
-                    "error": f"Data not found for date {date}. Please verify the date exists in data. Sample available dates: {sample_dates}",
-                    "symbol": symbol,
-                    "date": date,
-                }
-            if date == get_config_value("TODAY_DATE"):
-                return {
-                    "symbol": symbol,
-                    "date": date,
-                    "ohlcv": {
-                        "open": day.get("1. buy price"),
-                        "high": "You can not get the current high price",
-                        "low": "You can not get the current low price", 
-                        "close": "You can not get the next close price",
-                        "volume": "You can not get the current volume",
-                    },
-                }
-            else:
-                return {
-                    "symbol": symbol,
-                    "date": date,
-                    "ohlcv": {
-                        "open": day.get("1. buy price"),
-                        "high": day.get("2. high"),
-                        "low": day.get("3. low"), 
-                        "close": day.get("4. sell price"),
-                        "volume": day.get("5. volume"),
-                    },
-                }
-
-
-    return {"error": f"No records found for stock {symbol} in local data", "symbol": symbol, "date": date}
+    # 通过 sidecar 字节偏移索引直接定位该标的所在行，只解析这一行
+    doc = read_symbol_doc(data_path, symbol)
+    if doc is None:
+        return {"error": f"No records found for stock {symbol} in local data", "symbol": symbol, "date": date}
+
+    series = doc.get("Time Series (Daily)", {})
+    day = series.get(date)
+    if day is None:
+        sample_dates = sorted(series.keys(), reverse=True)[:5]
+        return {
+            "error": f"Data not found for date {date}. Please verify the date exists in data. Sample available dates: {sample_dates}",
+            "symbol": symbol,
+            "date": date,
+        }
+    if date == get_config_value("TODAY_DATE"):
+        return {
+            "symbol": symbol,
+            "date": date,
+            "ohlcv": {
+                "open": day.get("1. buy price"),
+                "high": "You can not get the current high price",
+                "low": "You can not get the current low price", 
+                "close": "You can not get the next close price",
+                "volume": "You can not get the current volume",
+            },
+        }
+    else:
+        return {
+            "symbol": symbol,
+            "date": date,
+            "ohlcv": {
+                "open": day.get("1. buy price"),
+                "high": day.get("2. high"),
+                "low": day.get("3. low"), 
+                "close": day.get("4. sell price"),
+                "volume": day.get("5. volume"),
+            },
+        }
 
 
 def get_price_local_hourly(symbol: str, date: str) -> Dict[str, Any]:
@@ -186,49 +185,44 @@ def get_price_local_hourly(symbol: str, date: str) -> Dict[str, Any]:
     if not data_path.exists():
         return {"error": f"Data file not found: {data_path}", "symbol": symbol, "date": date}
 
-    with data_path.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            doc = json.loads(line)
-            meta = doc.get("Meta Data", {})
-            if meta.get("2. Symbol") != symbol:
-                continue
-            series = doc.get("Time Series (60min)", {})
-            day = series.get(date)
-            if day is None:
-                sample_dates = sorted(series.keys(), reverse=True)[:5]
-                return {
-                    "error": f"Data not found for date {date}. Please verify the date exists in data. Sample available dates: {sample_dates}",
-                    "symbol": symbol,
-                    "date": date
-                }
-            if date == get_config_value("TODAY_DATE"):
-                return {
-                    "symbol": symbol,
-                    "date": date,
-                    "ohlcv": {
-                        "open": day.get("1. buy price"),
-                        "high": "You can not get the current high price",
-                        "low": "You can not get the current low price", 
-                        "close": "You can not get the next close price",
-                        "volume": "You can not get the current volume",
-                    },
-                }
-            else:
-                return {
-                    "symbol": symbol,
-                    "date": date,
-                    "ohlcv": {
-                        "open": day.get("1. buy price"),
-                        "high": day.get("2. high"),
-                        "low": day.get("3. low"), 
-                        "close": day.get("4. sell price"),
-                        "volume": day.get("5. volume"),
-                    },
-                }
-
-    return {"error": f"No records found for stock {symbol} in local data", "symbol": symbol, "date": date}
+    # 通过 sidecar 字节偏移索引直接定位该标的所在行，只解析这一行
+    doc = read_symbol_doc(data_path, symbol)
+    if doc is None:
+        return {"error": f"No records found for stock {symbol} in local data", "symbol": symbol, "date": date}
+
+    series = doc.get("Time Series (60min)", {})
+    day = series.get(date)
+    if day is None:
+        sample_dates = sorted(series.keys(), reverse=True)[:5]
+        return {
+            "error": f"Data not found for date {date}. Please verify the date exists in data. Sample available dates: {sample_dates}",
+            "symbol": symbol,
+            "date": date
+        }
+    if date == get_config_value("TODAY_DATE"):
+        return {
+            "symbol": symbol,
+            "date": date,
+            "ohlcv": {
+                "open": day.get("1. buy price"),
+                "high": "You can not get the current high price",
+                "low": "You can not get the current low price", 
+                "close": "You can not get the next close price",
+                "volume": "You can not get the current volume",
+            },
+        }
+    else:
+        return {
+            "symbol": symbol,
+            "date": date,
+            "ohlcv": {
+                "open": day.get("1. buy price"),
+                "high": day.get("2. high"),
+                "low": day.get("3. low"), 
+                "close": day.get("4. sell price"),
+                "volume": day.get("5. volume"),
+            },
+        }
 
 
 def get_price_local_function(symbol: str, date: str, filename: str = "merged.jsonl") -> Dict[str, Any]:
@@ -286,4 +280,4 @@ def get_price_local_function(symbol: str, date: str, filename: str = "merged.jso
 if __name__ == "__main__":
     
     port = int(os.getenv("GETPRICE_HTTP_PORT", "8003"))
-    mcp.run(transport="streamable-http", port=port)
+    run_mcp_server(mcp, "price", port)
@@ -16,6 +16,8 @@ from datetime import datetime, timedelta
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from tools.general_tools import get_config_value
+from tools.mcp_context import install_trading_context
+from tools.mcp_transport import run_mcp_server
 
 logger = logging.getLogger(__name__)
 
@@ -211,6 +213,7 @@ class WebScrapingJinaTool:
 
 
 mcp = FastMCP("Search")
+install_trading_context(mcp)
 
 
 @mcp.tool()
@@ -277,4 +280,4 @@ Content: {result['content'][:1000]}...
 if __name__ == "__main__":
     # Run with streamable-http, support configuring host and port through environment variables to avoid conflicts
     port = int(os.getenv("SEARCH_HTTP_PORT", "8001"))
-    mcp.run(transport="streamable-http", port=port)
+    run_mcp_server(mcp, "search", port)
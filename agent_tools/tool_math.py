@@ -6,6 +6,7 @@ from fastmcp import FastMCP
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from tools.general_tools import get_config_value
+from tools.mcp_transport import run_mcp_server
 load_dotenv()
 
 mcp = FastMCP("Math")
@@ -41,4 +42,4 @@ def multiply(a: float, b: float) -> float:
 
 if __name__ == "__main__":
     port = int(os.getenv("MATH_HTTP_PORT", "8000"))
-    mcp.run(transport="streamable-http", port=port)
+    run_mcp_server(mcp, "math", port)
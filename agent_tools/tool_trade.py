@@ -1,11 +1,10 @@
 import os
 import sys
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
 from fastmcp import FastMCP
 
-from typing import Dict, List, Optional, Any
-import fcntl
 from pathlib import Path
 # Add project root directory to Python path
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -13,32 +12,22 @@ sys.path.insert(0, project_root)
 import json
 
 from tools.general_tools import get_config_value, write_config_value
+from tools.mcp_context import install_trading_context
+from tools.mcp_transport import run_mcp_server
+from tools.position_ledger import format_positions, open_position_ledger
+from tools.position_lock import get_position_lock
 from tools.price_tools import (get_latest_position, get_open_prices,
                                get_yesterday_date,
                                get_yesterday_open_and_close_price,
                                get_yesterday_profit)
 
 mcp = FastMCP("TradeTools")
+install_trading_context(mcp)
 
-def _position_lock(signature: str):
-    """Context manager for file-based lock to serialize position updates per signature."""
-    class _Lock:
-        def __init__(self, name: str):
-            base_dir = Path(project_root) / "data" / "agent_data" / name
-            base_dir.mkdir(parents=True, exist_ok=True)
-            self.lock_path = base_dir / ".position.lock"
-            # Ensure lock file exists
-            self._fh = open(self.lock_path, "a+")
-        def __enter__(self):
-            fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX)
-            return self
-        def __exit__(self, exc_type, exc, tb):
-            try:
-                fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
-            finally:
-                self._fh.close()
-    return _Lock(signature)
-
+# rebalance_to_weights: tolerance when checking that the target weights sum to at most 1
+WEIGHT_SUM_TOLERANCE = 1e-9
+# rebalance_to_weights: the buy budget is shrunk by this fraction so float rounding never overdraws cash
+CASH_BUFFER = 1e-9
 
 
 @mcp.tool()
@@ -115,123 +104,78 @@ def buy(symbol: str, amount: int) -> Dict[str, Any]:
             "suggestion": f"Please use {(amount // 100) * 100} or {((amount // 100) + 1) * 100} shares instead.",
         }
 
-    # Step 2: Get current latest position and operation ID
-    # get_latest_position returns two values: position dictionary and current maximum operation ID
-    # This ID is used to ensure each operation has a unique identifier
-    # Acquire lock for atomic read-modify-write on positions
-    with _position_lock(signature):
+    # Steps 2-6 run under the position lock and one ledger transaction, so the position
+    # read, validation and append cannot interleave with another trade of this signature
+    ledger = open_position_ledger(signature)
+    with get_position_lock(signature), ledger.transaction():
+        # Step 2: Get current latest position and operation ID
+        # get_latest_position returns two values: position dictionary and current maximum operation ID
+        # This ID is used to ensure each operation has a unique identifier
         try:
             current_position, current_action_id = get_latest_position(today_date, signature)
         except Exception as e:
             print(e)
             print(today_date, signature)
             return {"error": f"Failed to load latest position: {e}", "symbol": symbol, "date": today_date}
-    # Step 3: Get stock opening price for the day
-    # Use get_open_prices function to get the opening price of specified stock for the day
-    # If stock symbol does not exist or price data is missing, KeyError exception will be raised
-    try:
-        this_symbol_price = get_open_prices(today_date, [symbol], market=market)[f"{symbol}_price"]
-    except KeyError:
-        # Stock symbol does not exist or price data is missing, return error message
-        return {
-            "error": f"Symbol {symbol} not found! This action will not be allowed.",
-            "symbol": symbol,
-            "date": today_date,
-        }
-
-    # Step 4: Validate buy conditions
-    # Calculate cash required for purchase: stock price × buy quantity
-    try:
-        cash_left = current_position["CASH"] - this_symbol_price * amount
-    except Exception as e:
-        print(current_position, "CASH", this_symbol_price, amount)
-
-    # Check if cash balance is sufficient for purchase
-    if cash_left < 0:
-        # Insufficient cash, return error message
-        return {
-            "error": "Insufficient cash! This action will not be allowed.",
-            "required_cash": this_symbol_price * amount,
-            "cash_available": current_position.get("CASH", 0),
-            "symbol": symbol,
-            "date": today_date,
-        }
-    else:
-        # Step 5: Execute buy operation, update position
-        # Create a copy of current position to avoid directly modifying original data
-        new_position = current_position.copy()
-
-        # Decrease cash balance
-        new_position["CASH"] = cash_left
-
-        # Increase stock position quantity
-        new_position[symbol] += amount
-
-        # Step 6: Record transaction to position.jsonl file
-        # Build file path: {project_root}/data/{log_path}/{signature}/position/position.jsonl
-        # Use append mode ("a") to write new transaction record
-        # Each operation ID increments by 1, ensuring uniqueness of operation sequence
-        log_path = get_config_value("LOG_PATH", "./data/agent_data")
-        if log_path.startswith("./data/"):
-            log_path = log_path[7:]  # Remove "./data/" prefix
-        position_file_path = os.path.join(project_root, "data", log_path, signature, "position", "position.jsonl")
-        with open(position_file_path, "a") as f:
+        # Step 3: Get stock opening price for the day
+        # Use get_open_prices function to get the opening price of specified stock for the day
+        # If stock symbol does not exist or price data is missing, KeyError exception will be raised
+        try:
+            this_symbol_price = get_open_prices(today_date, [symbol], market=market)[f"{symbol}_price"]
+        except KeyError:
+            # Stock symbol does not exist or price data is missing, return error message
+            return {
+                "error": f"Symbol {symbol} not found! This action will not be allowed.",
+                "symbol": symbol,
+                "date": today_date,
+            }
+
+        # Step 4: Validate buy conditions
+        # Calculate cash required for purchase: stock price × buy quantity
+        try:
+            cash_left = current_position["CASH"] - this_symbol_price * amount
+        except Exception as e:
+            print(current_position, "CASH", this_symbol_price, amount)
+
+        # Check if cash balance is sufficient for purchase
+        if cash_left < 0:
+            # Insufficient cash, return error message
+            return {
+                "error": "Insufficient cash! This action will not be allowed.",
+                "required_cash": this_symbol_price * amount,
+                "cash_available": current_position.get("CASH", 0),
+                "symbol": symbol,
+                "date": today_date,
+            }
+        else:
+            # Step 5: Execute buy operation, update position
+            # Create a copy of current position to avoid directly modifying original data
+            new_position = current_position.copy()
+
+            # Decrease cash balance
+            new_position["CASH"] = cash_left
+
+            # Increase stock position quantity (sparse positions may not list the symbol yet)
+            new_position[symbol] = new_position.get(symbol, 0) + amount
+            new_position = format_positions(new_position)
+
+            # Step 6: Record transaction to position.jsonl file
+            # File path: data/{log_path}/{signature}/position/position.jsonl (see tools/position_ledger.py)
+            # Appending through the ledger (position.jsonl or the SQLite store, see POSITION_BACKEND) keeps its index current
+            # Each operation ID increments by 1, ensuring uniqueness of operation sequence
+            record = {
+                "date": today_date,
+                "id": current_action_id + 1,
+                "this_action": {"action": "buy", "symbol": symbol, "amount": amount},
+                "positions": new_position,
+            }
             # Write JSON format transaction record, containing date, operation ID, transaction details and updated position
-            print(
-                f"Writing to position.jsonl: {json.dumps({'date': today_date, 'id': current_action_id + 1, 'this_action':{'action':'buy','symbol':symbol,'amount':amount},'positions': new_position})}"
-            )
-            f.write(
-                json.dumps(
-                    {
-                        "date": today_date,
-                        "id": current_action_id + 1,
-                        "this_action": {"action": "buy", "symbol": symbol, "amount": amount},
-                        "positions": new_position,
-                    }
-                )
-                + "\n"
-            )
-        # Step 7: Return updated position
-        write_config_value("IF_TRADE", True)
-        print("IF_TRADE", get_config_value("IF_TRADE"))
-        return new_position
-
-
-def _get_today_buy_amount(symbol: str, today_date: str, signature: str) -> int:
-    """
-    Helper function to get the total amount bought today for T+1 restriction check
-
-    Args:
-        symbol: Stock symbol
-        today_date: Trading date
-        signature: Model signature
-
-    Returns:
-        Total shares bought today
-    """
-    log_path = get_config_value("LOG_PATH", "./data/agent_data")
-    if log_path.startswith("./data/"):
-        log_path = log_path[7:]  # Remove "./data/" prefix
-    position_file_path = os.path.join(project_root, "data", log_path, signature, "position", "position.jsonl")
-
-    if not os.path.exists(position_file_path):
-        return 0
-
-    total_bought_today = 0
-    with open(position_file_path, "r") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                record = json.loads(line)
-                if record.get("date") == today_date:
-                    this_action = record.get("this_action", {})
-                    if this_action.get("action") == "buy" and this_action.get("symbol") == symbol:
-                        total_bought_today += this_action.get("amount", 0)
-            except Exception:
-                continue
-
-    return total_bought_today
+            print(f"Writing to position.jsonl: {json.dumps(record)}")
+            ledger.append(record)
+            # Step 7: Return updated position
+            write_config_value("IF_TRADE", True)
+            print("IF_TRADE", get_config_value("IF_TRADE"))
+            return new_position
 
 
 @mcp.tool()
@@ -309,99 +253,379 @@ def sell(symbol: str, amount: int) -> Dict[str, Any]:
             "suggestion": f"Please use {(amount // 100) * 100} or {((amount // 100) + 1) * 100} shares instead.",
         }
 
-    # Step 2: Get current latest position and operation ID
-    # get_latest_position returns two values: position dictionary and current maximum operation ID
-    # This ID is used to ensure each operation has a unique identifier
-    current_position, current_action_id = get_latest_position(today_date, signature)
+    # Steps 2-6 run under the position lock and one ledger transaction, so the position
+    # read, validation and append cannot interleave with another trade of this signature
+    ledger = open_position_ledger(signature)
+    with get_position_lock(signature), ledger.transaction():
+        # Step 2: Get current latest position and operation ID
+        # get_latest_position returns two values: position dictionary and current maximum operation ID
+        # This ID is used to ensure each operation has a unique identifier
+        current_position, current_action_id = get_latest_position(today_date, signature)
+
+        # Step 3: Get stock opening price for the day
+        # Use get_open_prices function to get the opening price of specified stock for the day
+        # If stock symbol does not exist or price data is missing, KeyError exception will be raised
+        try:
+            this_symbol_price = get_open_prices(today_date, [symbol], market=market)[f"{symbol}_price"]
+        except KeyError:
+            # Stock symbol does not exist or price data is missing, return error message
+            return {
+                "error": f"Symbol {symbol} not found! This action will not be allowed.",
+                "symbol": symbol,
+                "date": today_date,
+            }
+
+        # Step 4: Validate sell conditions
+        # Check if holding this stock
+        if symbol not in current_position:
+            return {
+                "error": f"No position for {symbol}! This action will not be allowed.",
+                "symbol": symbol,
+                "date": today_date,
+            }
+
+        # Check if position quantity is sufficient for selling
+        if current_position[symbol] < amount:
+            return {
+                "error": "Insufficient shares! This action will not be allowed.",
+                "have": current_position.get(symbol, 0),
+                "want_to_sell": amount,
+                "symbol": symbol,
+                "date": today_date,
+            }
+
+        # 🇨🇳 Chinese A-shares T+1 trading rule: Cannot sell shares bought on the same day
+        if market == "cn":
+            bought_today = ledger.bought_on(today_date, symbol)
+            if bought_today > 0:
+                # Calculate sellable quantity (total position - bought today)
+                sellable_amount = current_position[symbol] - bought_today
+                if amount > sellable_amount:
+                    return {
+                        "error": f"T+1 restriction violated! You bought {bought_today} shares of {symbol} today and cannot sell them until tomorrow.",
+                        "symbol": symbol,
+                        "total_position": current_position[symbol],
+                        "bought_today": bought_today,
+                        "sellable_today": max(0, sellable_amount),
+                        "want_to_sell": amount,
+                        "date": today_date,
+                    }
 
-    # Step 3: Get stock opening price for the day
-    # Use get_open_prices function to get the opening price of specified stock for the day
-    # If stock symbol does not exist or price data is missing, KeyError exception will be raised
-    try:
-        this_symbol_price = get_open_prices(today_date, [symbol], market=market)[f"{symbol}_price"]
-    except KeyError:
-        # Stock symbol does not exist or price data is missing, return error message
-        return {
-            "error": f"Symbol {symbol} not found! This action will not be allowed.",
-            "symbol": symbol,
-            "date": today_date,
-        }
+        # Step 5: Execute sell operation, update position
+        # Create a copy of current position to avoid directly modifying original data
+        new_position = current_position.copy()
 
-    # Step 4: Validate sell conditions
-    # Check if holding this stock
-    if symbol not in current_position:
-        return {
-            "error": f"No position for {symbol}! This action will not be allowed.",
-            "symbol": symbol,
+        # Decrease stock position quantity
+        new_position[symbol] -= amount
+
+        # Increase cash balance: sell price × sell quantity
+        # Use get method to ensure CASH field exists, default to 0 if not present
+        new_position["CASH"] = new_position.get("CASH", 0) + this_symbol_price * amount
+        # POSITION_MODE=sparse drops the symbol once it is sold out
+        new_position = format_positions(new_position)
+
+        # Step 6: Record transaction to position.jsonl file
+        # File path: data/{log_path}/{signature}/position/position.jsonl (see tools/position_ledger.py)
+        # Appending through the ledger (position.jsonl or the SQLite store, see POSITION_BACKEND) keeps its index current
+        # Each operation ID increments by 1, ensuring uniqueness of operation sequence
+        record = {
             "date": today_date,
+            "id": current_action_id + 1,
+            "this_action": {"action": "sell", "symbol": symbol, "amount": amount},
+            "positions": new_position,
         }
+        # Write JSON format transaction record, containing date, operation ID and updated position
+        print(f"Writing to position.jsonl: {json.dumps(record)}")
+        ledger.append(record)
 
-    # Check if position quantity is sufficient for selling
-    if current_position[symbol] < amount:
-        return {
-            "error": "Insufficient shares! This action will not be allowed.",
-            "have": current_position.get(symbol, 0),
-            "want_to_sell": amount,
+        # Step 7: Return updated position
+        write_config_value("IF_TRADE", True)
+        return new_position
+
+
+def _apply_orders(
+    ledger: Any,
+    today_date: str,
+    current_position: Dict[str, Any],
+    current_action_id: int,
+    parsed: List[Tuple[str, str, int, str]],
+    prices: Dict[str, Optional[float]],
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    Apply (action, symbol, amount, market) orders in sequence on a copy of a position snapshot
+
+    Must run inside the position lock and ledger transaction the snapshot was read in.
+
+    Returns:
+        (position, records): the position after the last order and one record per order,
+        or ({"error": ..., "order_index": ...}, []) for the first order that fails validation
+    """
+    position = current_position.copy()
+    bought_in_batch: Dict[str, int] = {}
+    records = []
+    for index, (action, symbol, amount, market) in enumerate(parsed):
+        failed = {
+            "order_index": index,
+            "order": {"action": action, "symbol": symbol, "amount": amount},
             "symbol": symbol,
             "date": today_date,
         }
+        price = prices.get(f"{symbol}_price")
+        if price is None:
+            return {"error": f"Symbol {symbol} not found! No order was executed.", **failed}, []
 
-    # 🇨🇳 Chinese A-shares T+1 trading rule: Cannot sell shares bought on the same day
-    if market == "cn":
-        bought_today = _get_today_buy_amount(symbol, today_date, signature)
-        if bought_today > 0:
-            # Calculate sellable quantity (total position - bought today)
-            sellable_amount = current_position[symbol] - bought_today
-            if amount > sellable_amount:
+        if action == "buy":
+            cash_left = position.get("CASH", 0) - price * amount
+            if cash_left < 0:
+                return {
+                    "error": "Insufficient cash! No order was executed.",
+                    "required_cash": price * amount,
+                    "cash_available": position.get("CASH", 0),
+                    **failed,
+                }, []
+            position["CASH"] = cash_left
+            position[symbol] = position.get(symbol, 0) + amount
+            bought_in_batch[symbol] = bought_in_batch.get(symbol, 0) + amount
+        else:
+            have = position.get(symbol, 0)
+            if have <= 0:
+                return {"error": f"No position for {symbol}! No order was executed.", **failed}, []
+            if have < amount:
                 return {
-                    "error": f"T+1 restriction violated! You bought {bought_today} shares of {symbol} today and cannot sell them until tomorrow.",
-                    "symbol": symbol,
-                    "total_position": current_position[symbol],
-                    "bought_today": bought_today,
-                    "sellable_today": max(0, sellable_amount),
+                    "error": "Insufficient shares! No order was executed.",
+                    "have": have,
                     "want_to_sell": amount,
-                    "date": today_date,
-                }
-
-    # Step 5: Execute sell operation, update position
-    # Create a copy of current position to avoid directly modifying original data
-    new_position = current_position.copy()
-
-    # Decrease stock position quantity
-    new_position[symbol] -= amount
-
-    # Increase cash balance: sell price × sell quantity
-    # Use get method to ensure CASH field exists, default to 0 if not present
-    new_position["CASH"] = new_position.get("CASH", 0) + this_symbol_price * amount
-
-    # Step 6: Record transaction to position.jsonl file
-    # Build file path: {project_root}/data/{log_path}/{signature}/position/position.jsonl
-    # Use append mode ("a") to write new transaction record
-    # Each operation ID increments by 1, ensuring uniqueness of operation sequence
-    log_path = get_config_value("LOG_PATH", "./data/agent_data")
-    if log_path.startswith("./data/"):
-        log_path = log_path[7:]  # Remove "./data/" prefix
-    position_file_path = os.path.join(project_root, "data", log_path, signature, "position", "position.jsonl")
-    with open(position_file_path, "a") as f:
-        # Write JSON format transaction record, containing date, operation ID and updated position
-        print(
-            f"Writing to position.jsonl: {json.dumps({'date': today_date, 'id': current_action_id + 1, 'this_action':{'action':'sell','symbol':symbol,'amount':amount},'positions': new_position})}"
-        )
-        f.write(
-            json.dumps(
-                {
-                    "date": today_date,
-                    "id": current_action_id + 1,
-                    "this_action": {"action": "sell", "symbol": symbol, "amount": amount},
-                    "positions": new_position,
-                }
-            )
-            + "\n"
+                    **failed,
+                }, []
+            # 🇨🇳 T+1: shares bought today, including earlier orders of this batch, cannot be sold
+            if market == "cn":
+                bought_today = ledger.bought_on(today_date, symbol) + bought_in_batch.get(symbol, 0)
+                sellable_amount = have - bought_today
+                if bought_today > 0 and amount > sellable_amount:
+                    return {
+                        "error": f"T+1 restriction violated! You bought {bought_today} shares of {symbol} today and cannot sell them until tomorrow. No order was executed.",
+                        "total_position": have,
+                        "bought_today": bought_today,
+                        "sellable_today": max(0, sellable_amount),
+                        "want_to_sell": amount,
+                        **failed,
+                    }, []
+            position[symbol] = have - amount
+            position["CASH"] = position.get("CASH", 0) + price * amount
+
+        position = format_positions(position)
+        records.append(
+            {
+                "date": today_date,
+                "id": current_action_id + 1 + index,
+                "this_action": {"action": action, "symbol": symbol, "amount": amount},
+                "positions": dict(position),
+            }
         )
+    return position, records
+
+
+@mcp.tool()
+def execute_orders(orders: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Execute several buy / sell orders as one atomic batch
+
+    All orders are validated against one position snapshot and one opening-price lookup and
+    applied in the given order, so a sell can use cash freed by an earlier order of the batch.
+    If any order fails validation, none of them is executed. The executed orders are written
+    to position.jsonl as one batch of records, one record per order.
+
+    Args:
+        orders: List of {"action": "buy" or "sell", "symbol": str, "amount": int}, e.g.
+                [{"action": "sell", "symbol": "AAPL", "amount": 10}, {"action": "buy", "symbol": "NVDA", "amount": 5}]
+                Chinese A-shares (.SH / .SZ) must be traded in multiples of 100 and follow the T+1 rule
 
-    # Step 7: Return updated position
-    write_config_value("IF_TRADE", True)
-    return new_position
+    Returns:
+        Dict[str, Any]:
+          - Success: Returns the position dictionary after the last order (stock quantities and cash balance)
+          - Failure: Returns {"error": error message, "order_index": index of the failing order, ...};
+            no order of the batch was executed
+
+    Example:
+        >>> result = execute_orders([{"action": "sell", "symbol": "AAPL", "amount": 10},
+        ...                          {"action": "buy", "symbol": "MSFT", "amount": 5}])
+        >>> print(result)  # {"AAPL": 90, "MSFT": 10, "CASH": 5100.0, ...}
+    """
+    signature = get_config_value("SIGNATURE")
+    if signature is None:
+        raise ValueError("SIGNATURE environment variable is not set")
+    today_date = get_config_value("TODAY_DATE")
+
+    if not isinstance(orders, list) or not orders:
+        return {"error": "orders must be a non-empty list of {action, symbol, amount}.", "date": today_date}
+
+    # Step 1: Validate the format of every order before touching the position
+    parsed = []
+    for index, order in enumerate(orders):
+        failed = {"order_index": index, "order": order, "date": today_date}
+        if not isinstance(order, dict):
+            return {"error": "Each order must be an object with action, symbol and amount.", **failed}
+        action = str(order.get("action", "")).lower()
+        symbol = order.get("symbol")
+        if action not in ("buy", "sell"):
+            return {"error": f"Invalid action {order.get('action')!r}, must be 'buy' or 'sell'.", **failed}
+        if not isinstance(symbol, str) or not symbol:
+            return {"error": "Order symbol is missing.", **failed}
+        try:
+            amount = int(order.get("amount"))
+        except (TypeError, ValueError):
+            return {
+                "error": f"Invalid amount format. Amount must be an integer for stock trading. You provided: {order.get('amount')}",
+                **failed,
+            }
+        if amount <= 0:
+            return {"error": f"Amount must be positive. You tried to {action} {amount} shares.", **failed}
+        market = "cn" if symbol.endswith((".SH", ".SZ")) else "us"
+        if market == "cn" and amount % 100 != 0:
+            return {
+                "error": f"Chinese A-shares must be traded in multiples of 100 shares (1 lot = 100 shares). You tried to {action} {amount} shares.",
+                "suggestion": f"Please use {(amount // 100) * 100} or {((amount // 100) + 1) * 100} shares instead.",
+                **failed,
+            }
+        parsed.append((action, symbol, amount, market))
+
+    ledger = open_position_ledger(signature)
+    with get_position_lock(signature), ledger.transaction():
+        # Step 2: One position snapshot and one price lookup per market for the whole batch
+        try:
+            current_position, current_action_id = get_latest_position(today_date, signature)
+        except Exception as e:
+            print(e)
+            print(today_date, signature)
+            return {"error": f"Failed to load latest position: {e}", "date": today_date}
+
+        prices: Dict[str, Optional[float]] = {}
+        for market in {market for _, _, _, market in parsed}:
+            symbols = [symbol for _, symbol, _, order_market in parsed if order_market == market]
+            prices.update(get_open_prices(today_date, symbols, market=market))
+
+        # Step 3: Apply the orders in sequence on a copy of the snapshot
+        position, records = _apply_orders(ledger, today_date, current_position, current_action_id, parsed, prices)
+        if "error" in position:
+            return position
+
+        # Step 4: Write the whole batch at once
+        ledger.extend(records)
+        write_config_value("IF_TRADE", True)
+        return position
+
+
+@mcp.tool()
+def rebalance_to_weights(weights: Dict[str, float]) -> Dict[str, Any]:
+    """
+    Rebalance the portfolio to target weights in one atomic batch
+
+    Target shares are computed from the current position and today's opening prices as
+    floor(weight * total value / price), rounded down to 100-share lots for Chinese A-shares.
+    Sells run first and free cash for the buys; if the buys still cost more than the cash
+    available, they are scaled down lot by lot. Held symbols missing from weights are sold,
+    and the weight left over (1 - sum of weights) stays in cash. Shares bought today of
+    A-shares are not sold (T+1). Held symbols without an opening price today are left
+    untouched and reported as skipped; the rest of the portfolio is rebalanced with the
+    weights applied to cash plus the priced holdings. All orders are executed as one batch,
+    like execute_orders.
+
+    Args:
+        weights: {symbol: target weight of total portfolio value}, weights >= 0 and summing to at most 1,
+                 e.g. {"AAPL": 0.3, "NVDA": 0.2} keeps 50% in cash
+
+    Returns:
+        Dict[str, Any]:
+          - Success: {"orders": executed orders [{"action", "symbol", "amount"}], "positions": position after rebalancing,
+                      "skipped": held symbols without an opening price today, left untouched}
+          - Failure: {"error": error message, ...}; no order was executed
+
+    Example:
+        >>> result = rebalance_to_weights({"AAPL": 0.5, "MSFT": 0.3})
+        >>> print(result)  # {"orders": [{"action": "sell", "symbol": "NVDA", "amount": 10}, ...], "positions": {...}}
+    """
+    signature = get_config_value("SIGNATURE")
+    if signature is None:
+        raise ValueError("SIGNATURE environment variable is not set")
+    today_date = get_config_value("TODAY_DATE")
+
+    # Step 1: Validate the target weights
+    if not isinstance(weights, dict):
+        return {"error": "weights must be an object of {symbol: weight}.", "date": today_date}
+    try:
+        weights = {str(symbol): float(weight) for symbol, weight in weights.items() if symbol != "CASH"}
+    except (TypeError, ValueError):
+        return {"error": "Every weight must be a number.", "weights": weights, "date": today_date}
+    if any(weight < 0 for weight in weights.values()):
+        return {"error": "Weights must not be negative.", "weights": weights, "date": today_date}
+    if sum(weights.values()) > 1 + WEIGHT_SUM_TOLERANCE:
+        return {"error": f"Weights sum to {sum(weights.values()):.4f}, must be at most 1.", "weights": weights, "date": today_date}
+
+    ledger = open_position_ledger(signature)
+    with get_position_lock(signature), ledger.transaction():
+        # Step 2: One position snapshot and one price lookup per market
+        try:
+            current_position, current_action_id = get_latest_position(today_date, signature)
+        except Exception as e:
+            print(e)
+            print(today_date, signature)
+            return {"error": f"Failed to load latest position: {e}", "date": today_date}
+
+        held = [symbol for symbol, amount in current_position.items() if symbol != "CASH" and amount]
+        symbols = list(dict.fromkeys([*weights, *held]))
+        markets = ["cn" if symbol.endswith((".SH", ".SZ")) else "us" for symbol in symbols]
+        prices: Dict[str, Optional[float]] = {}
+        for market in set(markets):
+            prices.update(get_open_prices(today_date, [s for s, m in zip(symbols, markets) if m == market], market=market))
+        # Held symbols without a price today cannot be valued or traded: leave them as they are
+        skipped = [symbol for symbol in held if prices.get(f"{symbol}_price") is None]
+        missing = [symbol for symbol in weights if prices.get(f"{symbol}_price") is None and symbol not in skipped]
+        if missing:
+            return {"error": f"No opening price for {missing} today! No order was executed.", "date": today_date}
+        if skipped:
+            print(f"⚠️  No opening price for held {skipped} today, leaving them untouched")
+            markets = [market for symbol, market in zip(symbols, markets) if symbol not in skipped]
+            symbols = [symbol for symbol in symbols if symbol not in skipped]
+
+        # Step 3: Target shares and deltas for all symbols in one vectorized pass
+        price = np.array([prices[f"{symbol}_price"] for symbol in symbols], dtype=np.float64)
+        holdings = np.array([current_position.get(symbol, 0) for symbol in symbols], dtype=np.float64)
+        target_weights = np.array([weights.get(symbol, 0.0) for symbol in symbols], dtype=np.float64)
+        lots = np.array([100 if market == "cn" else 1 for market in markets], dtype=np.float64)
+        cash = float(current_position.get("CASH", 0))
+
+        total_value = cash + float(holdings @ price)
+        target = np.floor(target_weights * total_value / price / lots) * lots
+        delta = target - holdings
+
+        # 🇨🇳 T+1: A-share shares bought today cannot be sold
+        sellable = holdings.copy()
+        for i, (symbol, market) in enumerate(zip(symbols, markets)):
+            if market == "cn":
+                sellable[i] = max(holdings[i] - ledger.bought_on(today_date, symbol), 0)
+        sells = np.minimum(np.clip(-delta, 0, None), sellable)
+        buys = np.clip(delta, 0, None)
+
+        # Cash limit: scale the buys down to whole lots if sells do not free enough cash
+        budget = (cash + float(sells @ price)) * (1 - CASH_BUFFER)
+        cost = float(buys @ price)
+        if cost > budget:
+            buys = np.floor(buys * (budget / cost) / lots) * lots
+
+        parsed = [("sell", symbols[i], int(sells[i]), markets[i]) for i in np.flatnonzero(sells > 0)]
+        parsed += [("buy", symbols[i], int(buys[i]), markets[i]) for i in np.flatnonzero(buys > 0)]
+        orders = [{"action": action, "symbol": symbol, "amount": amount} for action, symbol, amount, _ in parsed]
+        if not parsed:
+            return {"orders": [], "positions": current_position, "skipped": skipped}
+
+        # Step 4: Execute the orders as one batch
+        position, records = _apply_orders(ledger, today_date, current_position, current_action_id, parsed, prices)
+        if "error" in position:
+            return position
+
+        ledger.extend(records)
+        write_config_value("IF_TRADE", True)
+        return {"orders": orders, "positions": position, "skipped": skipped}
 
 
 if __name__ == "__main__":
@@ -410,4 +634,4 @@ if __name__ == "__main__":
     # new_result = sell("AAPL", 1)
     # print(new_result)
     port = int(os.getenv("TRADE_HTTP_PORT", "8002"))
-    mcp.run(transport="streamable-http", port=port)
+    run_mcp_server(mcp, "trade", port)
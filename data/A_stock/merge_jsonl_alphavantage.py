@@ -1,6 +1,7 @@
 import glob
 import json
 import os
+import sys
 import csv
 from pathlib import Path
 
@@ -92,7 +93,9 @@ output_file = os.path.join(current_dir, "merged.jsonl")
 processed_count = 0
 skipped_count = 0
 
-with open(output_file, "w", encoding="utf-8") as fout:
+# 先写入临时文件再原子替换，正在运行的 MCP 服务不会读到写了一半的文件
+tmp_output_file = output_file + ".tmp"
+with open(tmp_output_file, "w", encoding="utf-8") as fout:
     for fp in files:
         basename = os.path.basename(fp)
         # 仅当文件名包含任一纳指100成分符号时才写入
@@ -151,6 +154,7 @@ with open(output_file, "w", encoding="utf-8") as fout:
             pass
 
         fout.write(json.dumps(data, ensure_ascii=False) + "\n")
+os.replace(tmp_output_file, output_file)
 
 print(f"✅ 合并完成!")
 print(f"📊 统计信息:")
@@ -158,3 +162,9 @@ print(f"   - 成功处理: {processed_count} 个文件")
 print(f"   - 跳过文件: {skipped_count} 个文件")
 print(f"   - 输出文件: {output_file}")
 
+# 为 merged.jsonl 生成 symbol -> 字节偏移 的 sidecar 索引，供 get_price_local 直接 seek
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tools.merged_index import write_index
+
+write_index(output_file)
+
@@ -1,5 +1,6 @@
 import json
 import os
+import sys
 from pathlib import Path
 from typing import Any, Dict
 
@@ -59,7 +60,9 @@ def convert_a_stock_to_jsonl(
 
     print(f"Processing {len(grouped)} stocks...")
 
-    with open(output_path, "w", encoding="utf-8") as fout:
+    # Write to a temp file and swap it in atomically so running MCP servers never read a half-written file
+    tmp_output_path = output_path.with_name(output_path.name + ".tmp")
+    with open(tmp_output_path, "w", encoding="utf-8") as fout:
         for ts_code, group_df in grouped:
             # Sort by date ascending
             group_df = group_df.sort_values("trade_date", ascending=True)
@@ -107,6 +110,13 @@ def convert_a_stock_to_jsonl(
 
             # Write to JSONL file
             fout.write(json.dumps(json_obj, ensure_ascii=False) + "\n")
+    os.replace(tmp_output_path, output_path)
+
+    # Write the symbol -> byte offset sidecar index used by get_price_local
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+    from tools.merged_index import write_index
+
+    write_index(output_path)
 
     print(f"✅ Data conversion completed: {output_path}")
     print(f"✅ Total stocks: {len(grouped)}")
@@ -20,6 +20,7 @@ import glob
 import json
 import os
 import shutil
+import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -133,7 +134,9 @@ print(f"Output file: {output_file}")
 # Create backup of existing file if it exists
 backup_crypto_data()
 
-with open(output_file, "w", encoding="utf-8") as fout:
+# 先写入临时文件再原子替换，正在运行的 MCP 服务不会读到写了一半的文件
+tmp_output_file = output_file + ".tmp"
+with open(tmp_output_file, "w", encoding="utf-8") as fout:
     for fp in files:
         basename = os.path.basename(fp)
         print(f"Processing: {basename}")
@@ -199,10 +202,17 @@ with open(output_file, "w", encoding="utf-8") as fout:
         # Write to merged file
         fout.write(json.dumps(data, ensure_ascii=False) + "\n")
         print(f"  Added to merged file")
+os.replace(tmp_output_file, output_file)
 
 print(f"\nCrypto merge complete! Output saved to: {output_file}")
 processed_count = len([f for f in files if any(symbol in os.path.basename(f) for symbol in crypto_symbols_usdt)])
 print(f"Total symbols processed: {processed_count}")
 
+# Write the symbol -> byte offset sidecar index used by get_price_local
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tools.merged_index import write_index
+
+write_index(output_file)
+
 # Verify that symbol fixes were applied correctly
 verify_symbol_fixes()
\ No newline at end of file
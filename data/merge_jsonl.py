@@ -1,6 +1,7 @@
 import glob
 import json
 import os
+import sys
 
 all_nasdaq_100_symbols = [
     "NVDA",
@@ -113,7 +114,9 @@ files = sorted(glob.glob(pattern))
 
 output_file = os.path.join(current_dir, "merged.jsonl")
 
-with open(output_file, "w", encoding="utf-8") as fout:
+# 先写入临时文件再原子替换，正在运行的 MCP 服务不会读到写了一半的文件
+tmp_output_file = output_file + ".tmp"
+with open(tmp_output_file, "w", encoding="utf-8") as fout:
     for fp in files:
         basename = os.path.basename(fp)
         # 仅当文件名包含任一纳指100成分符号时才写入
@@ -154,3 +157,10 @@ with open(output_file, "w", encoding="utf-8") as fout:
             pass
 
         fout.write(json.dumps(data, ensure_ascii=False) + "\n")
+os.replace(tmp_output_file, output_file)
+
+# 为 merged.jsonl 生成 symbol -> 字节偏移 的 sidecar 索引，供 get_price_local 直接 seek
+sys.path.insert(0, os.path.dirname(os.path.abspath(current_dir)))
+from tools.merged_index import write_index
+
+write_index(output_file)
@@ -78,9 +78,25 @@ class DataLoader {
 
             const text = await response.text();
             const lines = text.trim().split('\n').filter(line => line.trim() !== '');
+            // Records may be stored as periodic full snapshots ("positions") with deltas ("delta") in between
+            let state = {};
             const positions = lines.map(line => {
                 try {
-                    return JSON.parse(line);
+                    const record = JSON.parse(line);
+                    if (record.positions) {
+                        state = { ...record.positions };
+                    } else if (record.delta) {
+                        Object.entries(record.delta).forEach(([symbol, value]) => {
+                            if (value === null) {
+                                delete state[symbol];
+                            } else {
+                                state[symbol] = value;
+                            }
+                        });
+                        record.positions = { ...state };
+                        delete record.delta;
+                    }
+                    return record;
                 } catch (parseError) {
                     console.error(`Error parsing line for ${agentName}:`, line, parseError);
                     return null;
@@ -46,12 +46,26 @@ class TransactionLoader {
 
             const text = await response.text();
 
+            // Records may be stored as periodic full snapshots ("positions") with deltas ("delta") in between
+            let state = {};
             const transactions = text
                 .trim()
                 .split('\n')
                 .filter(line => line.trim())
                 .map(line => {
                     const data = JSON.parse(line);
+                    if (data.positions) {
+                        state = { ...data.positions };
+                    } else if (data.delta) {
+                        Object.entries(data.delta).forEach(([symbol, value]) => {
+                            if (value === null) {
+                                delete state[symbol];
+                            } else {
+                                state[symbol] = value;
+                            }
+                        });
+                        data.positions = { ...state };
+                    }
                     return {
                         agentFolder: agentFolder,
                         date: data.date,
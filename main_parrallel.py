@@ -9,7 +9,7 @@ import argparse
 load_dotenv()
 
 # Import tools and prompts
-from tools.general_tools import write_config_value
+from tools.general_tools import update_config
 from prompts.agent_prompt import all_nasdaq_100_symbols
 
 
@@ -122,8 +122,7 @@ async def _run_model_in_current_process(AgentClass, model_config, INIT_DATE, END
     runtime_env_path = runtime_env_dir / ".runtime_env.json"
     os.environ["RUNTIME_ENV_PATH"] = str(runtime_env_path)
     os.environ["SIGNATURE"] = signature
-    write_config_value("TODAY_DATE", END_DATE)
-    write_config_value("IF_TRADE", False)
+    update_config(TODAY_DATE=END_DATE, IF_TRADE=False)
 
     max_steps = agent_config.get("max_steps", 10)
     max_retries = agent_config.get("max_retries", 3)
@@ -0,0 +1,64 @@
+"""
+Shared pytest fixtures
+Every test gets its own runtime env file (RUNTIME_ENV_PATH under tmp_path), so config writes of
+the tools under test never touch data/.runtime_env.json. make_merged writes small merged.jsonl
+files in the Alpha Vantage layout the merge scripts produce.
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pytest
+
+# 将项目根目录加入 Python 路径，测试以 tools.* / agent_tools.* 导入被测模块
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+
+def symbol_doc(
+    symbol: str,
+    bars: Dict[str, Tuple[float, float]],
+    series_key: str = "Time Series (60min)",
+    name: Optional[str] = None,
+) -> dict:
+    """merged.jsonl document of one symbol; bars maps timestamp -> (open, close)"""
+    meta = {"2. Symbol": symbol}
+    if name:
+        meta["2.1. Name"] = name
+    series = {
+        ts: {
+            "1. buy price": str(open_),
+            "2. high": str(max(open_, close)),
+            "3. low": str(min(open_, close)),
+            "4. sell price": str(close),
+            "5. volume": "1000",
+        }
+        for ts, (open_, close) in bars.items()
+    }
+    return {"Meta Data": meta, series_key: series}
+
+
+@pytest.fixture(autouse=True)
+def runtime_env(tmp_path, monkeypatch) -> Path:
+    """Runtime env file of the test"""
+    path = tmp_path / "runtime_env.json"
+    monkeypatch.setenv("RUNTIME_ENV_PATH", str(path))
+    return path
+
+
+@pytest.fixture
+def make_merged(tmp_path):
+    """Write a merged.jsonl from symbol_doc() documents and return its path"""
+
+    def make(docs: List[dict], name: str = "merged.jsonl") -> Path:
+        path = tmp_path / name
+        with path.open("w", encoding="utf-8") as f:
+            for doc in docs:
+                f.write(json.dumps(doc) + "\n")
+        return path
+
+    return make
@@ -0,0 +1,92 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from tools import general_tools
+from tools.general_tools import get_config_value, update_config, write_config_value
+
+
+def write_env(path, data):
+    """Replace the runtime env file the way update_config does"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(data))
+    os.replace(tmp_path, path)
+
+
+@pytest.fixture
+def json_loads(monkeypatch):
+    calls = []
+    real_load = json.load
+    monkeypatch.setattr(general_tools.json, "load", lambda f: (calls.append(f.name), real_load(f))[1])
+    return calls
+
+
+def test_runtime_env_is_parsed_once_per_version(runtime_env, json_loads):
+    write_env(runtime_env, {"SIGNATURE": "a", "MARKET": "us"})
+    assert get_config_value("SIGNATURE") == "a"
+    assert get_config_value("MARKET") == "us"
+    assert len(json_loads) == 1
+
+    write_env(runtime_env, {"SIGNATURE": "b"})
+    assert get_config_value("SIGNATURE") == "b"
+    assert get_config_value("MARKET", "cn") == "cn"
+    assert len(json_loads) == 2
+
+
+def test_fallbacks(runtime_env, monkeypatch):
+    assert get_config_value("SIGNATURE", "default") == "default"
+    monkeypatch.setenv("POSITION_MODE", "sparse")
+    assert get_config_value("POSITION_MODE") == "sparse"
+    write_env(runtime_env, {"POSITION_MODE": "dense"})
+    assert get_config_value("POSITION_MODE") == "dense"
+
+
+def test_incomplete_file_is_not_cached(runtime_env):
+    runtime_env.write_text('{"SIGNATURE": "a"')
+    assert get_config_value("SIGNATURE") is None
+    assert str(runtime_env) not in general_tools._runtime_env_cache
+    write_env(runtime_env, {"SIGNATURE": "a"})
+    assert get_config_value("SIGNATURE") == "a"
+
+
+def test_update_config_merges_values(runtime_env):
+    write_env(runtime_env, {"SIGNATURE": "a", "IF_TRADE": True})
+    update_config(TODAY_DATE="2025-10-01", IF_TRADE=False)
+    assert json.loads(runtime_env.read_text()) == {"SIGNATURE": "a", "IF_TRADE": False, "TODAY_DATE": "2025-10-01"}
+    write_config_value("MARKET", "cn")
+    assert get_config_value("MARKET") == "cn" and get_config_value("IF_TRADE") is False
+    # 临时文件已通过 os.replace 换入
+    assert sorted(p.name for p in runtime_env.parent.iterdir() if p.name.startswith(runtime_env.name)) == [
+        runtime_env.name,
+        runtime_env.name + ".lock",
+    ]
+
+
+WRITER = """
+import sys
+sys.path.insert(0, {root!r})
+from tools.general_tools import update_config
+for i in range({writes}):
+    update_config(**{{f"W{{sys.argv[1]}}_{{i}}": i, "LAST": sys.argv[1]}})
+"""
+
+
+def test_update_config_is_atomic_across_processes(runtime_env):
+    update_config(SIGNATURE="a")
+    writes = 30
+    script = WRITER.format(root=os.path.dirname(os.path.dirname(general_tools.__file__)), writes=writes)
+    processes = [
+        subprocess.Popen([sys.executable, "-c", script, str(n)], env=dict(os.environ, RUNTIME_ENV_PATH=str(runtime_env)))
+        for n in range(4)
+    ]
+    # 并发写入期间，读者看到的总是完整的旧文件或新文件
+    while any(process.poll() is None for process in processes):
+        assert isinstance(json.loads(runtime_env.read_text()), dict)
+    assert all(process.returncode == 0 for process in processes)
+
+    data = json.loads(runtime_env.read_text())
+    assert all(data.get(f"W{n}_{i}") == i for n in range(4) for i in range(writes))
+    assert data["SIGNATURE"] == "a"
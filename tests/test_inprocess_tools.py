@@ -0,0 +1,83 @@
+import asyncio
+import textwrap
+
+import pytest
+from fastmcp import Client
+from pydantic import ValidationError
+
+from agent_tools import tool_math
+from tools.inprocess_tools import load_agent_tools, load_in_process_tools, split_mcp_config
+from tools.mcp_context import set_context_headers
+
+MATH = {"transport": "in_process", "module": "agent_tools.tool_math"}
+
+
+@pytest.fixture
+def context_module(tmp_path, monkeypatch):
+    """Importable FastMCP server module whose tool reports the trading context it runs in"""
+    (tmp_path / "context_tools.py").write_text(
+        textwrap.dedent(
+            """
+            from fastmcp import FastMCP
+            from tools.general_tools import get_config_value
+
+            mcp = FastMCP("ContextTools")
+
+            @mcp.tool()
+            def whoami() -> dict:
+                return {"signature": get_config_value("SIGNATURE"), "date": get_config_value("TODAY_DATE")}
+            """
+        )
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    return "context_tools"
+
+
+def test_split_mcp_config():
+    config = {"math": MATH, "search": {"transport": "streamable_http", "url": "http://localhost:8001/mcp"}}
+    remote, local = split_mcp_config(config)
+    assert list(remote) == ["search"] and list(local) == ["math"]
+
+
+def test_tools_match_the_mcp_server():
+    tools = {tool.name: tool for tool in asyncio.run(load_in_process_tools("math", dict(MATH)))}
+    assert set(tools) == {"add", "multiply"}
+
+    async def over_mcp():
+        async with Client(tool_math.mcp) as client:
+            listed = {tool.name: tool for tool in await client.list_tools()}
+            result = await client.call_tool("add", {"a": 2, "b": 3})
+            return listed, result.content[0].text
+
+    listed, text = asyncio.run(over_mcp())
+    assert tools["add"].args == listed["add"].inputSchema["properties"]
+    assert tools["add"].description == listed["add"].description
+    assert tools["add"].invoke({"a": 2, "b": 3}) == text
+    with pytest.raises(ValidationError):
+        tools["add"].invoke({"a": "two", "b": 3})
+
+
+def test_tools_filter():
+    tools = asyncio.run(load_in_process_tools("math", dict(MATH, tools=["multiply"])))
+    assert [tool.name for tool in tools] == ["multiply"]
+
+
+def test_context_is_read_on_every_call(context_module, runtime_env):
+    config = {"ctx": {"transport": "in_process", "module": context_module}}
+    client, tools = asyncio.run(load_agent_tools(config))
+    assert client is None
+
+    set_context_headers(config, SIGNATURE="sig", TODAY_DATE="2025-10-09")
+    assert tools[0].invoke({}) == '{"signature":"sig","date":"2025-10-09"}'
+    # 已加载的工具随 context 原地更新
+    set_context_headers(config, TODAY_DATE="2025-10-10")
+    assert tools[0].invoke({}) == '{"signature":"sig","date":"2025-10-10"}'
+
+
+@pytest.mark.parametrize(
+    "connection, message",
+    [({"transport": "in_process"}, "has no 'module'"), ({"transport": "in_process", "module": "tools.price_store"}, "no FastMCP server")],
+)
+def test_invalid_connections(connection, message):
+    with pytest.raises(ValueError, match=message):
+        asyncio.run(load_in_process_tools("bad", connection))
@@ -0,0 +1,125 @@
+import asyncio
+import json
+
+import pytest
+from fastmcp import Client, FastMCP
+from fastmcp.exceptions import ToolError
+
+from tools.general_tools import get_config_value, trading_context, update_config
+from tools.mcp_context import (CONTEXT_HEADERS, context_headers, install_trading_context, set_context_headers,
+                               validate_context)
+
+
+def test_context_headers():
+    assert context_headers(SIGNATURE="sig", TODAY_DATE="2025-10-09", MARKET=None) == {
+        "x-trading-signature": "sig",
+        "x-trading-today-date": "2025-10-09",
+    }
+
+
+def test_set_context_headers_updates_connections_in_place():
+    config = {
+        "trade": {"transport": "streamable_http", "url": "http://localhost:8002/mcp", "headers": {"x-other": "1"}},
+        "math": {"transport": "in_process", "module": "agent_tools.tool_math"},
+        "search": {"transport": "stdio", "command": "search"},
+    }
+    set_context_headers(config, SIGNATURE="sig", MARKET="cn")
+    set_context_headers(config, TODAY_DATE="2025-10-10", LOG_PATH=None)
+    assert config["trade"]["headers"] == {
+        "x-other": "1",
+        "x-trading-signature": "sig",
+        "x-trading-market": "cn",
+        "x-trading-today-date": "2025-10-10",
+    }
+    assert config["math"]["context"] == {"SIGNATURE": "sig", "MARKET": "cn", "TODAY_DATE": "2025-10-10"}
+    assert "headers" not in config["search"] and "context" not in config["search"]
+
+
+def test_trading_context_overrides_the_runtime_env(runtime_env, tmp_path):
+    update_config(SIGNATURE="file", MARKET="us")
+    with trading_context(SIGNATURE="ctx"):
+        with trading_context(MARKET="cn", TODAY_DATE=None):
+            assert (get_config_value("SIGNATURE"), get_config_value("MARKET")) == ("ctx", "cn")
+        assert get_config_value("MARKET") == "us"
+    assert get_config_value("SIGNATURE") == "file"
+
+    # RUNTIME_ENV_PATH 把读写重定向到调用方的文件
+    other = tmp_path / "other_runtime_env.json"
+    with trading_context(RUNTIME_ENV_PATH=str(other)):
+        update_config(IF_TRADE=True)
+        assert get_config_value("IF_TRADE") is True
+    assert json.loads(other.read_text()) == {"IF_TRADE": True}
+    assert get_config_value("IF_TRADE") is None
+
+
+@pytest.mark.parametrize(
+    "values",
+    [
+        {},
+        {"SIGNATURE": "gpt-5", "LOG_PATH": "./data/agent_data", "MARKET": "cn", "TODAY_DATE": "2025-10-09 10:00:00"},
+        {"LOG_PATH": "agent_data_astock"},
+        {"RUNTIME_ENV_PATH": "data/.runtime_env.json"},
+        {"SIGNATURE": "a..b", "LOG_PATH": "logs/v1..v2"},
+    ],
+)
+def test_valid_contexts(values):
+    assert validate_context(values) is None
+
+
+def test_absolute_agent_paths_are_valid(tmp_path):
+    # agent 以 self.base_log_path 和 runtime_env_path() 发送绝对路径
+    values = {
+        "SIGNATURE": "sig",
+        "LOG_PATH": str(tmp_path / "agent_data"),
+        "RUNTIME_ENV_PATH": str(tmp_path / "runtime_env.json"),
+    }
+    assert validate_context(values) is None
+
+
+@pytest.mark.parametrize(
+    "values, reason",
+    [
+        ({"SIGNATURE": ".."}, "invalid signature"),
+        ({"SIGNATURE": "a/../../b"}, "invalid signature"),
+        ({"LOG_PATH": "../../tmp"}, "'..' segments"),
+        ({"LOG_PATH": "/srv/agent_data/../../etc"}, "'..' segments"),
+        ({"RUNTIME_ENV_PATH": "data/../../runtime_env.json"}, "'..' segments"),
+        ({"RUNTIME_ENV_PATH": "data\\..\\runtime_env.json"}, "'..' segments"),
+        ({"MARKET": "fx"}, "unknown market"),
+        ({"TODAY_DATE": "yesterday"}, "invalid date"),
+    ],
+)
+def test_invalid_contexts(values, reason):
+    assert reason in validate_context(values)
+
+
+def serve(monkeypatch, headers):
+    """FastMCP server with the trading context middleware, receiving headers as HTTP request headers"""
+    monkeypatch.setattr("fastmcp.server.dependencies.get_http_headers", lambda: headers)
+    mcp = FastMCP("ContextTest")
+    install_trading_context(mcp)
+
+    @mcp.tool()
+    def whoami() -> str:
+        return f"{get_config_value('SIGNATURE')}@{get_config_value('TODAY_DATE')}"
+
+    return mcp
+
+
+async def call_whoami(mcp):
+    async with Client(mcp) as client:
+        result = await client.call_tool("whoami", {})
+        return result.content[0].text
+
+
+def test_middleware_applies_the_request_context(monkeypatch, runtime_env):
+    update_config(SIGNATURE="file", TODAY_DATE="2025-10-01")
+    headers = {CONTEXT_HEADERS["SIGNATURE"]: "sig", CONTEXT_HEADERS["TODAY_DATE"]: "2025-10-09"}
+    assert asyncio.run(call_whoami(serve(monkeypatch, headers))) == "sig@2025-10-09"
+    assert asyncio.run(call_whoami(serve(monkeypatch, {}))) == "file@2025-10-01"
+
+
+def test_middleware_rejects_an_invalid_context(monkeypatch):
+    mcp = serve(monkeypatch, {CONTEXT_HEADERS["LOG_PATH"]: "../../etc"})
+    with pytest.raises(ToolError, match="Rejected trading context"):
+        asyncio.run(call_whoami(mcp))
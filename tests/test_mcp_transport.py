@@ -0,0 +1,102 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from tools.mcp_transport import (IN_PROCESS_MODULES, get_in_process_services, get_mcp_transport,
+                                 get_socket_path, is_service_listening, mcp_connection,
+                                 uds_client_factory)
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def socket_dir(monkeypatch):
+    # AF_UNIX 路径长度有限（约 108 字节），不使用可能很长的 tmp_path
+    path = f"/tmp/mcp-test-{os.getpid()}"
+    os.makedirs(path, exist_ok=True)
+    monkeypatch.setenv("MCP_SOCKET_DIR", path)
+    yield path
+    for name in os.listdir(path):
+        os.remove(os.path.join(path, name))
+    os.rmdir(path)
+
+
+@pytest.mark.parametrize("value, expected", [(None, "http"), ("uds", "uds"), (" UDS ", "uds"), ("grpc", "http")])
+def test_get_mcp_transport(monkeypatch, value, expected):
+    if value is None:
+        monkeypatch.delenv("MCP_TRANSPORT", raising=False)
+    else:
+        monkeypatch.setenv("MCP_TRANSPORT", value)
+    assert get_mcp_transport() == expected
+
+
+def test_get_in_process_services(monkeypatch):
+    monkeypatch.setenv("MCP_IN_PROCESS", "math, Trade,search,,")
+    assert get_in_process_services() == {"math", "trade"}
+
+
+def test_mcp_connection(monkeypatch, socket_dir):
+    monkeypatch.delenv("MCP_IN_PROCESS", raising=False)
+    monkeypatch.delenv("MCP_TRANSPORT", raising=False)
+    assert mcp_connection("trade", 8002) == {"transport": "streamable_http", "url": "http://localhost:8002/mcp"}
+
+    monkeypatch.setenv("MCP_TRANSPORT", "uds")
+    connection = mcp_connection("trade", 8002)
+    assert connection["url"] == "http://localhost/mcp" and callable(connection["httpx_client_factory"])
+    assert get_socket_path("trade") == os.path.join(socket_dir, "trade.sock")
+
+    monkeypatch.setenv("MCP_IN_PROCESS", "trade")
+    assert mcp_connection("trade", 8002) == {"transport": "in_process", "module": IN_PROCESS_MODULES["trade"]}
+
+
+def test_is_service_listening(socket_dir):
+    assert not is_service_listening("math", 0, "uds")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(get_socket_path("math"))
+        server.listen()
+        assert is_service_listening("math", 0, "uds")
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server:
+        server.bind(("localhost", 0))
+        server.listen()
+        port = server.getsockname()[1]
+        assert is_service_listening("math", port, "http")
+    assert not is_service_listening("math", port, "http")
+
+
+async def call_add(socket_path):
+    from mcp import ClientSession
+    from mcp.client.streamable_http import streamablehttp_client
+
+    async with streamablehttp_client("http://localhost/mcp", httpx_client_factory=uds_client_factory(socket_path)) as (read, write, _):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            result = await session.call_tool("add", {"a": 2, "b": 3})
+            return result.content[0].text
+
+
+def test_tool_server_over_a_unix_socket(socket_dir):
+    socket_path = get_socket_path("math")
+    # 上次异常退出留下的 socket 文件
+    open(socket_path, "w").close()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(project_root, "agent_tools", "tool_math.py")],
+        env=dict(os.environ, MCP_TRANSPORT="uds", MCP_SOCKET_DIR=socket_dir),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.time() + 60
+        while not is_service_listening("math", 0, "uds"):
+            assert process.poll() is None, "tool_math.py exited"
+            assert time.time() < deadline, "tool_math.py did not start"
+            time.sleep(0.2)
+        assert asyncio.run(call_add(socket_path)) == "5.0"
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
@@ -0,0 +1,73 @@
+import json
+import os
+
+import pytest
+
+from tests.conftest import symbol_doc
+from tools.merged_index import build_index, get_index_path, load_index, read_symbol_doc, write_index
+
+
+@pytest.fixture
+def merged(make_merged):
+    return make_merged(
+        [
+            symbol_doc("AAPL", {"2025-10-01 10:00:00": (10.0, 11.0)}),
+            symbol_doc("MSFT", {"2025-10-01 10:00:00": (20.0, 21.0)}),
+        ]
+    )
+
+
+def replace_file(path, docs):
+    """Rewrite path the way the merge scripts do: temporary file + os.replace"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text("".join(json.dumps(doc) + "\n" for doc in docs))
+    os.replace(tmp_path, path)
+
+
+def test_read_symbol_doc(merged):
+    doc = read_symbol_doc(merged, "MSFT")
+    assert doc["Meta Data"]["2. Symbol"] == "MSFT"
+    assert read_symbol_doc(merged, "ZZZZ") is None
+    assert read_symbol_doc(merged.with_name("missing.jsonl"), "MSFT") is None
+
+
+def test_index_is_persisted_as_sidecar(merged):
+    index = load_index(merged)
+    assert set(index["symbols"]) == {"AAPL", "MSFT"}
+    with open(get_index_path(merged), encoding="utf-8") as f:
+        assert json.load(f)["symbols"] == json.loads(json.dumps(index["symbols"]))
+
+
+def test_read_symbol_doc_after_the_file_is_replaced(merged):
+    assert read_symbol_doc(merged, "MSFT") is not None
+    # 新文件中 MSFT 行的偏移与旧索引不同
+    replace_file(
+        merged,
+        [
+            symbol_doc("NVDA", {"2025-10-01 10:00:00": (1.0, 2.0), "2025-10-01 11:00:00": (2.0, 3.0)}),
+            symbol_doc("MSFT", {"2025-10-01 10:00:00": (30.0, 31.0)}),
+        ],
+    )
+    doc = read_symbol_doc(merged, "MSFT")
+    assert doc["Time Series (60min)"]["2025-10-01 10:00:00"]["1. buy price"] == "30.0"
+    assert read_symbol_doc(merged, "AAPL") is None
+    assert load_index(merged)["size"] == merged.stat().st_size
+
+
+def test_stale_sidecar_is_rebuilt(merged):
+    load_index(merged)
+    sidecar = get_index_path(merged)
+    stale = json.loads(sidecar.read_text())
+    replace_file(merged, [symbol_doc("TSLA", {"2025-10-01 10:00:00": (5.0, 6.0)})])
+    sidecar.write_text(json.dumps(stale))
+    assert set(load_index(merged)["symbols"]) == {"TSLA"}
+    assert build_index(merged)["symbols"] == load_index(merged)["symbols"]
+
+
+def test_write_index_leaves_no_temporary_file(merged):
+    write_index(merged)
+    write_index(merged)
+    assert sorted(p.name for p in merged.parent.iterdir() if p.name.startswith(merged.name)) == [
+        merged.name,
+        get_index_path(merged).name,
+    ]
@@ -0,0 +1,146 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+from tools.position_db import SCHEMA_VERSION, SqlitePositionLedger, connect
+from tools.position_ledger import PositionLedger, get_position_ledger
+
+
+def record(i, date, positions, action=None, symbol=None, amount=0):
+    this_action = {"action": action, "symbol": symbol, "amount": amount} if action else {}
+    return {"date": date, "id": i, "this_action": this_action, "positions": positions}
+
+
+HISTORY = [
+    record(0, "2025-10-09", {"A": 0, "B": 0, "CASH": 1000}),
+    record(1, "2025-10-09", {"A": 100, "B": 0, "CASH": 500}, "buy", "A", 100),
+    record(2, "2025-10-09", {"A": 100, "B": 10, "CASH": 400}, "buy", "B", 10),
+    record(3, "2025-10-10 10:00:00", {"A": 50, "B": 10, "CASH": 650}, "sell", "A", 50),
+    record(4, "2025-10-10 11:00:00", {"A": 70, "B": 10, "CASH": 550}, "buy", "A", 20),
+    record(4, "2025-10-10 11:00:00", {"A": 0, "B": 0, "CASH": 0}),
+    record(5, "2025-10-13", {"A": 70, "B": 0, "CASH": 600}, "sell", "B", 10),
+]
+
+PROBES = ["2025-10-08", "2025-10-09", "2025-10-10", "2025-10-10 10:30:00", "2025-10-10 11:00:00", "2025-10-11", "2025-10-13", "2026-01-01"]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / "log" / "sig" / "position" / "position.jsonl"
+
+
+@pytest.fixture
+def ledger(tmp_path, path):
+    return SqlitePositionLedger("sig", "cn", tmp_path / "positions.db", path)
+
+
+def row_count(ledger):
+    return connect(ledger.db_path).execute("SELECT COUNT(*) FROM records WHERE ledger = ?", (ledger.key,)).fetchone()[0]
+
+
+def assert_same_answers(sqlite_ledger, jsonl_ledger):
+    assert sqlite_ledger.get_latest() == jsonl_ledger.get_latest()
+    assert sqlite_ledger.range() == jsonl_ledger.range()
+    for probe in PROBES:
+        assert sqlite_ledger.as_of(probe) == jsonl_ledger.as_of(probe), probe
+        assert sqlite_ledger.latest_on(probe) == jsonl_ledger.latest_on(probe), probe
+        assert sqlite_ledger.latest_before(probe) == jsonl_ledger.latest_before(probe), probe
+        for symbol in ("A", "B"):
+            assert sqlite_ledger.bought_on(probe, symbol) == jsonl_ledger.bought_on(probe, symbol), probe
+        for end in PROBES:
+            assert sqlite_ledger.range(probe, end) == jsonl_ledger.range(probe, end), (probe, end)
+
+
+@pytest.mark.parametrize("interval", ["0", "3"])
+def test_same_answers_as_the_jsonl_ledger(ledger, path, monkeypatch, interval):
+    monkeypatch.setenv("POSITION_SNAPSHOT_INTERVAL", interval)
+    ledger.extend(HISTORY[:3])
+    for r in HISTORY[3:]:
+        ledger.append(r)
+    assert ledger.bought_on("2025-10-09", "A") == 100
+    assert ledger.bought_on("2025-10-10 09:00:00", "A") == 20
+    assert_same_answers(ledger, PositionLedger(path))
+
+
+def test_outside_appends_are_imported_from_the_offset(ledger, path, monkeypatch):
+    ledger.extend(HISTORY[:3])
+    conn = connect(ledger.db_path)
+    first_seq = conn.execute("SELECT MIN(seq) FROM records").fetchone()[0]
+
+    # 另一个写入方（jsonl 后端）以 delta 格式追加
+    monkeypatch.setenv("POSITION_SNAPSHOT_INTERVAL", "10")
+    get_position_ledger(path).extend(HISTORY[3:])
+    assert ledger.get_latest() == HISTORY[6]
+    assert conn.execute("SELECT MIN(seq) FROM records").fetchone()[0] == first_seq
+    assert row_count(ledger) == len(HISTORY)
+    assert conn.execute("SELECT offset FROM sources WHERE ledger = ?", (ledger.key,)).fetchone()[0] == path.stat().st_size
+    assert_same_answers(ledger, PositionLedger(path))
+
+
+def test_rewritten_file_is_imported_again(ledger, path):
+    ledger.extend(HISTORY)
+    # 注册新一轮运行：以 "w" 模式重写（inode 不变）
+    with open(path, "w") as f:
+        f.write(json.dumps(record(0, "2025-11-03", {"CASH": 5})) + "\n")
+    assert ledger.get_latest()["date"] == "2025-11-03"
+    assert row_count(ledger) == 1
+    assert ledger.bought_on("2025-10-09", "A") == 0
+
+    os.remove(path)
+    assert ledger.get_latest() is None and row_count(ledger) == 0
+
+
+def test_half_written_line_waits(ledger, path):
+    ledger.extend(HISTORY[:2])
+    with open(path, "ab") as f:
+        f.write(b'{"date": "2025-10-10", "id": 2, "positi')
+    assert ledger.get_latest() == HISTORY[1]
+    with open(path, "ab") as f:
+        f.write(b'ons": {"CASH": 1}}\n')
+    assert ledger.get_latest()["positions"] == {"CASH": 1}
+    assert row_count(ledger) == 3
+
+
+def test_log_paths_share_a_database(ledger, tmp_path):
+    other = SqlitePositionLedger("sig", "cn", ledger.db_path, tmp_path / "other" / "sig" / "position" / "position.jsonl")
+    ledger.extend(HISTORY[:2])
+    other.append(record(0, "2025-12-01", {"CASH": 7}))
+    ledger.append(HISTORY[2])
+    assert ledger.get_latest() == HISTORY[2] and other.get_latest()["positions"] == {"CASH": 7}
+    assert row_count(ledger) == 3 and row_count(other) == 1
+
+
+def test_failed_transaction_discards_the_appended_lines(ledger, path):
+    ledger.extend(HISTORY[:2])
+    size = path.stat().st_size
+    with pytest.raises(RuntimeError):
+        with ledger.transaction():
+            ledger.append(HISTORY[2])
+            assert ledger.get_latest() == HISTORY[2]
+            raise RuntimeError("validation failed")
+    # 回滚后 jsonl 截回事务开始时的大小，文件、数据库与进程内账本一致
+    assert path.stat().st_size == size
+    assert ledger.get_latest() == HISTORY[1]
+    assert get_position_ledger(path).get_latest() == HISTORY[1]
+    assert row_count(ledger) == 2
+
+    ledger.append(HISTORY[2])
+    assert [json.loads(line)["id"] for line in path.read_text().splitlines()] == [0, 1, 2]
+    assert row_count(ledger) == 3
+
+
+def test_old_schema_is_rebuilt(tmp_path, path):
+    db_path = tmp_path / "positions.db"
+    conn = sqlite3.connect(db_path)
+    conn.executescript(
+        "CREATE TABLE records (seq INTEGER PRIMARY KEY, signature TEXT, date TEXT, id INTEGER, record TEXT);"
+        "CREATE TABLE sources (signature TEXT PRIMARY KEY, path TEXT, size INTEGER, ino INTEGER);"
+    )
+    conn.close()
+    get_position_ledger(path).extend(HISTORY[:2])
+
+    ledger = SqlitePositionLedger("sig", "cn", db_path, path)
+    assert ledger.get_latest() == HISTORY[1]
+    assert connect(db_path).execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
@@ -0,0 +1,323 @@
+import json
+import os
+import time
+
+import pytest
+
+from tools.position_ledger import (PositionLedger, compact_position_file,
+                                   flush_position_ledgers, format_positions,
+                                   get_bought_index_path, get_position_ledger,
+                                   iter_records, to_dense, to_sparse)
+
+
+def record(i, date, positions, action=None, symbol=None, amount=0):
+    this_action = {"action": action, "symbol": symbol, "amount": amount} if action else {}
+    return {"date": date, "id": i, "this_action": this_action, "positions": positions}
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / "sig" / "position" / "position.jsonl"
+
+
+def write_lines(path, lines):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a", encoding="utf-8") as f:
+        for line in lines:
+            f.write((line if isinstance(line, str) else json.dumps(line)) + "\n")
+
+
+def test_latest_lookups(path):
+    write_lines(
+        path,
+        [
+            record(0, "2025-10-01", {"CASH": 100}),
+            record(2, "2025-10-02", {"CASH": 80}),
+            record(1, "2025-10-02", {"CASH": 90}),
+            record(2, "2025-10-02", {"CASH": 70}),
+            record(3, "2025-10-03", {"CASH": 60}),
+        ],
+    )
+    ledger = PositionLedger(path)
+    # 同一日期取 id 最大的记录，id 相同时保留先写入的那条
+    assert ledger.latest_on("2025-10-02")["positions"] == {"CASH": 80}
+    assert ledger.latest_before("2025-10-02")["positions"] == {"CASH": 100}
+    assert ledger.latest_before("2025-10-01") is None
+    assert ledger.get_latest()["id"] == 3
+    assert ledger.count == 5 and ledger.dates == ["2025-10-01", "2025-10-02", "2025-10-03"]
+
+
+def test_refresh_reads_only_appended_lines(path):
+    writer = PositionLedger(path)
+    reader = PositionLedger(path)
+    assert reader.get_latest() is None
+
+    writer.append(record(0, "2025-10-01", {"CASH": 100}))
+    assert reader.get_latest()["id"] == 0
+    offset = reader._offset
+    writer.extend([record(1, "2025-10-02", {"CASH": 90}), record(2, "2025-10-02", {"CASH": 80})])
+    assert reader.get_latest()["id"] == 2
+    assert reader._offset > offset and reader.count == 3
+
+
+def test_replaced_file_is_read_again(path):
+    write_lines(path, [record(0, "2025-10-01", {"CASH": 100}), record(1, "2025-10-02", {"CASH": 90})])
+    ledger = PositionLedger(path)
+    assert ledger.get_latest()["id"] == 1
+
+    tmp_path = path.with_name("position.jsonl.tmp")
+    tmp_path.write_text(json.dumps(record(0, "2025-11-01", {"CASH": 5})) + "\n")
+    os.replace(tmp_path, path)
+    assert ledger.get_latest()["date"] == "2025-11-01"
+    assert ledger.latest_on("2025-10-02") is None and ledger.count == 1
+
+
+def test_unterminated_last_line(path):
+    write_lines(path, [record(0, "2025-10-01", {"CASH": 100})])
+    with path.open("a") as f:
+        f.write('{"date": "2025-10-02", "id": 1, "positions": {"CA')
+    ledger = PositionLedger(path)
+    assert ledger.get_latest()["id"] == 0
+
+    with path.open("a") as f:
+        f.write('SH": 90}}')
+    # 没有换行结尾但已完整的一行照常可见；追加时先补换行
+    assert ledger.get_latest()["id"] == 1
+    ledger.append(record(2, "2025-10-03", {"CASH": 80}))
+    assert [json.loads(line)["id"] for line in path.read_text().splitlines()] == [0, 1, 2]
+    assert PositionLedger(path).refresh().count == 3
+
+
+def stored_lines(path):
+    return [json.loads(line) for line in path.read_text().splitlines() if line.strip()]
+
+
+HISTORY = [
+    record(0, "2025-10-01", {"AAPL": 0, "MSFT": 0, "CASH": 1000}),
+    record(1, "2025-10-01", {"AAPL": 5, "MSFT": 0, "CASH": 500}, "buy", "AAPL", 5),
+    record(2, "2025-10-02", {"AAPL": 5, "MSFT": 2, "CASH": 300}, "buy", "MSFT", 2),
+    record(3, "2025-10-02", {"AAPL": 5, "CASH": 300}),
+    record(4, "2025-10-03", {"AAPL": 1, "NVDA": 3, "CASH": 450}, "sell", "AAPL", 4),
+]
+
+
+def test_snapshot_delta_round_trip(path, monkeypatch):
+    monkeypatch.setenv("POSITION_SNAPSHOT_INTERVAL", "3")
+    PositionLedger(path).extend(HISTORY)
+
+    stored = stored_lines(path)
+    assert ["positions" in line for line in stored] == [True, False, False, True, False]
+    assert stored[1]["delta"] == {"AAPL": 5, "CASH": 500}
+    assert stored[4]["delta"] == {"AAPL": 1, "NVDA": 3, "CASH": 450}
+    assert stored[3]["positions"] == {"AAPL": 5, "CASH": 300}
+
+    ledger = PositionLedger(path).refresh()
+    assert [ledger.latest_on(date)["positions"] for date in ledger.dates] == [
+        HISTORY[1]["positions"],
+        HISTORY[3]["positions"],
+        HISTORY[4]["positions"],
+    ]
+    with path.open("rb") as f:
+        assert list(iter_records(f)) == HISTORY
+
+
+def test_delta_removes_keys(path, monkeypatch):
+    monkeypatch.setenv("POSITION_SNAPSHOT_INTERVAL", "5")
+    PositionLedger(path).extend(HISTORY[:3] + [HISTORY[3]])
+    # 删除的键以 null 记录
+    assert stored_lines(path)[3]["delta"] == {"MSFT": None}
+    assert PositionLedger(path).get_latest()["positions"] == {"AAPL": 5, "CASH": 300}
+
+
+def test_iter_records_of_a_tail(path, monkeypatch):
+    monkeypatch.setenv("POSITION_SNAPSHOT_INTERVAL", "5")
+    PositionLedger(path).extend(HISTORY)
+    lines = path.read_bytes().splitlines()
+    state = HISTORY[1]["positions"]
+    assert list(iter_records(lines[2:], state)) == HISTORY[2:]
+
+
+def test_compact_round_trip(path):
+    PositionLedger(path).extend(HISTORY)
+    original = path.read_text()
+
+    assert compact_position_file(path, 2) == (5, 3)
+    assert path.with_name("position.jsonl.bak").read_text() == original
+    assert ["positions" in line for line in stored_lines(path)] == [True, False, True, False, True]
+    with path.open("rb") as f:
+        assert list(iter_records(f)) == HISTORY
+
+    # interval 1 把所有记录还原为完整快照
+    assert compact_position_file(path, 1, keep_backup=False) == (5, 5)
+    assert stored_lines(path) == HISTORY
+
+
+def test_appends_continue_the_snapshot_run(path, monkeypatch):
+    PositionLedger(path).extend(HISTORY[:2])
+    monkeypatch.setenv("POSITION_SNAPSHOT_INTERVAL", "2")
+    ledger = PositionLedger(path)
+    ledger.extend(HISTORY[2:])
+    assert ["positions" in line for line in stored_lines(path)] == [True, True, False, True, False]
+    assert PositionLedger(path).get_latest()["positions"] == HISTORY[4]["positions"]
+
+
+def test_sparse_and_dense_forms():
+    dense = {"AAPL": 0, "MSFT": 2, "CASH": 0}
+    assert to_sparse(dense) == {"MSFT": 2, "CASH": 0}
+    assert to_dense({"MSFT": 2, "TSLA": 1, "CASH": 5}, ["AAPL", "MSFT"]) == {"AAPL": 0, "MSFT": 2, "TSLA": 1, "CASH": 5}
+    assert to_dense(to_sparse(dense), dense) == dense
+
+
+def test_sparse_mode_round_trip(path, monkeypatch):
+    monkeypatch.setenv("POSITION_MODE", "sparse")
+    monkeypatch.setenv("POSITION_SNAPSHOT_INTERVAL", "2")
+    PositionLedger(path).extend(HISTORY)
+
+    sparse = [dict(r, positions=to_sparse(r["positions"])) for r in HISTORY]
+    assert stored_lines(path)[0]["positions"] == {"CASH": 1000}
+    with path.open("rb") as f:
+        assert list(iter_records(f)) == sparse
+    universe = ["AAPL", "MSFT", "NVDA"]
+    assert to_dense(PositionLedger(path).get_latest()["positions"], universe) == {"AAPL": 1, "MSFT": 0, "NVDA": 3, "CASH": 450}
+
+
+def test_dense_mode_keeps_zero_holdings(path):
+    PositionLedger(path).append(HISTORY[0])
+    assert format_positions(HISTORY[0]["positions"]) == HISTORY[0]["positions"]
+    assert stored_lines(path) == [HISTORY[0]]
+
+
+BUYS = [
+    record(0, "2025-10-09 10:00:00", {"X": 100, "CASH": 0}, "buy", "X", 100),
+    record(1, "2025-10-09 11:00:00", {"X": 150, "CASH": 0}, "buy", "X", 50),
+    record(2, "2025-10-09 14:00:00", {"X": 120, "CASH": 0}, "sell", "X", 30),
+    record(3, "2025-10-10 10:00:00", {"X": 130, "CASH": 0}, "buy", "X", 10),
+]
+
+
+def test_bought_on_sums_buys_per_trading_day(path):
+    ledger = PositionLedger(path)
+    ledger.extend(BUYS)
+    assert ledger.bought_on("2025-10-09", "X") == 150
+    assert ledger.bought_on("2025-10-09 15:00:00", "X") == 150
+    assert ledger.bought_on("2025-10-10", "X") == 10
+    assert ledger.bought_on("2025-10-10", "Y") == 0
+
+
+def test_bought_checkpoint(path):
+    get_position_ledger(path).extend(BUYS[:2])
+    flush_position_ledgers()
+    sidecar = get_bought_index_path(path)
+    index = json.loads(sidecar.read_text())
+    assert index["offset"] == path.stat().st_size and index["bought"] == [["2025-10-09", "X", 150]]
+    assert not list(path.parent.glob("*.tmp"))
+
+    # 新进程从检查点取得聚合，只累加检查点之后追加的买入
+    index["bought"] = [["2025-10-09", "X", 1000]]
+    sidecar.write_text(json.dumps(index))
+    write_lines(path, BUYS[2:])
+    ledger = PositionLedger(path)
+    assert ledger.bought_on("2025-10-09", "X") == 1000
+    assert ledger.bought_on("2025-10-10", "X") == 10
+
+
+def test_bought_checkpoint_of_a_rewritten_file_is_ignored(path):
+    get_position_ledger(path).extend(BUYS[:2])
+    flush_position_ledgers()
+    index = json.loads(get_bought_index_path(path).read_text())
+    index["bought"] = [["2025-10-09", "X", 1000]]
+    get_bought_index_path(path).write_text(json.dumps(index))
+
+    # 原地改写（inode 不变）
+    path.write_text(path.read_text().replace('"amount": 100', '"amount": 200'))
+    assert PositionLedger(path).bought_on("2025-10-09", "X") == 250
+
+
+def test_readers_do_not_write_checkpoints(path):
+    write_lines(path, BUYS)
+    get_position_ledger(path).bought_on("2025-10-09", "X")
+    flush_position_ledgers()
+    assert not get_bought_index_path(path).exists()
+
+
+@pytest.fixture
+def fsyncs(monkeypatch):
+    calls = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: (calls.append(fd), real_fsync(fd)))
+    return calls
+
+
+@pytest.mark.parametrize("policy, expected", [("none", 0), ("always", 2)])
+def test_fsync_policy(path, monkeypatch, fsyncs, policy, expected):
+    monkeypatch.setenv("POSITION_FSYNC", policy)
+    ledger = PositionLedger(path)
+    ledger.append(HISTORY[0])
+    ledger.extend(HISTORY[1:])
+    assert len(fsyncs) == expected
+
+
+def test_group_fsync(path, monkeypatch, fsyncs):
+    monkeypatch.setenv("POSITION_FSYNC", "group")
+    monkeypatch.setenv("POSITION_FSYNC_INTERVAL", "0.05")
+    ledger = get_position_ledger(path)
+    for r in HISTORY:
+        ledger.append(r)
+    deadline = time.time() + 5
+    while ledger._dirty:
+        assert time.time() < deadline, "group commit did not run"
+        time.sleep(0.01)
+    assert 1 <= len(fsyncs) < len(HISTORY)
+
+    ledger.append(record(5, "2025-10-04", {"CASH": 1}))
+    flush_position_ledgers()
+    assert not ledger._dirty
+
+
+def test_append_handle_is_kept_open(path):
+    ledger = PositionLedger(path)
+    ledger.append(HISTORY[0])
+    handle = ledger._fh
+    ledger.append(HISTORY[1])
+    assert ledger._fh is handle
+
+    # 文件被替换后重新打开，写入新文件
+    os.replace(path, path.with_name("old.jsonl"))
+    ledger.append(HISTORY[2])
+    assert ledger._fh is not handle
+    assert stored_lines(path) == [HISTORY[2]]
+    ledger.close()
+    assert ledger._fh is None
+
+
+INTRADAY = [
+    record(0, "2025-10-01 10:00:00", {"CASH": 100}),
+    record(1, "2025-10-01 15:00:00", {"CASH": 90}),
+    record(2, "2025-10-02 10:00:00", {"CASH": 80}),
+    record(3, "2025-10-02 10:00:00", {"CASH": 70}),
+    record(4, "2025-10-03 11:00:00", {"CASH": 60}),
+]
+
+
+def test_as_of(path):
+    ledger = PositionLedger(path)
+    ledger.extend(INTRADAY)
+    assert ledger.as_of("2025-09-30") is None
+    assert ledger.as_of("2025-10-01 09:00:00") is None
+    assert ledger.as_of("2025-10-01 10:00:00")["id"] == 0
+    assert ledger.as_of("2025-10-01 14:59:59")["id"] == 0
+    # 只有日期的 ts 覆盖当天全部记录
+    assert ledger.as_of("2025-10-01")["id"] == 1
+    assert ledger.as_of("2025-10-02")["id"] == 3
+    assert ledger.as_of("2030-01-01")["id"] == 4
+
+
+def test_range(path):
+    ledger = PositionLedger(path)
+    ledger.extend(INTRADAY)
+    assert [r["id"] for r in ledger.range()] == [0, 1, 3, 4]
+    assert [r["id"] for r in ledger.range("2025-10-01", "2025-10-01")] == [0, 1]
+    assert [r["id"] for r in ledger.range("2025-10-01 12:00:00", "2025-10-02 10:00:00")] == [1, 3]
+    assert [r["id"] for r in ledger.range(end="2025-10-02")] == [0, 1, 3]
+    assert [r["id"] for r in ledger.range(start="2025-10-03")] == [4]
+    assert ledger.range("2025-10-04", "2025-10-05") == []
@@ -0,0 +1,76 @@
+import fcntl
+import os
+import threading
+import time
+
+import pytest
+
+from tools.position_lock import get_position_lock
+
+
+def held_elsewhere(lock_path):
+    """Whether another open file description (another process) can take the flock right now"""
+    with open(lock_path, "a+") as f:
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return False
+
+
+def test_one_lock_per_log_path_and_signature(tmp_path):
+    lock = get_position_lock("sig", str(tmp_path / "a"))
+    assert get_position_lock("sig", str(tmp_path / "a")) is lock
+    assert get_position_lock("sig", str(tmp_path / "b")) is not lock
+    assert get_position_lock("other", str(tmp_path / "a")) is not lock
+    assert lock.lock_path == tmp_path / "a" / "sig" / ".position.lock"
+
+
+def test_flock_is_held_by_the_outermost_holder(tmp_path):
+    lock = get_position_lock("sig", str(tmp_path))
+    with lock:
+        assert held_elsewhere(lock.lock_path)
+        with lock:
+            assert held_elsewhere(lock.lock_path)
+        # 内层退出不释放文件锁
+        assert held_elsewhere(lock.lock_path)
+    assert not held_elsewhere(lock.lock_path)
+
+
+def test_threads_are_serialized(tmp_path):
+    lock = get_position_lock("sig", str(tmp_path))
+    counter = {"value": 0}
+
+    def work():
+        for _ in range(20):
+            with lock:
+                value = counter["value"]
+                time.sleep(0.0005)
+                counter["value"] = value + 1
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter["value"] == 80
+
+
+def test_replaced_lock_file_is_reopened(tmp_path):
+    lock = get_position_lock("sig", str(tmp_path))
+    with lock:
+        pass
+    os.remove(lock.lock_path)
+    with lock:
+        # 其他进程会锁新建的文件，本进程必须锁同一个文件
+        assert lock.lock_path.exists() and held_elsewhere(lock.lock_path)
+
+
+def test_lock_is_released_on_error(tmp_path):
+    lock = get_position_lock("sig", str(tmp_path))
+    with pytest.raises(RuntimeError):
+        with lock:
+            raise RuntimeError("trade failed")
+    assert not held_elsewhere(lock.lock_path)
+    assert lock._depth == 0
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from tests.conftest import symbol_doc
+from tools.price_arrays import (FIELDS, PriceArrays, get_cache_dir, int_to_timestamp,
+                                timestamp_to_int)
+from tools.price_store import get_file_version
+
+BARS = {
+    "AAPL": {"2025-10-01 10:00:00": (10.0, 11.0), "2025-10-02 10:00:00": (11.0, 12.0)},
+    "MSFT": {"2025-10-02 10:00:00": (20.0, 21.0), "2025-10-02 11:00:00": (21.0, 22.0)},
+}
+
+
+@pytest.fixture
+def merged(make_merged):
+    return make_merged([symbol_doc(symbol, bars) for symbol, bars in BARS.items()])
+
+
+def test_timestamp_round_trip():
+    for ts, intraday in (("2025-10-02 10:00:00", True), ("2025-10-02", False)):
+        assert int_to_timestamp(timestamp_to_int(ts), intraday) == ts
+
+
+def test_arrays_match_the_store(merged):
+    arrays = PriceArrays.from_merged_file(merged)
+    assert arrays.symbols == ["AAPL", "MSFT"]
+    assert arrays.intraday
+    assert arrays.ohlcv.shape == (2, 3, len(FIELDS))
+    timestamps, values = arrays.window(["MSFT", "AAPL"], fields=["open", "close"])
+    assert timestamps == ["2025-10-01 10:00:00", "2025-10-02 10:00:00", "2025-10-02 11:00:00"]
+    assert np.isnan(values[0, 0]).all()
+    assert values[0, 2].tolist() == [21.0, 22.0]
+    assert values[1, 0].tolist() == [10.0, 11.0]
+
+
+def test_window_bounds_and_unknown_symbols(merged):
+    arrays = PriceArrays.from_merged_file(merged)
+    # 只有日期的上界覆盖当天所有小时线
+    timestamps, values = arrays.window(["AAPL", "ZZZZ"], start="2025-10-02", end="2025-10-02", fields=["open"])
+    assert timestamps == ["2025-10-02 10:00:00", "2025-10-02 11:00:00"]
+    assert values[0, :, 0].tolist()[0] == 11.0
+    assert np.isnan(values[1]).all()
+    with pytest.raises(ValueError):
+        arrays.window(["AAPL"], fields=["vwap"])
+
+
+def test_cache_round_trip_and_staleness(merged):
+    arrays = PriceArrays.from_merged_file(merged)
+    cache_dir = get_cache_dir(merged)
+    arrays.save(cache_dir)
+
+    loaded = PriceArrays.load(cache_dir, get_file_version(merged))
+    assert loaded.symbols == arrays.symbols
+    assert np.array_equal(loaded.ohlcv, arrays.ohlcv, equal_nan=True)
+    assert PriceArrays.load(cache_dir, (0, 0, 0)) is None
+
+
+def test_save_replaces_files_through_unique_temporary_files(merged, monkeypatch):
+    arrays = PriceArrays.from_merged_file(merged)
+    cache_dir = get_cache_dir(merged)
+    arrays.save(cache_dir)
+    arrays.save(cache_dir)
+    assert sorted(p.name for p in cache_dir.iterdir()) == ["meta.json", "ohlcv.npy", "timestamps.npy"]
+
+    # 写入失败时临时文件被删除，已有缓存保持完整
+    def fail(f, array):
+        f.write(b"partial")
+        raise OSError("disk full")
+
+    with monkeypatch.context() as m:
+        m.setattr(np, "save", fail)
+        with pytest.raises(OSError):
+            arrays.save(cache_dir)
+    assert sorted(p.name for p in cache_dir.iterdir()) == ["meta.json", "ohlcv.npy", "timestamps.npy"]
+    assert PriceArrays.load(cache_dir, get_file_version(merged)) is not None
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from tests.conftest import symbol_doc
+from tools.price_arrays import PriceArrays
+from tools.price_db import SqlitePriceStore, connect, load_market
+from tools.price_store import PriceStore
+
+DOCS = [
+    symbol_doc("AAPL", {"2025-10-01 10:00:00": (10.0, 11.0), "2025-10-02 10:00:00": (11.0, 12.0)}, name="Apple"),
+    symbol_doc("MSFT", {"2025-10-02 10:00:00": (20.0, 21.0), "2025-10-03 15:00:00": (21.0, 22.0)}),
+]
+
+
+@pytest.fixture
+def merged(make_merged):
+    return make_merged(DOCS)
+
+
+@pytest.fixture
+def db(tmp_path, merged):
+    db_path = tmp_path / "prices.db"
+    conn = connect(db_path)
+    assert load_market(conn, "us", merged) == 4
+    conn.close()
+    return SqlitePriceStore("us", db_path)
+
+
+def test_lookups_match_the_price_store(db, merged):
+    store = PriceStore(merged)
+    assert db.names == store.names
+    assert db.version == store.version
+    for symbol in ("AAPL", "MSFT"):
+        for ts, bar in store.bars[symbol].items():
+            assert (db.get_bar(symbol, ts).open, db.get_bar(symbol, ts).close) == (bar.open, bar.close)
+    assert db.get_bar("AAPL", "2025-10-03 15:00:00") is None
+    assert db.has_symbol("MSFT") and not db.has_symbol("ZZZZ")
+    assert db.is_trading_day("2025-10-03") and not db.is_trading_day("2025-10-04")
+
+
+@pytest.mark.parametrize(
+    "timestamp",
+    ["2025-09-30", "2025-10-01", "2025-10-02", "2025-10-03", "2025-10-04",
+     "2025-10-01 10:00:00", "2025-10-02 12:00:00", "2025-10-03 15:00:00"],
+)
+def test_calendar_matches_the_price_store(db, merged, timestamp):
+    store = PriceStore(merged)
+    assert db.previous_timestamp(timestamp) == store.previous_timestamp(timestamp)
+    assert db.next_timestamp(timestamp) == store.next_timestamp(timestamp)
+    for include_start in (False, True):
+        end = "2025-10-03" if " " not in timestamp else "2025-10-03 15:00:00"
+        assert db.calendar_between(timestamp, end, include_start) == store.calendar_between(timestamp, end, include_start)
+
+
+def test_window_matches_price_arrays(db, merged):
+    arrays = PriceArrays.from_merged_file(merged)
+    for start, end in ((None, None), ("2025-10-02", "2025-10-02"), ("2025-10-01 11:00:00", "2025-10-03")):
+        ts_db, values_db = db.window(["MSFT", "ZZZZ", "AAPL"], start, end, ["open", "close"])
+        ts_arr, values_arr = arrays.window(["MSFT", "ZZZZ", "AAPL"], start, end, ["open", "close"])
+        assert ts_db == ts_arr
+        assert np.array_equal(values_db, values_arr, equal_nan=True)
+
+
+def test_load_market_skips_an_unchanged_file(tmp_path, merged, make_merged):
+    conn = connect(tmp_path / "prices.db")
+    assert load_market(conn, "us", merged) == 4
+    assert load_market(conn, "us", merged) == 0
+    assert load_market(conn, "us", merged, force=True) == 4
+    make_merged(DOCS[:1])
+    assert load_market(conn, "us", merged) == 2
+    assert conn.execute("SELECT COUNT(*) FROM symbols WHERE market = 'us'").fetchone()[0] == 1
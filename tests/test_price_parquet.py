@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from tests.conftest import symbol_doc
+from tools.price_arrays import PriceArrays
+from tools.price_parquet import ParquetPriceSource, export_market, get_market_dir
+
+DOCS = [
+    symbol_doc("AAPL", {"2025-10-01 10:00:00": (10.0, 11.0), "2025-10-02 10:00:00": (11.0, 12.0)}),
+    symbol_doc("MSFT", {"2025-10-02 10:00:00": (20.0, 21.0), "2025-10-03 15:00:00": (21.0, 22.0)}),
+]
+
+
+@pytest.fixture
+def merged(make_merged):
+    return make_merged(DOCS)
+
+
+def test_window_matches_price_arrays(tmp_path, merged):
+    root = tmp_path / "parquet"
+    assert export_market("us", merged, root) == 4
+    source = ParquetPriceSource(get_market_dir("us", root))
+    arrays = PriceArrays.from_merged_file(merged)
+    for start, end in ((None, None), ("2025-10-02", "2025-10-02"), ("2025-10-04", None)):
+        ts_pq, values_pq = source.window(["MSFT", "ZZZZ", "AAPL"], start, end, ["open", "close"])
+        ts_arr, values_arr = arrays.window(["MSFT", "ZZZZ", "AAPL"], start, end, ["open", "close"])
+        assert ts_pq == ts_arr
+        assert np.array_equal(values_pq, values_arr, equal_nan=True)
+    with pytest.raises(ValueError):
+        source.window(["AAPL"], fields=["vwap"])
+
+
+def test_export_skips_an_unchanged_file(tmp_path, merged, make_merged):
+    root = tmp_path / "parquet"
+    assert export_market("us", merged, root) == 4
+    assert export_market("us", merged, root) == 0
+    make_merged(DOCS[:1])
+    assert export_market("us", merged, root) == 2
+    source = ParquetPriceSource(get_market_dir("us", root))
+    assert source.window(["MSFT"])[1].size == 0 or np.isnan(source.window(["MSFT"])[1]).all()
+    assert not (root / "market=us.tmp").exists() and not (root / "market=us.old").exists()
+
+
+def test_window_of_a_stale_reader_skips_rows_off_its_axis(tmp_path, merged, make_merged):
+    root = tmp_path / "parquet"
+    export_market("us", merged, root)
+    source = ParquetPriceSource(get_market_dir("us", root))
+
+    # 重新导出：AAPL 多了不在旧时间轴上的时间点，旧 reader 仍持有旧时间轴
+    bars = {
+        "2025-10-01 10:00:00": (10.0, 11.0),
+        "2025-10-01 12:00:00": (10.5, 10.8),
+        "2025-10-02 10:00:00": (11.0, 12.0),
+        "2025-10-03 12:00:00": (12.5, 13.0),
+    }
+    make_merged([symbol_doc("AAPL", bars), DOCS[1]])
+    assert export_market("us", merged, root) == 6
+
+    ts_axis, values = source.window(["AAPL"], fields=["open"])
+    assert ts_axis == ["2025-10-01 10:00:00", "2025-10-02 10:00:00", "2025-10-03 15:00:00"]
+    assert np.array_equal(values[0, :, 0], [10.0, 11.0, np.nan], equal_nan=True)
@@ -0,0 +1,108 @@
+import json
+import os
+import time
+
+import pytest
+
+from tests.conftest import symbol_doc
+from tools.price_store import PriceBar, PriceStore, clear_price_stores, get_price_store
+
+HOURLY = {
+    "2025-10-01 10:00:00": (10.0, 11.0),
+    "2025-10-01 11:00:00": (11.0, 12.0),
+    "2025-10-03 10:00:00": (12.0, 13.0),
+}
+DAILY = {"2025-10-01": (1.0, 2.0), "2025-10-03": (2.0, 3.0), "2025-10-06": (3.0, 4.0)}
+
+
+@pytest.fixture
+def store(make_merged):
+    return PriceStore(
+        make_merged(
+            [
+                symbol_doc("AAPL", HOURLY, name="Apple"),
+                symbol_doc("600519.SH", DAILY, series_key="Time Series (Daily)"),
+            ]
+        )
+    )
+
+
+def test_bars_are_parsed_to_float(store):
+    bar = store.get_bar("AAPL", "2025-10-01 10:00:00")
+    assert (bar.open, bar.close, bar.volume) == (10.0, 11.0, 1000.0)
+    assert store.get_bar("AAPL", "2025-10-02 10:00:00") is None
+    assert store.get_bar("MSFT", "2025-10-01 10:00:00") is None
+    assert store.has_symbol("600519.SH") and not store.has_symbol("MSFT")
+    assert store.names == {"AAPL": "Apple"}
+    assert store.daily_dates == set(DAILY)
+    assert store.series_keys["600519.SH"] == "Time Series (Daily)"
+
+
+def test_invalid_price_values_become_none():
+    bar = PriceBar.from_raw({"1. buy price": "n/a", "4. sell price": "5"})
+    assert bar.open is None and bar.high is None and bar.close == 5.0
+
+
+def test_trading_days(store):
+    assert store.is_trading_day("2025-10-03")
+    assert store.is_trading_day("2025-10-01 11:00:00")
+    assert not store.is_trading_day("2025-10-02")
+
+
+def test_calendars_by_granularity(store):
+    assert store.calendar_dates == ["2025-10-01", "2025-10-03", "2025-10-06"]
+    assert store.calendar_times == sorted(HOURLY)
+    assert store.is_trading_day("2025-10-03")
+    assert not store.is_trading_day("2025-10-02")
+
+
+def test_previous_timestamp_edges(store):
+    assert store.previous_timestamp("2025-10-01") is None
+    assert store.previous_timestamp("2025-09-01") is None
+    assert store.previous_timestamp("2025-10-03") == "2025-10-01"
+    # 非交易日与日历之后的日期
+    assert store.previous_timestamp("2025-10-05") == "2025-10-03"
+    assert store.previous_timestamp("2026-01-01") == "2025-10-06"
+    assert store.previous_timestamp("2025-10-01 10:00:00") is None
+    assert store.previous_timestamp("2025-10-03 10:00:00") == "2025-10-01 11:00:00"
+
+
+def test_next_timestamp_edges(store):
+    assert store.next_timestamp("2025-10-06") is None
+    assert store.next_timestamp("2026-01-01") is None
+    assert store.next_timestamp("2025-09-01") == "2025-10-01"
+    assert store.next_timestamp("2025-10-02") == "2025-10-03"
+    assert store.next_timestamp("2025-10-01 11:00:00") == "2025-10-03 10:00:00"
+    assert store.next_timestamp("2025-10-03 10:00:00") is None
+
+
+def test_calendar_between(store):
+    assert store.calendar_between("2025-10-01", "2025-10-06") == ["2025-10-03", "2025-10-06"]
+    assert store.calendar_between("2025-10-01", "2025-10-03", include_start=True) == ["2025-10-01", "2025-10-03"]
+    assert store.calendar_between("2025-10-07", "2025-10-09") == []
+
+
+def test_get_price_store_is_shared(make_merged):
+    path = make_merged([symbol_doc("AAPL", HOURLY)])
+    assert get_price_store(path) is get_price_store(path)
+
+
+def test_get_price_store_reloads_a_replaced_file(make_merged):
+    clear_price_stores()
+    path = make_merged([symbol_doc("AAPL", HOURLY)])
+    assert get_price_store(path).get_bar("AAPL", "2025-10-01 10:00:00").open == 10.0
+
+    tmp_path = path.with_name("merged.jsonl.tmp")
+    tmp_path.write_text(json.dumps(symbol_doc("AAPL", {"2025-10-01 10:00:00": (20.0, 21.0)})) + "\n")
+    os.replace(tmp_path, path)
+
+    # 重建在后台线程进行，完成前仍返回旧快照
+    deadline = time.time() + 10
+    while get_price_store(path).get_bar("AAPL", "2025-10-01 10:00:00").open != 20.0:
+        assert time.time() < deadline, "store was not reloaded"
+        time.sleep(0.05)
+    assert get_price_store(path).get_bar("AAPL", "2025-10-03 10:00:00") is None
+
+
+def test_get_price_store_missing_file(tmp_path):
+    assert get_price_store(tmp_path / "missing.jsonl") is None
@@ -0,0 +1,206 @@
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from tests.conftest import symbol_doc
+from tools import price_tools
+from tools.price_arrays import FIELDS
+from tools.price_db import connect, load_market
+
+HOURLY = [
+    symbol_doc(
+        "AAPL",
+        {"2025-10-01 10:00:00": (10.0, 11.0), "2025-10-01 11:00:00": (11.0, 12.0), "2025-10-02 10:00:00": (12.0, 13.0)},
+    ),
+    symbol_doc("MSFT", {"2025-10-01 11:00:00": (20.0, 21.0), "2025-10-03 15:00:00": (21.0, 22.0)}),
+]
+DAILY = [
+    symbol_doc("600519.SH", {"2025-10-01": (1.0, 2.0), "2025-10-03": (2.0, 3.0)}, series_key="Time Series (Daily)"),
+    symbol_doc("601318.SH", {"2025-10-06": (3.0, 4.0)}, series_key="Time Series (Daily)"),
+]
+
+
+@pytest.fixture
+def merged(make_merged, monkeypatch):
+    """merged.jsonl of the us (hourly) and cn (daily) markets, in place of data/"""
+    paths = {"us": make_merged(HOURLY, "merged.jsonl"), "cn": make_merged(DAILY, "cn_merged.jsonl")}
+    monkeypatch.setattr(price_tools, "get_merged_file_path", lambda market="us": paths[market])
+    return paths
+
+
+@pytest.fixture(params=["jsonl", "sqlite", "parquet"])
+def backend(request, tmp_path, merged, monkeypatch):
+    """PRICE_BACKEND of the test; the sqlite database and the Parquet dataset are built from the same merged files"""
+    monkeypatch.setenv("PRICE_BACKEND", request.param)
+    if request.param == "sqlite":
+        db_path = tmp_path / "prices.db"
+        conn = connect(db_path)
+        for market, path in merged.items():
+            load_market(conn, market, path)
+        conn.close()
+        monkeypatch.setenv("PRICE_DB_PATH", str(db_path))
+    elif request.param == "parquet":
+        pytest.importorskip("pyarrow")
+        from tools.price_parquet import export_market
+
+        for market, path in merged.items():
+            export_market(market, path, tmp_path / "parquet")
+        monkeypatch.setenv("PRICE_PARQUET_PATH", str(tmp_path / "parquet"))
+    return request.param
+
+
+def test_price_matrix_matches_per_date_lookups(backend):
+    symbols = ["MSFT", "ZZZZ", "AAPL"]
+    matrix = price_tools.get_price_matrix(symbols)
+    assert list(matrix.index) == ["2025-10-01 10:00:00", "2025-10-01 11:00:00", "2025-10-02 10:00:00", "2025-10-03 15:00:00"]
+    assert list(matrix.columns) == [(field, symbol) for field in FIELDS for symbol in symbols]
+
+    store = price_tools.get_market_store("us")
+    for ts in matrix.index:
+        opens = price_tools.get_open_prices(ts, symbols)
+        for symbol in symbols:
+            bar = store.get_bar(symbol, ts)
+            assert (bar is None) == (f"{symbol}_price" not in opens)
+            for field in FIELDS:
+                value = matrix.loc[ts, (field, symbol)]
+                if bar is None:
+                    assert np.isnan(value)
+                else:
+                    assert value == getattr(bar, field)
+            if bar is not None:
+                assert matrix.loc[ts, ("open", symbol)] == opens[f"{symbol}_price"]
+
+
+def test_price_matrix_window_and_fields(backend):
+    # 仅日期的结束时间包含当天所有小时线
+    matrix = price_tools.get_price_matrix(["AAPL", "MSFT"], "2025-10-01", "2025-10-01", fields=["close"])
+    assert list(matrix.index) == ["2025-10-01 10:00:00", "2025-10-01 11:00:00"]
+    assert list(matrix["close"].columns) == ["AAPL", "MSFT"]
+    assert np.array_equal(matrix["close"].to_numpy(), [[11.0, np.nan], [12.0, 21.0]], equal_nan=True)
+
+    daily = price_tools.get_price_matrix(["601318.SH", "600519.SH"], "2025-10-02", market="cn", fields=["open"])
+    assert list(daily.index) == ["2025-10-03", "2025-10-06"]
+    assert np.array_equal(daily["open"].to_numpy(), [[np.nan, 2.0], [3.0, np.nan]], equal_nan=True)
+
+    assert price_tools.get_price_matrix(["AAPL"], "2025-11-01").empty
+
+
+def test_all_trading_days(backend):
+    assert price_tools.get_all_trading_days("cn") == ["2025-10-01", "2025-10-03", "2025-10-06"]
+
+
+def test_trading_dates_between_daily(backend):
+    assert price_tools.get_trading_dates_between("2025-10-01", "2025-10-06", market="cn") == ["2025-10-03", "2025-10-06"]
+    assert price_tools.get_trading_dates_between("2025-10-01", "2025-10-05", market="cn", include_start=True) == [
+        "2025-10-01",
+        "2025-10-03",
+    ]
+    assert price_tools.get_trading_dates_between("2025-10-06", "2025-10-31", market="cn") == []
+
+
+def test_trading_dates_between_hourly(backend):
+    # 小时线 agent 用同一份日历切片 (last processed, end]
+    assert price_tools.get_trading_dates_between("2025-10-01 10:00:00", "2025-10-02 10:00:00") == [
+        "2025-10-01 11:00:00",
+        "2025-10-02 10:00:00",
+    ]
+    assert price_tools.get_trading_dates_between("2025-10-01 11:00:00", "2025-10-03 15:00:00", include_start=True) == [
+        "2025-10-01 11:00:00",
+        "2025-10-02 10:00:00",
+        "2025-10-03 15:00:00",
+    ]
+
+
+def test_trading_dates_between_without_data(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_tools, "get_merged_file_path", lambda market="us": tmp_path / "missing.jsonl")
+    assert price_tools.get_trading_dates_between("2025-10-01", "2025-10-06", market="cn") == []
+    assert price_tools.get_all_trading_days("cn") == []
+
+
+def test_crypto_trades_every_day_until_today():
+    assert price_tools.get_trading_dates_between("2025-09-29", "2025-10-02", market="crypto") == [
+        "2025-09-30",
+        "2025-10-01",
+        "2025-10-02",
+    ]
+    assert price_tools.get_trading_dates_between("2025-09-29", "2025-09-30", market="crypto", include_start=True) == [
+        "2025-09-29",
+        "2025-09-30",
+    ]
+
+    today = datetime.now().date()
+    start = (today - timedelta(days=2)).strftime("%Y-%m-%d")
+    end = (today + timedelta(days=30)).strftime("%Y-%m-%d")
+    dates = price_tools.get_trading_dates_between(start, end, market="crypto")
+    assert dates == [(today - timedelta(days=1)).strftime("%Y-%m-%d"), today.strftime("%Y-%m-%d")]
+
+
+POSITIONS = [
+    {"date": "2025-10-01", "id": 0, "this_action": {}, "positions": {"600519.SH": 0, "601318.SH": 0, "CASH": 1000}},
+    {
+        "date": "2025-10-01",
+        "id": 1,
+        "this_action": {"action": "buy", "symbol": "600519.SH", "amount": 100},
+        "positions": {"600519.SH": 100, "601318.SH": 0, "CASH": 500},
+    },
+    {
+        "date": "2025-10-03",
+        "id": 2,
+        "this_action": {"action": "buy", "symbol": "601318.SH", "amount": 10},
+        "positions": {"600519.SH": 100, "601318.SH": 10, "CASH": 400},
+    },
+    {
+        "date": "2025-10-03",
+        "id": 3,
+        "this_action": {"action": "sell", "symbol": "600519.SH", "amount": 50},
+        "positions": {"600519.SH": 50, "601318.SH": 10, "CASH": 650},
+    },
+]
+
+
+@pytest.fixture(params=["jsonl", "sqlite"])
+def positions(request, tmp_path, merged, monkeypatch):
+    """position.jsonl of signature "sig" on the cn calendar, written as snapshot + delta records"""
+    monkeypatch.setenv("MARKET", "cn")
+    monkeypatch.setenv("LOG_PATH", str(tmp_path / "agent_data"))
+    monkeypatch.setenv("POSITION_SNAPSHOT_INTERVAL", "3")
+    monkeypatch.setenv("POSITION_BACKEND", request.param)
+    monkeypatch.setenv("POSITION_DB_PATH", str(tmp_path / "positions_{market}.db"))
+    path = price_tools.get_position_file("sig")
+    price_tools.open_position_ledger("sig").extend(POSITIONS)
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert ["positions" in line for line in lines] == [True, False, False, True]
+    return path
+
+
+def test_latest_position_of_today(positions):
+    assert price_tools.get_latest_position("2025-10-03", "sig") == (POSITIONS[3]["positions"], 3)
+    assert price_tools.get_latest_position("2025-10-01", "sig") == (POSITIONS[1]["positions"], 1)
+
+
+def test_latest_position_without_records_today(positions):
+    # 10-06 没有记录：回退到上一个交易日 10-03
+    assert price_tools.get_latest_position("2025-10-06", "sig") == (POSITIONS[3]["positions"], 3)
+    # 10-08 的上一个交易日 10-06 也没有记录：取今天之前最新的记录
+    assert price_tools.get_latest_position("2025-10-08", "sig") == (POSITIONS[3]["positions"], 3)
+    assert price_tools.get_latest_position("2025-09-30", "sig") == ({}, -1)
+
+
+def test_today_init_position(positions):
+    assert price_tools.get_today_init_position("2025-10-03", "sig") == POSITIONS[1]["positions"]
+    assert price_tools.get_today_init_position("2025-10-06", "sig") == POSITIONS[3]["positions"]
+    assert price_tools.get_today_init_position("2025-10-01", "sig") == {}
+    assert price_tools.get_today_init_position("2025-10-06", "sig", symbols=["600519.SH", "600036.SH"]) == {
+        "600519.SH": 50,
+        "600036.SH": 0,
+        "601318.SH": 10,
+        "CASH": 650,
+    }
+
+
+def test_positions_without_a_position_file(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOG_PATH", str(tmp_path / "agent_data"))
+    assert price_tools.get_latest_position("2025-10-03", "sig") == ({}, -1)
+    assert price_tools.get_today_init_position("2025-10-03", "sig") == {}
@@ -0,0 +1,74 @@
+import json
+import warnings
+
+import pytest
+
+from tests.conftest import symbol_doc
+from tools import price_tools, result_tools
+
+BARS = {
+    "AAPL": {"2025-10-01 10:00:00": (10.0, 11.0), "2025-10-01 11:00:00": (11.0, 12.0), "2025-10-02 10:00:00": (12.0, 13.0)},
+    "MSFT": {"2025-10-01 11:00:00": (20.0, 21.0), "2025-10-03 15:00:00": (21.0, 22.0)},
+}
+
+POSITIONS = [
+    {"date": "2025-10-01 10:00:00", "id": 0, "this_action": {}, "positions": {"AAPL": 0, "MSFT": 0, "CASH": 1000.0}},
+    {
+        "date": "2025-10-01 11:00:00",
+        "id": 1,
+        "this_action": {"action": "buy", "symbol": "AAPL", "amount": 10},
+        "positions": {"AAPL": 10, "MSFT": 0, "CASH": 890.0},
+    },
+    {
+        "date": "2025-10-01 11:00:00",
+        "id": 2,
+        "this_action": {"action": "buy", "symbol": "MSFT", "amount": 5},
+        "positions": {"AAPL": 10, "MSFT": 5, "CASH": 790.0},
+    },
+    {"date": "2025-10-02 10:00:00", "id": 3, "this_action": {}, "positions": {"AAPL": 10, "MSFT": 5, "CASH": 790.0}},
+]
+
+
+@pytest.fixture
+def account(tmp_path, make_merged, monkeypatch):
+    """Position file of signature "sig" and the us merged.jsonl it is valued against"""
+    merged = make_merged([symbol_doc(symbol, bars) for symbol, bars in BARS.items()])
+    monkeypatch.setattr(price_tools, "get_merged_file_path", lambda market="us": merged)
+    monkeypatch.setenv("LOG_PATH", str(tmp_path / "agent_data"))
+    path = tmp_path / "agent_data" / "sig" / "position" / "position.jsonl"
+    path.parent.mkdir(parents=True)
+    path.write_text("".join(json.dumps(record) + "\n" for record in POSITIONS))
+    return merged
+
+
+def test_daily_values_use_the_closing_prices(account):
+    # 10-02 10:00 没有 MSFT 的价格，只计入 AAPL 和现金
+    assert result_tools.get_daily_portfolio_values("sig") == {
+        "2025-10-01 10:00:00": 1000.0,
+        "2025-10-01 11:00:00": 790.0 + 10 * 12.0 + 5 * 21.0,
+        "2025-10-02 10:00:00": 790.0 + 10 * 13.0,
+    }
+
+
+def test_daily_values_match_per_date_lookups(account):
+    store = price_tools.get_market_store("us")
+    values = result_tools.get_daily_portfolio_values("sig", "2025-10-01 11:00:00", "2025-10-02")
+    assert list(values) == ["2025-10-01 11:00:00", "2025-10-02 10:00:00"]
+    for date, value in values.items():
+        positions = max((r for r in POSITIONS if r["date"] == date), key=lambda r: r["id"])["positions"]
+        prices = {}
+        for symbol in ("AAPL", "MSFT"):
+            bar = store.get_bar(symbol, date)
+            if bar is not None:
+                prices[f"{symbol}_price"] = bar.close
+        assert value == result_tools.calculate_portfolio_value(positions, prices, positions["CASH"])
+
+
+def test_modelname_is_a_deprecated_alias(account):
+    with pytest.warns(DeprecationWarning):
+        assert result_tools.get_daily_portfolio_values(modelname="sig") == result_tools.get_daily_portfolio_values("sig")
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        result_tools.get_daily_portfolio_values(signature="sig")
+    with pytest.raises(TypeError):
+        result_tools.get_daily_portfolio_values()
@@ -0,0 +1,170 @@
+import json
+
+import pytest
+
+from agent_tools import tool_trade
+from tools.general_tools import get_config_value, update_config
+from tools.position_ledger import get_position_file
+
+TODAY = "2025-10-09"
+
+PRICES = {"601318.SH": 55.0, "600036.SH": 40.0, "AAPL": 250.0}
+
+execute_orders = tool_trade.execute_orders.fn
+
+
+@pytest.fixture(params=["jsonl", "sqlite"])
+def account(request, tmp_path, monkeypatch):
+    """Signature "sig" with 100000 cash on TODAY, trading at the opening prices of PRICES"""
+    update_config(
+        LOG_PATH=str(tmp_path / "agent_data"),
+        SIGNATURE="sig",
+        TODAY_DATE=TODAY,
+        MARKET="cn",
+        IF_TRADE=False,
+        POSITION_BACKEND=request.param,
+        POSITION_DB_PATH=str(tmp_path / "positions_{market}.db"),
+    )
+    monkeypatch.setattr(
+        tool_trade,
+        "get_open_prices",
+        lambda today_date, symbols, market=None: {f"{symbol}_price": PRICES.get(symbol) for symbol in symbols},
+    )
+    path = get_position_file("sig")
+    path.parent.mkdir(parents=True)
+    seed(path, {"date": TODAY, "id": 0, "this_action": {}, "positions": {"CASH": 100000.0}})
+    return path
+
+
+def seed(path, *records):
+    with path.open("a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def stored(path):
+    return [json.loads(line) for line in path.read_text().splitlines() if line.strip()]
+
+
+def test_execute_orders_applies_the_batch_in_order(account):
+    result = execute_orders(
+        [
+            {"action": "buy", "symbol": "601318.SH", "amount": 1000},
+            {"action": "buy", "symbol": "AAPL", "amount": 10},
+            {"action": "sell", "symbol": "AAPL", "amount": 4},
+        ]
+    )
+    assert result == {"CASH": 100000.0 - 55000.0 - 2500.0 + 1000.0, "601318.SH": 1000, "AAPL": 6}
+    records = stored(account)
+    assert [r["id"] for r in records] == [0, 1, 2, 3]
+    assert [r["this_action"]["action"] for r in records[1:]] == ["buy", "buy", "sell"]
+    assert records[-1]["positions"] == result
+    assert get_config_value("IF_TRADE") is True
+
+
+@pytest.mark.parametrize(
+    "orders, index, message",
+    [
+        ([{"action": "buy", "symbol": "AAPL", "amount": 1}, {"action": "buy", "symbol": "600036.SH", "amount": 5000}], 1, "Insufficient cash"),
+        ([{"action": "buy", "symbol": "AAPL", "amount": 1}, {"action": "sell", "symbol": "600036.SH", "amount": 100}], 1, "No position"),
+        ([{"action": "buy", "symbol": "AAPL", "amount": 1}, {"action": "buy", "symbol": "ZZZZ", "amount": 1}], 1, "not found"),
+        ([{"action": "buy", "symbol": "AAPL", "amount": 1}, {"action": "buy", "symbol": "601318.SH", "amount": 150}], 1, "multiples of 100"),
+        ([{"action": "hold", "symbol": "AAPL", "amount": 1}], 0, "Invalid action"),
+        ([{"action": "buy", "symbol": "AAPL", "amount": 0}], 0, "must be positive"),
+    ],
+)
+def test_execute_orders_is_all_or_nothing(account, orders, index, message):
+    before = account.read_text()
+    result = execute_orders(orders)
+    assert message in result["error"] and result["order_index"] == index
+    assert account.read_text() == before
+    assert get_config_value("IF_TRADE") is False
+
+
+def test_t_plus_one_inside_one_batch(account):
+    before = account.read_text()
+    result = execute_orders(
+        [
+            {"action": "buy", "symbol": "601318.SH", "amount": 200},
+            {"action": "sell", "symbol": "601318.SH", "amount": 100},
+        ]
+    )
+    assert "T+1" in result["error"]
+    assert (result["order_index"], result["bought_today"], result["sellable_today"]) == (1, 200, 0)
+    assert account.read_text() == before
+
+    # 美股不受 T+1 限制
+    assert "error" not in execute_orders(
+        [{"action": "buy", "symbol": "AAPL", "amount": 2}, {"action": "sell", "symbol": "AAPL", "amount": 2}]
+    )
+
+
+def test_t_plus_one_across_batches(account):
+    assert "error" not in execute_orders([{"action": "buy", "symbol": "601318.SH", "amount": 300}])
+    assert "T+1" in execute_orders([{"action": "sell", "symbol": "601318.SH", "amount": 100}])["error"]
+
+    update_config(TODAY_DATE="2025-10-10")
+    result = execute_orders([{"action": "sell", "symbol": "601318.SH", "amount": 300}])
+    assert result["601318.SH"] == 0 and result["CASH"] == 100000.0
+
+
+rebalance_to_weights = tool_trade.rebalance_to_weights.fn
+
+
+def test_rebalance_rounds_to_lots(account):
+    result = rebalance_to_weights({"601318.SH": 0.333, "AAPL": 0.333})
+    # floor(33300 / 55 / 100) * 100 与 floor(33300 / 250)
+    assert result["orders"] == [
+        {"action": "buy", "symbol": "601318.SH", "amount": 600},
+        {"action": "buy", "symbol": "AAPL", "amount": 133},
+    ]
+    assert result["positions"]["CASH"] == pytest.approx(100000.0 - 600 * 55.0 - 133 * 250.0)
+    assert result["skipped"] == []
+
+
+def test_rebalance_sells_holdings_missing_from_weights(account):
+    execute_orders([{"action": "buy", "symbol": "AAPL", "amount": 100}])
+    result = rebalance_to_weights({"601318.SH": 0.5})
+    assert result["orders"] == [
+        {"action": "sell", "symbol": "AAPL", "amount": 100},
+        {"action": "buy", "symbol": "601318.SH", "amount": 900},
+    ]
+    assert result["positions"]["AAPL"] == 0 and result["positions"]["CASH"] == pytest.approx(100000.0 - 900 * 55.0)
+
+
+def test_rebalance_caps_buys_at_the_available_cash(account):
+    # 今日买入的 1000 股 601318.SH 受 T+1 限制不能卖出，买入只能使用现有现金
+    execute_orders([{"action": "buy", "symbol": "601318.SH", "amount": 1000}])
+    result = rebalance_to_weights({"600036.SH": 1.0})
+    assert result["orders"] == [{"action": "buy", "symbol": "600036.SH", "amount": 1100}]
+    assert result["positions"]["601318.SH"] == 1000
+    assert result["positions"]["CASH"] == pytest.approx(45000.0 - 1100 * 40.0)
+    assert result["positions"]["CASH"] >= 0
+
+
+def test_rebalance_skips_unpriced_holdings(account):
+    seed(account, {"date": TODAY, "id": 1, "this_action": {}, "positions": {"CASH": 100000.0, "ZZZZ": 7}})
+    result = rebalance_to_weights({"AAPL": 0.5})
+    assert result["skipped"] == ["ZZZZ"]
+    assert result["orders"] == [{"action": "buy", "symbol": "AAPL", "amount": 200}]
+    assert result["positions"]["ZZZZ"] == 7
+
+
+@pytest.mark.parametrize(
+    "weights, message",
+    [
+        ({"AAPL": -0.1}, "must not be negative"),
+        ({"AAPL": 0.6, "601318.SH": 0.5}, "must be at most 1"),
+        ({"AAPL": "a lot"}, "must be a number"),
+        ({"QQQQ": 0.5}, "No opening price"),
+    ],
+)
+def test_rebalance_rejects_invalid_weights(account, weights, message):
+    before = account.read_text()
+    assert message in rebalance_to_weights(weights)["error"]
+    assert account.read_text() == before
+
+
+def test_rebalance_without_changes(account):
+    result = rebalance_to_weights({})
+    assert result == {"orders": [], "positions": {"CASH": 100000.0}, "skipped": []}
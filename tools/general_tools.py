@@ -1,12 +1,46 @@
 import json
 import os
+import tempfile
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
-from typing import Any
+from typing import Any, Dict, Iterator, Optional, Tuple
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# 已解析的运行时配置路径（按 RUNTIME_ENV_PATH 取值缓存）
+_resolved_env_paths: Dict[Optional[str], str] = {}
+
+# 运行时配置缓存：path -> (文件版本, 解析结果)；文件版本变化时才重新解析
+_runtime_env_cache: Dict[str, Tuple[Tuple[int, int, int], dict]] = {}
+
+# 当前工具调用的交易上下文（SIGNATURE / TODAY_DATE / MARKET / LOG_PATH / RUNTIME_ENV_PATH），
+# 由 MCP 请求头注入，优先于运行时配置文件
+_trading_context: ContextVar[Dict[str, Any]] = ContextVar("trading_context", default={})
+
+
+@contextmanager
+def trading_context(**values: Any) -> Iterator[None]:
+    """
+    Override config values for the enclosed code of the current thread / task
+
+    get_config_value returns these values before the runtime env file, and a RUNTIME_ENV_PATH
+    value redirects reads and writes of the runtime env file, so one tool server process can
+    serve calls of several agents and dates at once.
+
+    Args:
+        **values: Config keys and values; None values are ignored
+    """
+    values = {key: value for key, value in values.items() if value is not None}
+    token = _trading_context.set({**_trading_context.get(), **values})
+    try:
+        yield
+    finally:
+        _trading_context.reset(token)
+
+
 def _resolve_runtime_env_path() -> str:
     """Resolve runtime env path from RUNTIME_ENV_PATH in .env file.
     
@@ -15,8 +49,12 @@ def _resolve_runtime_env_path() -> str:
     2. If relative path, resolve from project root
     3. Return the path (will be created by write_config_value if needed)
     """
-    path = os.environ.get("RUNTIME_ENV_PATH")
-    
+    raw_path = _trading_context.get().get("RUNTIME_ENV_PATH") or os.environ.get("RUNTIME_ENV_PATH")
+    path = _resolved_env_paths.get(raw_path)
+    if path is not None:
+        return path
+
+    path = raw_path
     if not path:
         # Fallback to default if not set
         path = "data/.runtime_env.json"
@@ -28,26 +66,53 @@ def _resolve_runtime_env_path() -> str:
     
     # Ensure directory exists
     Path(path).parent.mkdir(parents=True, exist_ok=True)
-    
+
+    _resolved_env_paths[raw_path] = path
     return path
 
 
+def _file_version(stat: os.stat_result) -> Tuple[int, int, int]:
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
 def _load_runtime_env() -> dict:
+    """
+    Parsed runtime env file, shared by all callers of this process
+
+    Revalidated with one os.stat per call: the file is parsed again only when its
+    (mtime_ns, size, inode) changed. Callers must not mutate the returned dict.
+    """
     path = _resolve_runtime_env_path()
     if path is None:
         return {}
     try:
-        if os.path.exists(path):
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                if isinstance(data, dict):
-                    return data
+        version = _file_version(os.stat(path))
+    except OSError:
+        return {}
+
+    cached = _runtime_env_cache.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    data = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            loaded = json.load(f)
+            if isinstance(loaded, dict):
+                data = loaded
+            version = _file_version(os.fstat(f.fileno()))
     except Exception:
-        pass
-    return {}
+        # 写入过程中读到不完整的文件：不缓存，下次调用重新读取
+        return data
+    _runtime_env_cache[path] = (version, data)
+    return data
 
 
 def get_config_value(key: str, default=None):
+    context = _trading_context.get()
+    if key in context:
+        return context[key]
+
     _RUNTIME_ENV = _load_runtime_env()
 
     if key in _RUNTIME_ENV:
@@ -55,20 +120,63 @@ def get_config_value(key: str, default=None):
     return os.getenv(key, default)
 
 
-def write_config_value(key: str, value: Any):
+@contextmanager
+def _config_write_lock(path: str) -> Iterator[None]:
+    """Serialize read-modify-write of the runtime env file across processes (no-op where fcntl is unavailable)"""
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(path + ".lock", "a+") as fh:
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+
+def update_config(**values: Any) -> None:
+    """
+    Set several runtime config values with a single atomic write
+
+    The merged config is written to a temporary file next to the runtime env file and moved
+    over it with os.replace, so concurrent readers see the old or the new file, never a
+    truncated one. Writers from different processes are serialized with a lock file.
+
+    Args:
+        **values: Config keys and values, e.g. update_config(TODAY_DATE="2025-10-01", IF_TRADE=False)
+    """
+    if not values:
+        return
     path = _resolve_runtime_env_path()
     if path is None:
-        print(f"⚠️  WARNING: RUNTIME_ENV_PATH not set, config value '{key}' not persisted")
+        print(f"⚠️  WARNING: RUNTIME_ENV_PATH not set, config values {list(values)} not persisted")
         return
-    _RUNTIME_ENV = _load_runtime_env()
-    _RUNTIME_ENV[key] = value
     try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(_RUNTIME_ENV, f, ensure_ascii=False, indent=4)
+        with _config_write_lock(path):
+            data = dict(_load_runtime_env())
+            data.update(values)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False, indent=4)
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            # 本进程刚写入的内容直接进缓存，不依赖 mtime 精度
+            _runtime_env_cache[path] = (_file_version(os.stat(path)), data)
     except Exception as e:
         print(f"❌ Error writing config to {path}: {e}")
 
 
+def write_config_value(key: str, value: Any):
+    update_config(**{key: value})
+
+
 def extract_conversation(conversation: dict, output_type: str):
     """Extract information from a conversation payload.
 
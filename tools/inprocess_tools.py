@@ -0,0 +1,101 @@
+"""
+进程内工具加载
+MCP config entries with "transport": "in_process" are not served over MCP: the FastMCP server
+module named by "module" is imported into the agent process and each of its tools is wrapped as a
+LangChain StructuredTool that calls the tool function directly. Arguments are validated and results
+serialized the same way the FastMCP server does, so the model sees the same tool schema and output,
+without the HTTP hop or a running tool server.
+
+    "trade": {"transport": "in_process", "module": "agent_tools.tool_trade"}
+
+An optional "tools" list limits which tools of the module are loaded. The default configs of the
+agents switch services to this mode with MCP_IN_PROCESS (see tools.mcp_transport).
+"""
+
+import importlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from tools.general_tools import trading_context
+
+IN_PROCESS_TRANSPORT = "in_process"
+
+
+def split_mcp_config(mcp_config: Dict[str, Dict[str, Any]]) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """Split an MCP config into (remote connections, in-process connections)"""
+    remote = {name: conn for name, conn in mcp_config.items() if conn.get("transport") != IN_PROCESS_TRANSPORT}
+    local = {name: conn for name, conn in mcp_config.items() if conn.get("transport") == IN_PROCESS_TRANSPORT}
+    return remote, local
+
+
+def _wrap_tool(tool, context: Dict[str, Any]):
+    from fastmcp.tools.tool import default_serializer
+    from fastmcp.utilities.types import get_cached_typeadapter
+    from langchain_core.tools import StructuredTool
+
+    type_adapter = get_cached_typeadapter(tool.fn)
+
+    def run(**arguments: Any) -> str:
+        # context 由 set_context_headers 原地更新，每次调用读取当前值
+        with trading_context(**context):
+            result = type_adapter.validate_python(arguments)
+        return result if isinstance(result, str) else default_serializer(result)
+
+    return StructuredTool.from_function(
+        func=run,
+        name=tool.name,
+        description=tool.description or "",
+        args_schema=tool.parameters,
+    )
+
+
+async def load_in_process_tools(name: str, connection: Dict[str, Any]) -> List[Any]:
+    """
+    Import a FastMCP server module and wrap its tools as LangChain tools
+
+    Args:
+        name: Server name in the MCP config
+        connection: {"transport": "in_process", "module": ..., "tools": [...] (optional)}
+
+    Returns:
+        List of StructuredTool
+    """
+    module_name = connection.get("module")
+    if not module_name:
+        raise ValueError(f"❌ In-process MCP server '{name}' has no 'module'")
+    mcp = getattr(importlib.import_module(module_name), "mcp", None)
+    if mcp is None:
+        raise ValueError(f"❌ Module {module_name} has no FastMCP server named 'mcp'")
+
+    registered = await mcp.get_tools()
+    selected = connection.get("tools")
+    context = connection.setdefault("context", {})
+    return [
+        _wrap_tool(tool, context)
+        for tool_name, tool in registered.items()
+        if selected is None or tool_name in selected
+    ]
+
+
+async def load_agent_tools(mcp_config: Dict[str, Dict[str, Any]]) -> Tuple[Optional[Any], List[Any]]:
+    """
+    Load the tools of an agent's MCP config
+
+    Remote connections go through MultiServerMCPClient, in-process ones are imported directly.
+
+    Args:
+        mcp_config: Server name -> connection
+
+    Returns:
+        (MultiServerMCPClient or None if every server is in-process, tools)
+    """
+    remote, local = split_mcp_config(mcp_config)
+    client = None
+    tools: List[Any] = []
+    if remote:
+        from langchain_mcp_adapters.client import MultiServerMCPClient
+
+        client = MultiServerMCPClient(remote)
+        tools.extend(await client.get_tools())
+    for name, connection in local.items():
+        tools.extend(await load_in_process_tools(name, connection))
+    return client, tools
@@ -0,0 +1,132 @@
+"""
+MCP 请求级交易上下文
+The agent sends its trading context (signature, today date, market, log path and its runtime env
+file) as HTTP headers with every MCP tool call, and the tool servers apply them with
+tools.general_tools.trading_context for the duration of the call. One pool of tool servers can
+then serve several agents and dates concurrently; calls without these headers keep using the
+shared runtime env file.
+
+The servers write position files and the runtime env file at paths taken from these headers, so
+they are validated first: SIGNATURE must be a single path component, LOG_PATH and
+RUNTIME_ENV_PATH must not contain ".." segments, MARKET must be a known market and TODAY_DATE a
+date or timestamp. Absolute log and runtime env paths are accepted, as agents send them. Calls
+with an invalid context are rejected.
+"""
+
+import os
+import re
+from typing import Any, Dict, Optional
+
+from tools.general_tools import trading_context
+from tools.inprocess_tools import IN_PROCESS_TRANSPORT
+
+# Config key -> HTTP header carrying it
+CONTEXT_HEADERS: Dict[str, str] = {
+    "SIGNATURE": "x-trading-signature",
+    "TODAY_DATE": "x-trading-today-date",
+    "MARKET": "x-trading-market",
+    "LOG_PATH": "x-trading-log-path",
+    "RUNTIME_ENV_PATH": "x-trading-runtime-env",
+}
+
+_TODAY_DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}( \d{2}:\d{2}:\d{2})?")
+
+# Transports of langchain_mcp_adapters that send HTTP headers
+HTTP_TRANSPORTS = ("streamable_http", "streamable-http", "http", "sse")
+
+
+def context_headers(**values: Any) -> Dict[str, str]:
+    """
+    Build the headers of a trading context
+
+    Args:
+        **values: Config keys of CONTEXT_HEADERS and their values; None values are skipped
+
+    Returns:
+        Header name -> value
+    """
+    return {CONTEXT_HEADERS[key]: str(value) for key, value in values.items() if value is not None}
+
+
+def set_context_headers(mcp_config: Dict[str, Dict[str, Any]], **values: Any) -> None:
+    """
+    Attach a trading context to every HTTP and in-process connection of an MCP config, in place
+
+    MultiServerMCPClient keeps the connection dicts it was created with and opens a session from
+    them on every tool call, so updating the headers here applies to the following calls of the
+    already loaded tools.
+
+    Args:
+        mcp_config: Connections passed to MultiServerMCPClient
+        **values: Config keys of CONTEXT_HEADERS and their values
+    """
+    headers = context_headers(**values)
+    for connection in mcp_config.values():
+        if connection.get("transport") in HTTP_TRANSPORTS:
+            connection.setdefault("headers", {}).update(headers)
+        elif connection.get("transport") == IN_PROCESS_TRANSPORT:
+            # 进程内工具直接以 trading_context 运行
+            connection.setdefault("context", {}).update({key: value for key, value in values.items() if value is not None})
+
+
+def runtime_env_path() -> str:
+    """Absolute RUNTIME_ENV_PATH of this process, so servers write IF_TRADE to the caller's runtime env file"""
+    path = os.environ.get("RUNTIME_ENV_PATH") or "data/.runtime_env.json"
+    if not os.path.isabs(path):
+        path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), path)
+    return path
+
+
+def _has_parent_segment(path: str) -> bool:
+    return ".." in re.split(r"[\\/]", path)
+
+
+def validate_context(values: Dict[str, str]) -> Optional[str]:
+    """
+    Check a trading context received from a client before it is applied
+
+    Args:
+        values: Config key -> header value
+
+    Returns:
+        Reason the context is rejected, or None if it is valid
+    """
+    signature = values.get("SIGNATURE")
+    if signature is not None and (signature in (".", "..") or "/" in signature or "\\" in signature):
+        return f"invalid signature {signature!r}"
+    for key in ("LOG_PATH", "RUNTIME_ENV_PATH"):
+        path = values.get(key)
+        if path is not None and _has_parent_segment(path):
+            return f"{key} {path!r} must not contain '..' segments"
+    if values.get("MARKET") not in (None, "us", "cn", "crypto"):
+        return f"unknown market {values['MARKET']!r}"
+    today_date = values.get("TODAY_DATE")
+    if today_date is not None and not _TODAY_DATE_PATTERN.fullmatch(today_date):
+        return f"invalid date {today_date!r}"
+    return None
+
+
+def install_trading_context(mcp) -> None:
+    """
+    Apply the trading context headers of each request to the tool calls of a FastMCP server
+
+    Args:
+        mcp: FastMCP server
+    """
+    from fastmcp.exceptions import ToolError
+    from fastmcp.server.dependencies import get_http_headers
+    from fastmcp.server.middleware import Middleware
+
+    class TradingContextMiddleware(Middleware):
+        async def on_call_tool(self, context, call_next):
+            headers = get_http_headers()
+            values = {key: headers[header] for key, header in CONTEXT_HEADERS.items() if headers.get(header)}
+            if not values:
+                return await call_next(context)
+            error = validate_context(values)
+            if error:
+                raise ToolError(f"Rejected trading context: {error}")
+            with trading_context(**values):
+                return await call_next(context)
+
+    mcp.add_middleware(TradingContextMiddleware())
@@ -0,0 +1,151 @@
+"""
+MCP 服务传输方式
+The local tool servers speak streamable HTTP either on a localhost TCP port (MCP_TRANSPORT=http,
+the default) or on a Unix domain socket (MCP_TRANSPORT=uds), which skips the TCP loopback stack
+for every tool call. Sockets live in MCP_SOCKET_DIR (default <tmp>/ai-trader-mcp) and are named
+after the service ids of start_mcp_services.py: math, search, trade, price, crypto.
+
+The servers, start_mcp_services.py and the agents' default MCP configs all read the same
+settings, so switching transports only needs MCP_TRANSPORT in .env.
+
+Services listed in MCP_IN_PROCESS (e.g. "math,price,trade") skip MCP altogether in the agents'
+default configs: their tools are loaded into the agent process (see tools.inprocess_tools).
+"""
+
+import os
+import socket
+import tempfile
+from typing import Any, Callable, Dict, Optional, Set
+
+from tools.inprocess_tools import IN_PROCESS_TRANSPORT
+
+MCP_TRANSPORTS = ("http", "uds")
+
+# 纯本地 Python 的工具服务，可直接加载到 agent 进程内（新闻搜索依赖外部 API，保留为 MCP 服务）
+IN_PROCESS_MODULES = {
+    "math": "agent_tools.tool_math",
+    "price": "agent_tools.tool_get_price_local",
+    "trade": "agent_tools.tool_trade",
+    "crypto": "agent_tools.tool_crypto_trade",
+}
+
+
+def get_mcp_transport() -> str:
+    """Transport of the local MCP services from MCP_TRANSPORT: "http" (default) or "uds" """
+    transport = os.getenv("MCP_TRANSPORT", "http").strip().lower() or "http"
+    if transport not in MCP_TRANSPORTS:
+        print(f"⚠️  Unknown MCP_TRANSPORT '{transport}', using http")
+        return "http"
+    return transport
+
+
+def get_in_process_services() -> Set[str]:
+    """Service ids listed in MCP_IN_PROCESS (comma separated) whose tools run inside the agent process"""
+    services = {item.strip().lower() for item in os.getenv("MCP_IN_PROCESS", "").split(",") if item.strip()}
+    unknown = services - set(IN_PROCESS_MODULES)
+    if unknown:
+        print(f"⚠️  MCP_IN_PROCESS: {sorted(unknown)} cannot run in-process, using MCP")
+    return services & set(IN_PROCESS_MODULES)
+
+
+def get_socket_path(service: str) -> str:
+    """
+    Unix socket path of a service
+
+    Args:
+        service: Service id, e.g. "trade" or "price"
+
+    Returns:
+        <MCP_SOCKET_DIR>/<service>.sock
+    """
+    socket_dir = os.getenv("MCP_SOCKET_DIR") or os.path.join(tempfile.gettempdir(), "ai-trader-mcp")
+    return os.path.join(socket_dir, f"{service}.sock")
+
+
+def is_service_listening(service: str, port: int, transport: Optional[str] = None) -> bool:
+    """Whether something accepts connections on the service's port or socket"""
+    transport = transport or get_mcp_transport()
+    if transport == "uds":
+        family, address = socket.AF_UNIX, get_socket_path(service)
+    else:
+        family, address = socket.AF_INET, ("localhost", port)
+    try:
+        with socket.socket(family, socket.SOCK_STREAM) as sock:
+            sock.settimeout(1)
+            return sock.connect_ex(address) == 0
+    except OSError:
+        return False
+
+
+def run_mcp_server(mcp, service: str, port: int) -> None:
+    """
+    Run a FastMCP server with streamable HTTP on the configured transport
+
+    Args:
+        mcp: FastMCP server
+        service: Service id, names the socket in uds mode
+        port: Localhost port in http mode
+    """
+    if get_mcp_transport() != "uds":
+        mcp.run(transport="streamable-http", port=port)
+        return
+
+    socket_path = get_socket_path(service)
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+    if os.path.exists(socket_path):
+        if is_service_listening(service, port, "uds"):
+            raise RuntimeError(f"❌ {socket_path} is already served by another process")
+        # 上次异常退出留下的 socket 文件，uvicorn 无法绑定已存在的路径
+        os.remove(socket_path)
+    print(f"🔌 Serving {service} on unix socket {socket_path}")
+    mcp.run(transport="streamable-http", uvicorn_config={"uds": socket_path})
+
+
+def uds_client_factory(socket_path: str) -> Callable[..., Any]:
+    """
+    httpx client factory for MCP connections over a Unix socket
+
+    Args:
+        socket_path: Socket of the server
+
+    Returns:
+        Factory with the signature of mcp's create_mcp_http_client
+    """
+    import httpx
+
+    def factory(headers: Optional[Dict[str, str]] = None, timeout: Optional["httpx.Timeout"] = None, auth: Optional["httpx.Auth"] = None) -> "httpx.AsyncClient":
+        return httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(uds=socket_path),
+            headers=headers,
+            timeout=timeout if timeout is not None else httpx.Timeout(30.0),
+            auth=auth,
+            follow_redirects=True,
+        )
+
+    return factory
+
+
+def mcp_connection(service: str, port: Any) -> Dict[str, Any]:
+    """
+    MCP config entry of a local service on the configured transport
+
+    Args:
+        service: Service id, names the socket in uds mode
+        port: Localhost port in http mode
+
+    Returns:
+        in_process connection if the service is listed in MCP_IN_PROCESS, else a streamable_http
+        connection; in uds mode the URL host is ignored and requests go to the socket
+    """
+    if service in get_in_process_services():
+        return {"transport": IN_PROCESS_TRANSPORT, "module": IN_PROCESS_MODULES[service]}
+    if get_mcp_transport() == "uds":
+        return {
+            "transport": "streamable_http",
+            "url": "http://localhost/mcp",
+            "httpx_client_factory": uds_client_factory(get_socket_path(service)),
+        }
+    return {
+        "transport": "streamable_http",
+        "url": f"http://localhost:{port}/mcp",
+    }
@@ -0,0 +1,183 @@
+"""
+merged.jsonl 字节偏移索引（sidecar）
+Keeps a small sidecar file next to merged.jsonl that maps each symbol to the byte offset and
+length of its line, so a single symbol can be read with one seek + one json.loads instead of
+parsing the whole file. Suited to memory-constrained MCP workers that should not hold the
+full PriceStore in memory.
+"""
+
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Optional, Tuple
+
+INDEX_VERSION = 2
+
+
+def get_index_path(merged_path: Path) -> Path:
+    """Sidecar path, e.g. data/merged.jsonl -> data/merged.jsonl.index.json"""
+    merged_path = Path(merged_path)
+    return merged_path.with_name(merged_path.name + ".index.json")
+
+
+def _symbol_of_line(line: bytes) -> Optional[str]:
+    try:
+        doc = json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    if not isinstance(doc, dict):
+        return None
+    return doc.get("Meta Data", {}).get("2. Symbol")
+
+
+def _scan(f: BinaryIO) -> Dict[str, Any]:
+    """Build the index from an open binary handle, versioned by that handle's fstat"""
+    source_stat = os.fstat(f.fileno())
+    symbols: Dict[str, Tuple[int, int]] = {}
+    f.seek(0)
+    offset = 0
+    for line in f:
+        length = len(line)
+        if line.strip():
+            symbol = _symbol_of_line(line)
+            # 与逐行扫描保持一致：同一标的出现多次时以第一行为准
+            if symbol and symbol not in symbols:
+                symbols[symbol] = (offset, length)
+        offset += length
+
+    return {
+        "version": INDEX_VERSION,
+        "mtime_ns": source_stat.st_mtime_ns,
+        "size": source_stat.st_size,
+        "ino": source_stat.st_ino,
+        "symbols": symbols,
+    }
+
+
+def build_index(merged_path: Path) -> Dict[str, Any]:
+    """
+    Scan merged.jsonl once and build its symbol -> (offset, length) index
+
+    Args:
+        merged_path: Path of the merged.jsonl file
+
+    Returns:
+        Index dict with the source file's mtime_ns, size and inode and the "symbols" offsets
+    """
+    with Path(merged_path).open("rb") as f:
+        return _scan(f)
+
+
+def write_index(merged_path: Path) -> Dict[str, Any]:
+    """Build the index and write it atomically next to merged_path, called by the merge scripts"""
+    index = build_index(merged_path)
+    index_path = get_index_path(merged_path)
+    # 临时文件名唯一，同时写索引的进程互不覆盖
+    fd, tmp_path = tempfile.mkstemp(dir=index_path.parent, prefix=index_path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return index
+
+
+def _is_current(index: Dict[str, Any], source_stat: os.stat_result) -> bool:
+    return (
+        index.get("version") == INDEX_VERSION
+        and index.get("mtime_ns") == source_stat.st_mtime_ns
+        and index.get("size") == source_stat.st_size
+        and index.get("ino") == source_stat.st_ino
+    )
+
+
+_indexes: Dict[str, Dict[str, Any]] = {}
+_indexes_lock = threading.Lock()
+
+
+def load_index(merged_path: Path) -> Optional[Dict[str, Any]]:
+    """
+    Get a current index for merged_path
+
+    Uses the in-process copy or the sidecar file when they match the source file's mtime,
+    size and inode; otherwise rebuilds the index lazily and tries to persist it.
+
+    Args:
+        merged_path: Path of the merged.jsonl file
+
+    Returns:
+        Index dict, or None if merged_path does not exist
+    """
+    merged_path = Path(merged_path).resolve()
+    try:
+        source_stat = merged_path.stat()
+    except FileNotFoundError:
+        return None
+
+    key = str(merged_path)
+    index = _indexes.get(key)
+    if index is not None and _is_current(index, source_stat):
+        return index
+
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None and _is_current(index, source_stat):
+            return index
+
+        index = None
+        index_path = get_index_path(merged_path)
+        if index_path.exists():
+            try:
+                with open(index_path, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                index = None
+        if index is None or not _is_current(index, source_stat):
+            try:
+                index = write_index(merged_path)
+            except OSError as e:
+                print(f"⚠️  Warning: failed to write index {index_path}: {e}")
+                index = build_index(merged_path)
+        _indexes[key] = index
+    return index
+
+
+def read_symbol_doc(merged_path: Path, symbol: str) -> Optional[Dict[str, Any]]:
+    """
+    Read and parse only the merged.jsonl line of one symbol
+
+    Args:
+        merged_path: Path of the merged.jsonl file
+        symbol: Symbol to read, e.g. "AAPL" or "600519.SH"
+
+    Returns:
+        The parsed JSON document of that symbol, or None if the file or symbol is missing
+    """
+    try:
+        f = open(merged_path, "rb")
+    except FileNotFoundError:
+        return None
+
+    with f:
+        index = load_index(merged_path)
+        if index is None or not _is_current(index, os.fstat(f.fileno())):
+            # 文件在打开前后被 merge 脚本替换：直接为已打开的这份文件建索引，保证偏移与内容一致
+            index = _scan(f)
+        entry = index["symbols"].get(symbol)
+        if entry is None:
+            return None
+
+        offset, length = entry
+        f.seek(offset)
+        line = f.read(length)
+    try:
+        doc = json.loads(line)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    return doc if isinstance(doc, dict) else None
@@ -0,0 +1,337 @@
+"""
+SQLite 持仓账本（可选后端）
+Keeps the position records of every signature of one market in a local SQLite database with a
+(position file, date, id) index. WAL mode lets agents and trade tool servers read while one writer
+commits, and each buy / sell reads the latest position, validates and inserts its record inside
+a single BEGIN IMMEDIATE transaction, so concurrent trades against one server cannot interleave
+their read-modify-append steps. The bought table keeps the per-day bought quantity of each
+(position file, day, symbol) for the A-share T+1 check.
+
+position.jsonl stays the published log that result_tools, the agents and the docs site read:
+every record is appended to it inside the transaction and then imported from it, so the database
+is an index of the file. A transaction that rolls back cuts the file back to its size at BEGIN,
+so its lines never show up in a later import. The sources table remembers how many bytes of each
+position file were imported; lines appended by other writers (the jsonl backend, another process)
+are imported from that offset on the next access, and only a file that was replaced or rewritten
+(agent registration, compaction, a deleted run) is imported again from the start. Rows are keyed
+by the position file, so runs with different LOG_PATHs can share one database.
+
+Enable it with POSITION_BACKEND=sqlite; the database path defaults to data/positions_{market}.db
+and can be overridden with POSITION_DB_PATH ({market} is replaced by us / cn / crypto).
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# 将项目根目录加入 Python 路径，便于从子目录直接运行本文件
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+from tools.general_tools import get_config_value
+from tools.position_ledger import (Record, bought_entry, get_position_file,
+                                   get_position_ledger, iter_records)
+from tools.price_store import DAY_END
+
+SCHEMA_VERSION = 2
+
+# ledger 列为 position.jsonl 的绝对路径
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    seq       INTEGER PRIMARY KEY,
+    ledger    TEXT NOT NULL,
+    date      TEXT NOT NULL,
+    id        INTEGER NOT NULL,
+    record    TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_records_ledger_date_id ON records (ledger, date, id);
+
+CREATE TABLE IF NOT EXISTS bought (
+    ledger    TEXT NOT NULL,
+    day       TEXT NOT NULL,
+    symbol    TEXT NOT NULL,
+    qty       NUMERIC NOT NULL,
+    PRIMARY KEY (ledger, day, symbol)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS sources (
+    ledger    TEXT PRIMARY KEY,
+    signature TEXT NOT NULL,
+    ino       INTEGER NOT NULL,
+    offset    INTEGER NOT NULL,
+    tail      BLOB NOT NULL
+);
+"""
+
+# 与 offset 一起保存的已导入内容末尾字节数，用于确认文件在 offset 之前未被改写
+TAIL_BYTES = 64
+
+
+def get_position_db_path(market: str) -> Path:
+    """Database path of a market from POSITION_DB_PATH, relative paths resolve from the project root"""
+    template = get_config_value("POSITION_DB_PATH", "data/positions_{market}.db")
+    path = Path(str(template).format(market=market))
+    if not path.is_absolute():
+        path = Path(project_root) / path
+    return path
+
+
+def connect(db_path: Path) -> sqlite3.Connection:
+    """Open a position database in WAL mode with explicit transaction control"""
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(db_path), isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+        # 数据库只是 position.jsonl 的索引：旧版本的表直接重建，下次访问时从文件重新导入
+        conn.executescript(
+            "BEGIN IMMEDIATE; DROP TABLE IF EXISTS records; DROP TABLE IF EXISTS bought; DROP TABLE IF EXISTS sources;"
+            f"{SCHEMA} PRAGMA user_version = {SCHEMA_VERSION}; COMMIT;"
+        )
+    return conn
+
+
+def _read_tail(f, offset: int) -> bytes:
+    """The TAIL_BYTES bytes of an open file that end at offset"""
+    start = max(offset - TAIL_BYTES, 0)
+    f.seek(start)
+    return f.read(offset - start)
+
+
+class SqlitePositionLedger:
+    """
+    Position records of one signature in the market's SQLite database, with the same query
+    and append interface as PositionLedger
+
+    Attributes:
+        signature: Model name
+        market: "us", "cn" or "crypto"
+        db_path: SQLite database of the market
+        path: position.jsonl the records are appended to and imported from
+    """
+
+    def __init__(self, signature: str, market: str, db_path: Optional[Path] = None, path: Optional[Path] = None):
+        self.signature = signature
+        self.market = market
+        self.db_path = Path(db_path) if db_path else get_position_db_path(market)
+        self.path = Path(path) if path else get_position_file(signature)
+        self.key = str(self.path.resolve())
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 连接不能跨线程共享事务，每个线程各用一个连接
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.db_path)
+            self._local.conn = conn
+        return conn
+
+    def _is_synced(self, conn: sqlite3.Connection) -> bool:
+        row = conn.execute("SELECT ino, offset FROM sources WHERE ledger = ?", (self.key,)).fetchone()
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return row is None
+        return row is not None and tuple(row) == (stat.st_ino, stat.st_size)
+
+    def _sync(self, conn: sqlite3.Connection) -> None:
+        """Import the lines appended to position.jsonl since the last import; must run in a write transaction"""
+        row = conn.execute("SELECT ino, offset, tail FROM sources WHERE ledger = ?", (self.key,)).fetchone()
+        try:
+            f = self.path.open("rb")
+        except FileNotFoundError:
+            self._clear(conn)
+            return
+        with f:
+            stat = os.fstat(f.fileno())
+            offset, state = 0, {}
+            if row is not None and row[0] == stat.st_ino and row[1] <= stat.st_size and _read_tail(f, row[1]) == row[2]:
+                # 同一文件且已导入部分未变：只导入追加的内容
+                offset = row[1]
+                if offset == stat.st_size:
+                    return
+                last = conn.execute(
+                    "SELECT record FROM records WHERE ledger = ? ORDER BY seq DESC LIMIT 1", (self.key,)
+                ).fetchone()
+                state = json.loads(last[0]).get("positions", {}) if last else {}
+            else:
+                self._clear(conn)
+            f.seek(offset)
+            data = f.read()
+            # 只导入到最后一个换行符；没有换行结尾的最后一行能完整解析时一并导入，否则留到写完后
+            end = data.rfind(b"\n") + 1
+            if data[end:].strip():
+                try:
+                    json.loads(data[end:])
+                    end = len(data)
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    pass
+            records = [record for record in iter_records(data[:end].splitlines(), state) if record.get("date")]
+            offset += end
+            tail = _read_tail(f, offset)
+        conn.executemany(
+            "INSERT INTO records (ledger, date, id, record) VALUES (?, ?, ?, ?)",
+            [(self.key, record["date"], record.get("id", -1), json.dumps(record)) for record in records],
+        )
+        for record in records:
+            self._add_bought(conn, record)
+        conn.execute(
+            "INSERT OR REPLACE INTO sources (ledger, signature, ino, offset, tail) VALUES (?, ?, ?, ?, ?)",
+            (self.key, self.signature, stat.st_ino, offset, tail),
+        )
+
+    def _clear(self, conn: sqlite3.Connection) -> None:
+        for table in ("records", "bought", "sources"):
+            conn.execute(f"DELETE FROM {table} WHERE ledger = ?", (self.key,))
+
+    def _add_bought(self, conn: sqlite3.Connection, record: Record) -> None:
+        entry = bought_entry(record)
+        if entry is None:
+            return
+        conn.execute(
+            "INSERT INTO bought (ledger, day, symbol, qty) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (ledger, day, symbol) DO UPDATE SET qty = qty + excluded.qty",
+            (self.key, *entry),
+        )
+
+    @contextmanager
+    def transaction(self) -> Iterator["SqlitePositionLedger"]:
+        """
+        Run the enclosed reads and appends of this thread as one write transaction
+
+        Other writers of the database wait until it commits; nested calls join the outer transaction.
+        """
+        conn = self._conn()
+        if conn.in_transaction:
+            yield self
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        size = None
+        try:
+            self._sync(conn)
+            try:
+                size = os.path.getsize(self.path)
+            except FileNotFoundError:
+                size = 0
+            yield self
+        except BaseException:
+            conn.execute("ROLLBACK")
+            if size is not None:
+                self._discard_appends(size)
+            raise
+        conn.execute("COMMIT")
+
+    def _discard_appends(self, size: int) -> None:
+        """Cut position.jsonl back to size, dropping the lines appended by a rolled-back transaction"""
+        try:
+            if os.path.getsize(self.path) <= size:
+                return
+            os.truncate(self.path, size)
+        except FileNotFoundError:
+            return
+        # 进程内的 jsonl 账本发现文件变短后重新读取
+        get_position_ledger(self.path).refresh()
+
+    def _synced_conn(self) -> sqlite3.Connection:
+        conn = self._conn()
+        if not conn.in_transaction and not self._is_synced(conn):
+            with self.transaction():
+                pass
+        return conn
+
+    def _query(self, sql: str, params: Tuple[Any, ...]) -> Optional[Record]:
+        row = self._synced_conn().execute(sql, params).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def latest_on(self, date: str) -> Optional[Record]:
+        """Record with the highest id on date, or None"""
+        return self._query(
+            "SELECT record FROM records WHERE ledger = ? AND date = ? ORDER BY id DESC, seq LIMIT 1",
+            (self.key, date),
+        )
+
+    def latest_before(self, date: str) -> Optional[Record]:
+        """Record with the highest (date, id) strictly before date, or None"""
+        return self._query(
+            "SELECT record FROM records WHERE ledger = ? AND date < ? ORDER BY date DESC, id DESC, seq LIMIT 1",
+            (self.key, date),
+        )
+
+    def get_latest(self) -> Optional[Record]:
+        """Record with the highest (date, id), or None"""
+        return self._query(
+            "SELECT record FROM records WHERE ledger = ? ORDER BY date DESC, id DESC, seq LIMIT 1",
+            (self.key,),
+        )
+
+    def as_of(self, ts: str) -> Optional[Record]:
+        """Record with the highest (date, id) at or before ts, same semantics as PositionLedger.as_of"""
+        return self._query(
+            "SELECT record FROM records WHERE ledger = ? AND date <= ? ORDER BY date DESC, id DESC, seq LIMIT 1",
+            (self.key, ts if " " in ts else ts + DAY_END),
+        )
+
+    def range(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Record]:
+        """Latest record of every date within [start, end], same semantics as PositionLedger.range"""
+        rows = self._synced_conn().execute(
+            "SELECT date, record FROM records WHERE ledger = ? AND date >= ? AND date <= ? ORDER BY date, id DESC, seq",
+            (self.key, start or "", (end if " " in end else end + DAY_END) if end else DAY_END),
+        )
+        records: List[Record] = []
+        last_date = None
+        for date, record in rows:
+            if date != last_date:
+                records.append(json.loads(record))
+                last_date = date
+        return records
+
+    def bought_on(self, date: str, symbol: str) -> Any:
+        """Total quantity of symbol bought on the trading day of date, same semantics as PositionLedger.bought_on"""
+        row = self._synced_conn().execute(
+            "SELECT qty FROM bought WHERE ledger = ? AND day = ? AND symbol = ?",
+            (self.key, date[:10], symbol),
+        ).fetchone()
+        return row[0] if row else 0
+
+    def append(self, record: Record) -> None:
+        """Insert one record and mirror it to position.jsonl, in the current transaction if one is open"""
+        self.extend([record])
+
+    def extend(self, records: List[Record]) -> None:
+        """Append several records to position.jsonl with a single write and import them, in one transaction"""
+        with self.transaction():
+            get_position_ledger(self.path).extend(records)
+            self._sync(self._conn())
+
+
+_ledgers: Dict[Tuple[str, str, str], SqlitePositionLedger] = {}
+_ledgers_lock = threading.Lock()
+
+
+def get_sqlite_position_ledger(signature: str, market: str, db_path: Optional[Path] = None) -> SqlitePositionLedger:
+    """
+    Get the process-wide SqlitePositionLedger of a signature
+
+    Args:
+        signature: Model name
+        market: "us", "cn" or "crypto", selects the database
+        db_path: Database path, defaults to get_position_db_path(market)
+
+    Returns:
+        SqlitePositionLedger over the signature's position.jsonl under the current LOG_PATH
+    """
+    db_path = Path(db_path) if db_path else get_position_db_path(market)
+    path = get_position_file(signature)
+    key = (signature, str(db_path), str(path))
+    ledger = _ledgers.get(key)
+    if ledger is None:
+        with _ledgers_lock:
+            ledger = _ledgers.setdefault(key, SqlitePositionLedger(signature, market, db_path, path))
+    return ledger
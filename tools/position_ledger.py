@@ -0,0 +1,689 @@
+"""
+PositionLedger - 增量读取的持仓账本
+Tails a signature's position.jsonl and keeps, per date, the record with the highest id plus
+the global latest record in memory. Each lookup only parses the lines appended since the
+previous one, so latest-position queries stay O(1) however long the ledger grows.
+
+Snapshot + delta format (opt-in via POSITION_SNAPSHOT_INTERVAL=N): every N-th record is a full
+snapshot with "positions"; the records in between carry only "delta", the holdings whose value
+changed ({symbol: new value}, null for a removed key). The ledger rebuilds full positions while
+reading, so callers always see records with "positions". Existing files need no migration;
+rewrite history into the compact format with:
+
+    python tools/position_ledger.py compact <signature> [--log-path ./data/agent_data] [--interval 50]
+
+Sparse positions (opt-in via POSITION_MODE=sparse): records keep only non-zero holdings plus
+CASH instead of one entry per symbol of the universe. Readers treat a missing symbol as 0;
+to_dense() rebuilds the full {symbol: 0, ...} form for callers that need every symbol.
+
+Writes go through one append handle per position file that stays open between appends. Each
+append is flushed to the OS right away, so other processes see it; POSITION_FSYNC controls
+durability: "none" (default) leaves syncing to the OS, "always" fsyncs every append, and
+"group" fsyncs all ledgers written since the last sync every POSITION_FSYNC_INTERVAL seconds
+(default 1), at the end of each agent session (flush_position_ledgers) and at exit.
+
+The per-day bought quantities of the A-share T+1 check are checkpointed to a sidecar next to
+the position file (position.jsonl.bought.json) at the same points, versioned by the file's
+inode, the byte offset it covers and a hash of those bytes. A process that loads the ledger
+again takes the aggregate from the checkpoint and only adds the buys appended after it.
+
+POSITION_BACKEND=sqlite keeps the records in a per-market SQLite database instead
+(tools/position_db.py); open_position_ledger() returns the ledger of the configured backend.
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# 将项目根目录加入 Python 路径，便于从子目录直接运行本文件
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+from tools.price_store import DAY_END
+
+Record = Dict[str, Any]
+
+# Default snapshot interval of the compaction command when POSITION_SNAPSHOT_INTERVAL is not set
+DEFAULT_COMPACT_INTERVAL = 50
+
+# Actions whose amount counts toward the per-day bought quantity (A-share T+1 check)
+BUY_ACTIONS = ("buy", "buy_crypto")
+
+BOUGHT_INDEX_VERSION = 1
+
+
+def get_position_file(signature: str, log_path: Optional[str] = None) -> Path:
+    """
+    Resolve data/<log_path>/<signature>/position/position.jsonl
+
+    Args:
+        signature: Model name
+        log_path: Log directory, defaults to the LOG_PATH config value ("./data/agent_data").
+                  Absolute paths are used as-is, "./data/xxx" and "xxx" resolve under <project>/data
+
+    Returns:
+        Path of the position file (it may not exist yet)
+    """
+    if log_path is None:
+        from tools.general_tools import get_config_value
+
+        log_path = get_config_value("LOG_PATH", "./data/agent_data")
+
+    if os.path.isabs(log_path):
+        return Path(log_path) / signature / "position" / "position.jsonl"
+
+    if log_path.startswith("./data/"):
+        log_path = log_path[7:]  # Remove "./data/" prefix
+    base_dir = Path(__file__).resolve().parents[1]
+    return base_dir / "data" / log_path / signature / "position" / "position.jsonl"
+
+
+def get_bought_index_path(path: Path) -> Path:
+    """Sidecar of the bought quantities, e.g. position.jsonl -> position.jsonl.bought.json"""
+    path = Path(path)
+    return path.with_name(path.name + ".bought.json")
+
+
+def get_snapshot_interval() -> int:
+    """POSITION_SNAPSHOT_INTERVAL config value; 0 (default) writes every record as a full snapshot"""
+    from tools.general_tools import get_config_value
+
+    try:
+        return max(int(get_config_value("POSITION_SNAPSHOT_INTERVAL", 0) or 0), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def get_position_mode() -> str:
+    """POSITION_MODE config value: "dense" (default, every symbol of the universe) or "sparse" """
+    from tools.general_tools import get_config_value
+
+    mode = str(get_config_value("POSITION_MODE", "dense") or "dense").lower()
+    return mode if mode in ("dense", "sparse") else "dense"
+
+
+def to_sparse(positions: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop zero holdings, CASH is always kept"""
+    return {key: value for key, value in positions.items() if key == "CASH" or value}
+
+
+def to_dense(positions: Dict[str, Any], symbols: Iterable[str]) -> Dict[str, Any]:
+    """
+    Expand positions to one entry per symbol
+
+    Args:
+        positions: Sparse or dense positions
+        symbols: Symbol universe, missing symbols are filled with 0
+
+    Returns:
+        {symbol: amount} for every symbol, followed by any other held keys and CASH
+    """
+    dense = {symbol: positions.get(symbol, 0) for symbol in symbols}
+    for key, value in positions.items():
+        if key not in dense and key != "CASH":
+            dense[key] = value
+    dense["CASH"] = positions.get("CASH", 0)
+    return dense
+
+
+def format_positions(positions: Dict[str, Any]) -> Dict[str, Any]:
+    """Positions in the configured POSITION_MODE: sparse drops zero holdings, dense leaves them unchanged"""
+    return to_sparse(positions) if get_position_mode() == "sparse" else positions
+
+
+def normalize_record(record: Record) -> Record:
+    """Record as it is persisted: without zero holdings when POSITION_MODE=sparse"""
+    if "positions" in record and get_position_mode() == "sparse":
+        return dict(record, positions=to_sparse(record["positions"]))
+    return record
+
+
+def get_fsync_policy() -> str:
+    """POSITION_FSYNC config value: "none" (default), "always" or "group" """
+    from tools.general_tools import get_config_value
+
+    policy = str(get_config_value("POSITION_FSYNC", "none") or "none").lower()
+    return policy if policy in ("none", "always", "group") else "none"
+
+
+def get_fsync_interval() -> float:
+    """POSITION_FSYNC_INTERVAL config value in seconds for the "group" policy, default 1"""
+    from tools.general_tools import get_config_value
+
+    try:
+        return max(float(get_config_value("POSITION_FSYNC_INTERVAL", 1.0) or 1.0), 0.0)
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def _record_id(record: Record) -> int:
+    return record.get("id", -1)
+
+
+def bought_entry(record: Record) -> Optional[Tuple[str, str, Any]]:
+    """(trading day, symbol, amount) of a buy record, None for any other record"""
+    action = record.get("this_action") or {}
+    date = record.get("date")
+    if not date or action.get("action") not in BUY_ACTIONS:
+        return None
+    return date[:10], action.get("symbol"), action.get("amount", 0)
+
+
+def _expand(raw: Record, state: Dict[str, Any]) -> Record:
+    """Apply one stored record to the running positions state and return it with full positions"""
+    if "positions" in raw:
+        state.clear()
+        state.update(raw["positions"])
+        return raw
+    if "delta" not in raw:
+        return raw
+    for key, value in raw["delta"].items():
+        if value is None:
+            state.pop(key, None)
+        else:
+            state[key] = value
+    record = {key: value for key, value in raw.items() if key != "delta"}
+    record["positions"] = dict(state)
+    return record
+
+
+def _encode_delta(record: Record, state: Dict[str, Any]) -> Record:
+    """Stored form of a full record as a delta against the positions state before it"""
+    positions = record.get("positions", {})
+    delta: Dict[str, Any] = {key: value for key, value in positions.items() if key not in state or state[key] != value}
+    delta.update({key: None for key in state if key not in positions})
+    stored = {key: value for key, value in record.items() if key != "positions"}
+    stored["delta"] = delta
+    return stored
+
+
+def iter_records(lines: Iterable[bytes], state: Optional[Dict[str, Any]] = None) -> Iterator[Record]:
+    """
+    Parse position.jsonl lines in file order, yielding records with full positions
+
+    Args:
+        lines: Lines of the file, or of its tail
+        state: Positions of the record before the first line, needed when lines start with a delta record
+    """
+    state = dict(state or {})
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            raw = json.loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            continue
+        if isinstance(raw, dict):
+            yield _expand(raw, state)
+
+
+class PositionLedger:
+    """
+    In-memory index over one position.jsonl, kept current by reading only appended lines
+
+    Attributes:
+        path: Path of the position file
+        by_date: {date: record with the highest id on that date}
+        dates: Sorted dates that have at least one record
+        latest: Record with the highest (date, id), or None for an empty ledger
+        last: Last record in file order, or None
+        count: Number of records read
+
+    It also keeps {(trading day, symbol): bought quantity} for bought_on(), checkpointed to
+    position.jsonl.bought.json by save_bought_index(). All records handed out carry full
+    "positions", whether they were stored as snapshots or deltas.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        # 追加写句柄在多次写入之间保持打开；文件被替换（inode 变化）时重新打开
+        self._fh = None
+        self._fh_ino: Optional[int] = None
+        self._dirty = False
+        # 本进程是否追加过记录（只为这些账本写 bought 检查点）
+        self._appended = False
+        self._reset()
+
+    def _reset(self) -> None:
+        self.by_date: Dict[str, Record] = {}
+        self.dates: List[str] = []
+        self.latest: Optional[Record] = None
+        self.last: Optional[Record] = None
+        self.count = 0
+        self._offset = 0
+        self._ino: Optional[int] = None
+        # 按文件顺序累积的持仓状态（用于还原 delta 记录），以及距上一个完整快照的记录数
+        self._state: Dict[str, Any] = {}
+        self._since_snapshot = 0
+        # (交易日, 标的) -> 当日累计买入数量，供 A 股 T+1 检查使用；_bought_from 之前的买入已由检查点计入
+        self._bought: Dict[Tuple[str, str], Any] = {}
+        self._bought_from = 0
+        # 当前文件上次写入（或读取）的检查点偏移，以及已读取字节的 SHA-1
+        self._checkpoint_offset: Optional[int] = None
+        self._sha1 = hashlib.sha1()
+
+    def _apply(self, record: Record) -> None:
+        date = record.get("date")
+        if not date:
+            return
+        current = self.by_date.get(date)
+        if current is None:
+            insort(self.dates, date)
+            self.by_date[date] = record
+        elif _record_id(record) > _record_id(current):
+            # 同一日期取 id 最大的记录，id 相同时保留先写入的那条
+            self.by_date[date] = record
+        else:
+            return
+        if self.latest is None or (date, _record_id(record)) > (self.latest["date"], _record_id(self.latest)):
+            self.latest = record
+
+    def refresh(self) -> "PositionLedger":
+        """Parse the lines appended since the last refresh; re-read from scratch if the file was replaced"""
+        with self._lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                self._reset()
+                return self
+
+            if stat.st_ino != self._ino or stat.st_size < self._offset:
+                self._reset()
+                self._ino = stat.st_ino
+            if stat.st_size == self._offset:
+                return self
+
+            with self.path.open("rb") as f:
+                f.seek(self._offset)
+                data = f.read()
+            if self._offset == 0:
+                self._load_bought_index(data)
+            # 偏移只推进到最后一个换行符；没有换行结尾的最后一行照常解析（可能是完整记录），
+            # 但不计入累积状态，留到下次重新读取，以防它只写了一半
+            end = data.rfind(b"\n") + 1
+            position = self._offset
+            for line in data[:end].splitlines(keepends=True):
+                self._read_line(line, position >= self._bought_from)
+                position += len(line)
+            self._sha1.update(data[:end])
+            tail = data[end:]
+            if tail.strip():
+                saved = (dict(self._state), self._since_snapshot, self.count, self.last, dict(self._bought))
+                self._read_line(tail)
+                self._state, self._since_snapshot, self.count, self.last, self._bought = saved
+            self._offset += end
+        return self
+
+    def _load_bought_index(self, data: bytes) -> None:
+        """Take the bought quantities from the sidecar if it was written for the first bytes of data"""
+        try:
+            with get_bought_index_path(self.path).open("r", encoding="utf-8") as f:
+                index = json.load(f)
+            offset = index["offset"]
+            if (
+                index.get("version") != BOUGHT_INDEX_VERSION
+                or index.get("ino") != self._ino
+                or not 0 < offset <= len(data)
+                or hashlib.sha1(data[:offset]).hexdigest() != index["sha1"]
+            ):
+                return
+            bought = {(day, symbol): qty for day, symbol, qty in index["bought"]}
+        except (OSError, json.JSONDecodeError, KeyError, TypeError, ValueError):
+            return
+        self._bought = bought
+        self._bought_from = offset
+        self._checkpoint_offset = offset
+
+    def save_bought_index(self) -> None:
+        """Checkpoint the bought quantities to the sidecar; only ledgers this process appended to are written"""
+        with self._lock:
+            if not self._appended or self._ino is None or self._offset == self._checkpoint_offset:
+                return
+            try:
+                if os.stat(self.path).st_ino != self._ino:
+                    return
+            except FileNotFoundError:
+                return
+            index = {
+                "version": BOUGHT_INDEX_VERSION,
+                "ino": self._ino,
+                "offset": self._offset,
+                "sha1": self._sha1.hexdigest(),
+                "bought": [[day, symbol, qty] for (day, symbol), qty in self._bought.items()],
+            }
+            index_path = get_bought_index_path(self.path)
+            # 多个进程可能同时写同一份 sidecar，各用一个唯一的临时文件
+            fd, tmp_path = tempfile.mkstemp(dir=index_path.parent, prefix=index_path.name + ".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(index, f, ensure_ascii=False)
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, index_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            self._checkpoint_offset = self._offset
+
+    def _read_line(self, line: bytes, count_bought: bool = True) -> None:
+        if not line.strip():
+            return
+        try:
+            raw = json.loads(line)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return
+        if not isinstance(raw, dict):
+            return
+        record = _expand(raw, self._state)
+        self._since_snapshot = 0 if "positions" in raw else self._since_snapshot + 1
+        self.count += 1
+        self.last = record
+        entry = bought_entry(record) if count_bought else None
+        if entry is not None:
+            day, symbol, amount = entry
+            self._bought[(day, symbol)] = self._bought.get((day, symbol), 0) + amount
+        self._apply(record)
+
+    def append(self, record: Record) -> None:
+        """
+        Append one record to position.jsonl and index it
+
+        Args:
+            record: {"date", "id", "this_action", "positions"} with full positions; stored as a delta
+                    when POSITION_SNAPSHOT_INTERVAL is set and the current snapshot run is not full yet,
+                    and without zero holdings when POSITION_MODE=sparse
+        """
+        self.extend([record])
+
+    def extend(self, records: List[Record]) -> None:
+        """Append several records with a single write, each stored the same way append() stores it"""
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.refresh()
+            # 文件最后一行没有换行结尾时先补上，避免两条记录写到同一行；这一批记录都写成完整快照
+            unterminated = self.path.exists() and self.path.stat().st_size > self._offset
+            interval = get_snapshot_interval()
+            state, since, count = dict(self._state), self._since_snapshot, self.count
+            lines = []
+            for record in records:
+                record = normalize_record(record)
+                stored = record
+                if interval > 1 and not unterminated and count > 0 and since + 1 < interval and "positions" in record:
+                    stored = _encode_delta(record, state)
+                lines.append(json.dumps(stored))
+                state = dict(record.get("positions", state))
+                since = 0 if "positions" in stored else since + 1
+                count += 1
+            if not lines:
+                return
+            fh = self._handle()
+            self._appended = True
+            fh.write((("\n" if unterminated else "") + "\n".join(lines) + "\n").encode("utf-8"))
+            fh.flush()
+            policy = get_fsync_policy()
+            if policy == "always":
+                os.fsync(fh.fileno())
+            elif policy == "group":
+                self._dirty = True
+                _group_committer.add(self)
+            self.refresh()
+
+    def _handle(self):
+        try:
+            ino: Optional[int] = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            ino = None
+        if self._fh is None or ino != self._fh_ino:
+            self.close()
+            self._fh = self.path.open("ab")
+            self._fh_ino = os.fstat(self._fh.fileno()).st_ino
+        return self._fh
+
+    def sync(self) -> None:
+        """fsync the appends not yet synced under the "group" policy"""
+        with self._lock:
+            if self._fh is not None and self._dirty:
+                os.fsync(self._fh.fileno())
+            self._dirty = False
+
+    def close(self) -> None:
+        """Sync and close the append handle; the next append reopens it"""
+        with self._lock:
+            if self._fh is None:
+                return
+            try:
+                if self._dirty:
+                    os.fsync(self._fh.fileno())
+            finally:
+                self._fh.close()
+                self._fh = None
+                self._fh_ino = None
+                self._dirty = False
+
+    @contextmanager
+    def transaction(self) -> Iterator["PositionLedger"]:
+        """Hold the ledger for a read-validate-append sequence of this process"""
+        with self._lock:
+            yield self
+
+    def latest_on(self, date: str) -> Optional[Record]:
+        """Record with the highest id on date, or None"""
+        with self._lock:
+            return self.refresh().by_date.get(date)
+
+    def latest_before(self, date: str) -> Optional[Record]:
+        """Record with the highest (date, id) strictly before date, or None"""
+        with self._lock:
+            self.refresh()
+            i = bisect_left(self.dates, date)
+            return self.by_date[self.dates[i - 1]] if i > 0 else None
+
+    def get_latest(self) -> Optional[Record]:
+        """Record with the highest (date, id) in the whole ledger, or None"""
+        with self._lock:
+            return self.refresh().latest
+
+    def as_of(self, ts: str) -> Optional[Record]:
+        """Record with the highest (date, id) at or before ts; a date-only ts covers that whole day"""
+        with self._lock:
+            self.refresh()
+            i = bisect_right(self.dates, ts if " " in ts else ts + DAY_END)
+            return self.by_date[self.dates[i - 1]] if i > 0 else None
+
+    def range(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Record]:
+        """
+        Latest record of every date within [start, end], in date order
+
+        Args:
+            start: Lower bound, None for the first record
+            end: Upper bound, None for the last record; a date-only end covers that whole day
+
+        Returns:
+            One record per date, the one with the highest id on that date
+        """
+        with self._lock:
+            self.refresh()
+            lo = 0 if start is None else bisect_left(self.dates, start)
+            hi = len(self.dates) if end is None else bisect_right(self.dates, end if " " in end else end + DAY_END)
+            return [self.by_date[date] for date in self.dates[lo:hi]]
+
+    def bought_on(self, date: str, symbol: str) -> Any:
+        """Total quantity of symbol bought on the trading day of date ("YYYY-MM-DD" or "YYYY-MM-DD HH:MM:SS")"""
+        with self._lock:
+            return self.refresh()._bought.get((date[:10], symbol), 0)
+
+
+_ledgers: Dict[str, PositionLedger] = {}
+_ledgers_lock = threading.Lock()
+
+
+def get_position_ledger(path: Path) -> PositionLedger:
+    """Process-wide PositionLedger for a position file, refreshed on every query"""
+    key = str(Path(path).resolve())
+    ledger = _ledgers.get(key)
+    if ledger is None:
+        with _ledgers_lock:
+            ledger = _ledgers.setdefault(key, PositionLedger(Path(key)))
+    return ledger
+
+
+class _GroupCommitter:
+    """Background thread that fsyncs the ledgers written under the "group" policy, once per interval"""
+
+    def __init__(self):
+        self._pending: Dict[str, PositionLedger] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, ledger: PositionLedger) -> None:
+        with self._cond:
+            self._pending[str(ledger.path)] = ledger
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="position-group-commit", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            # 等待一个间隔，让这段时间内的追加共用一次 fsync
+            time.sleep(get_fsync_interval())
+            with self._cond:
+                batch, self._pending = self._pending, {}
+            for ledger in batch.values():
+                try:
+                    ledger.sync()
+                except OSError as e:
+                    print(f"⚠️  Warning: fsync of {ledger.path} failed: {e}")
+
+
+_group_committer = _GroupCommitter()
+
+
+def flush_position_ledgers() -> None:
+    """
+    fsync every position file this process appended to and checkpoint its bought quantities;
+    called at the end of each agent session and at exit
+    """
+    for ledger in list(_ledgers.values()):
+        try:
+            ledger.sync()
+        except OSError as e:
+            print(f"⚠️  Warning: fsync of {ledger.path} failed: {e}")
+        try:
+            ledger.save_bought_index()
+        except OSError as e:
+            print(f"⚠️  Warning: failed to write {get_bought_index_path(ledger.path)}: {e}")
+
+
+atexit.register(flush_position_ledgers)
+
+
+def get_position_backend() -> str:
+    """POSITION_BACKEND config value: "jsonl" (default) or "sqlite" """
+    from tools.general_tools import get_config_value
+
+    backend = str(get_config_value("POSITION_BACKEND", "jsonl") or "jsonl").lower()
+    return backend if backend in ("jsonl", "sqlite") else "jsonl"
+
+
+def open_position_ledger(signature: str, market: Optional[str] = None):
+    """
+    Ledger of a signature in the configured POSITION_BACKEND
+
+    Args:
+        signature: Model name
+        market: Market of the SQLite database, defaults to the MARKET config value
+
+    Returns:
+        PositionLedger over position.jsonl, or SqlitePositionLedger when POSITION_BACKEND=sqlite.
+        Both provide latest_on / latest_before / get_latest / as_of / range / bought_on / append / extend /
+        transaction.
+    """
+    if get_position_backend() == "sqlite":
+        from tools.position_db import get_sqlite_position_ledger
+        from tools.price_tools import get_market_type
+
+        return get_sqlite_position_ledger(signature, market or get_market_type())
+    return get_position_ledger(get_position_file(signature))
+
+
+def compact_position_file(path: Path, interval: int, keep_backup: bool = True) -> Tuple[int, int]:
+    """
+    Rewrite a position file into the snapshot + delta format
+
+    The rewrite is atomic (temporary file + os.replace). Run it while no agent is trading
+    with this signature, appends made during the rewrite would be lost.
+
+    Args:
+        path: position.jsonl to rewrite
+        interval: Full snapshot every `interval` records; 1 or less expands every record back to a full snapshot
+        keep_backup: Copy the original file to position.jsonl.bak first
+
+    Returns:
+        (records, snapshots) written
+    """
+    path = Path(path)
+    with path.open("rb") as f:
+        records = list(iter_records(f))
+
+    if keep_backup:
+        shutil.copy2(path, path.with_name(path.name + ".bak"))
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    state: Dict[str, Any] = {}
+    snapshots = 0
+    with tmp_path.open("w", encoding="utf-8") as f:
+        for i, record in enumerate(records):
+            if interval <= 1 or i % interval == 0 or "positions" not in record:
+                stored = record
+                snapshots += 1
+            else:
+                stored = _encode_delta(record, state)
+            f.write(json.dumps(stored) + "\n")
+            state = dict(record.get("positions", state))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(records), snapshots
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Position ledger maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compact_parser = subparsers.add_parser("compact", help="Rewrite position.jsonl into snapshot + delta records")
+    compact_parser.add_argument("signature", help="Model signature")
+    compact_parser.add_argument("--log-path", default=None, help="Log path, defaults to LOG_PATH (./data/agent_data)")
+    compact_parser.add_argument(
+        "--interval",
+        type=int,
+        default=None,
+        help=f"Snapshot interval, defaults to POSITION_SNAPSHOT_INTERVAL or {DEFAULT_COMPACT_INTERVAL}; 1 expands to full records",
+    )
+    compact_parser.add_argument("--no-backup", action="store_true", help="Do not keep position.jsonl.bak")
+    args = parser.parse_args()
+
+    position_file = get_position_file(args.signature, args.log_path)
+    if not position_file.exists():
+        print(f"❌ Position file {position_file} does not exist")
+        sys.exit(1)
+    interval = args.interval if args.interval is not None else (get_snapshot_interval() or DEFAULT_COMPACT_INTERVAL)
+    size_before = position_file.stat().st_size
+    records, snapshots = compact_position_file(position_file, interval, keep_backup=not args.no_backup)
+    size_after = position_file.stat().st_size
+    print(f"✅ {position_file}: {records} records, {snapshots} snapshots, {size_before} -> {size_after} bytes")
@@ -0,0 +1,88 @@
+"""
+持仓锁管理
+One re-entrant lock per (log_path, signature) that serializes the read-validate-append
+sequence of trades and no-trade records. Callers in the same process wait on a threading
+lock; the flock on <log_path>/<signature>/.position.lock is only taken by the outermost
+holder, for safety across processes (agent, trade servers), and its file handle stays open
+between calls.
+"""
+
+import fcntl
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from tools.position_ledger import get_position_file
+
+
+class PositionLock:
+    """
+    Re-entrant lock of one signature's position file
+
+    Attributes:
+        lock_path: Lock file shared with other processes
+    """
+
+    def __init__(self, lock_path: Path):
+        self.lock_path = Path(lock_path)
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fh = None
+
+    def _handle(self):
+        # 锁文件被删除或替换后重新打开，否则其他进程锁的是新文件，互斥失效
+        try:
+            ino: Optional[int] = os.stat(self.lock_path).st_ino
+        except FileNotFoundError:
+            ino = None
+        if self._fh is not None and ino != os.fstat(self._fh.fileno()).st_ino:
+            self._fh.close()
+            self._fh = None
+        if self._fh is None:
+            self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = open(self.lock_path, "a+")
+        return self._fh
+
+    def __enter__(self) -> "PositionLock":
+        self._lock.acquire()
+        try:
+            if self._depth == 0:
+                fcntl.flock(self._handle().fileno(), fcntl.LOCK_EX)
+        except BaseException:
+            self._lock.release()
+            raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._depth -= 1
+        try:
+            if self._depth == 0 and self._fh is not None:
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._lock.release()
+
+
+_locks: Dict[Tuple[str, str], PositionLock] = {}
+_locks_lock = threading.Lock()
+
+
+def get_position_lock(signature: str, log_path: Optional[str] = None) -> PositionLock:
+    """
+    Get the process-wide lock of a signature under a log path
+
+    Args:
+        signature: Model name
+        log_path: Log directory, defaults to the LOG_PATH config value
+
+    Returns:
+        PositionLock on <log_path>/<signature>/.position.lock, usable as a context manager
+    """
+    signature_dir = get_position_file(signature, log_path).parent.parent
+    key = (str(signature_dir.parent), signature)
+    lock = _locks.get(key)
+    if lock is None:
+        with _locks_lock:
+            lock = _locks.setdefault(key, PositionLock(signature_dir / ".position.lock"))
+    return lock
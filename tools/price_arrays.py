@@ -0,0 +1,252 @@
+"""
+PriceArrays - 列式行情数组与 .npy 内存映射缓存
+Converts a market's merged.jsonl into dense float64 OHLCV arrays of shape [symbol, timestamp, field]
+plus a sorted int64 timestamp axis, and persists them as .npy files that other processes can
+memory-map and share through the page cache.
+"""
+
+import json
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 将项目根目录加入 Python 路径，便于从子目录直接运行本文件
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+from tools.price_store import (BAR_FIELDS, FileVersion, HotReloadCache,
+                               PriceStore, get_file_version, get_price_store)
+
+# Field axis order of the ohlcv array
+FIELDS = BAR_FIELDS
+
+CACHE_VERSION = 2
+
+
+def timestamp_to_int(ts: str) -> int:
+    """Convert "YYYY-MM-DD" or "YYYY-MM-DD HH:MM:SS" to int64 seconds since epoch (naive, no timezone)"""
+    return int(np.datetime64(ts.replace(" ", "T"), "s").astype(np.int64))
+
+
+def int_to_timestamp(value: int, intraday: bool) -> str:
+    """Inverse of timestamp_to_int, formatted the same way as merged.jsonl keys"""
+    text = str(np.datetime64(int(value), "s"))
+    return text.replace("T", " ") if intraday else text[:10]
+
+
+@contextmanager
+def _replacing(path: Path) -> Iterator[BinaryIO]:
+    """Write to a uniquely named temporary file next to path and move it over path with os.replace"""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def get_cache_dir(merged_path: Path) -> Path:
+    """Cache directory next to the merged file, e.g. data/merged.jsonl -> data/.merged.arrays/"""
+    merged_path = Path(merged_path)
+    return merged_path.parent / f".{merged_path.stem}.arrays"
+
+
+class PriceArrays:
+    """
+    Dense columnar view of one merged.jsonl file
+
+    Attributes:
+        symbols: Symbol axis, in merged.jsonl order
+        timestamps: Sorted int64 timestamp axis (seconds since epoch)
+        ohlcv: float64 array of shape [len(symbols), len(timestamps), len(FIELDS)], NaN where missing
+        intraday: True if the source series is intraday (timestamps carry a time part)
+        version: FileVersion of the merged.jsonl content the arrays were built from
+    """
+
+    def __init__(
+        self,
+        symbols: List[str],
+        timestamps: np.ndarray,
+        ohlcv: np.ndarray,
+        intraday: bool,
+        version: Optional[FileVersion] = None,
+    ):
+        self.symbols = list(symbols)
+        self.timestamps = timestamps
+        self.ohlcv = ohlcv
+        self.intraday = intraday
+        self.version = version
+        self.symbol_index: Dict[str, int] = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+    @classmethod
+    def from_merged_file(cls, merged_path: Path) -> "PriceArrays":
+        """Build the arrays from the PriceStore of merged_path"""
+        store = get_price_store(merged_path)
+        if store is None:
+            raise FileNotFoundError(f"Data file not found: {merged_path}")
+        if store.version != get_file_version(merged_path):
+            # 进程内的 PriceStore 仍是旧快照（后台重建中），直接解析新文件
+            store = PriceStore(merged_path)
+
+        symbols = list(store.bars.keys())
+        ts_strings = sorted(store.timestamps)
+        intraday = any(" " in ts for ts in ts_strings)
+        timestamps = np.array([timestamp_to_int(ts) for ts in ts_strings], dtype=np.int64)
+        ts_index = {ts: i for i, ts in enumerate(ts_strings)}
+
+        ohlcv = np.full((len(symbols), len(ts_strings), len(FIELDS)), np.nan, dtype=np.float64)
+        for i, symbol in enumerate(symbols):
+            for ts, bar in store.bars[symbol].items():
+                j = ts_index[ts]
+                for k, field in enumerate(FIELDS):
+                    value = getattr(bar, field)
+                    if value is not None:
+                        ohlcv[i, j, k] = value
+
+        return cls(symbols, timestamps, ohlcv, intraday, store.version)
+
+    def save(self, cache_dir: Path) -> None:
+        """Write the arrays as .npy files; meta.json is written last and marks the cache as complete"""
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        # 每个写入者使用独立的临时文件，并发重建同一缓存的进程不会互相覆盖写了一半的文件
+        for name, array in (("ohlcv", self.ohlcv), ("timestamps", self.timestamps)):
+            with _replacing(cache_dir / f"{name}.npy") as f:
+                np.save(f, np.ascontiguousarray(array))
+
+        meta = {
+            "version": CACHE_VERSION,
+            "source_version": list(self.version) if self.version else None,
+            "symbols": self.symbols,
+            "fields": list(FIELDS),
+            "intraday": self.intraday,
+        }
+        with _replacing(cache_dir / "meta.json") as f:
+            f.write(json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+
+    @classmethod
+    def load(cls, cache_dir: Path, source_version: FileVersion) -> Optional["PriceArrays"]:
+        """Memory-map a cache written by save(), or return None if it is missing or stale"""
+        meta_path = cache_dir / "meta.json"
+        if not meta_path.exists():
+            return None
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if (
+                meta.get("version") != CACHE_VERSION
+                or meta.get("source_version") != list(source_version)
+                or meta.get("fields") != list(FIELDS)
+            ):
+                return None
+            ohlcv = np.load(cache_dir / "ohlcv.npy", mmap_mode="r")
+            timestamps = np.load(cache_dir / "timestamps.npy", mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        return cls(meta["symbols"], timestamps, ohlcv, meta.get("intraday", False), source_version)
+
+    def field_indices(self, fields: Sequence[str]) -> List[int]:
+        try:
+            return [FIELDS.index(field) for field in fields]
+        except ValueError as exc:
+            raise ValueError(f"fields must be chosen from {FIELDS}, got {list(fields)}") from exc
+
+    def time_slice(self, start: Optional[str] = None, end: Optional[str] = None) -> slice:
+        """Index range of the timestamp axis covering [start, end] (both inclusive)"""
+        lo = 0 if start is None else int(np.searchsorted(self.timestamps, timestamp_to_int(start), side="left"))
+        if end is None:
+            hi = len(self.timestamps)
+        else:
+            end_value = timestamp_to_int(end)
+            # A date-only end bound covers every intraday bar of that day
+            if " " not in end:
+                end_value += 86400 - 1
+            hi = int(np.searchsorted(self.timestamps, end_value, side="right"))
+        return slice(lo, hi)
+
+    def window(
+        self,
+        symbols: Sequence[str],
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        fields: Sequence[str] = FIELDS,
+    ) -> Tuple[List[str], np.ndarray]:
+        """
+        Vectorized multi-symbol, multi-date read
+
+        Args:
+            symbols: Symbols to read; unknown symbols yield all-NaN rows
+            start: Inclusive lower bound, YYYY-MM-DD or YYYY-MM-DD HH:MM:SS, None for no bound
+            end: Inclusive upper bound, same formats as start
+            fields: Fields to read, subset of FIELDS
+
+        Returns:
+            (timestamps, values): timestamp strings of the window and a float64 array of shape
+            [len(symbols), len(timestamps), len(fields)]
+        """
+        time_range = self.time_slice(start, end)
+        field_idx = self.field_indices(fields)
+        ts_axis = [int_to_timestamp(value, self.intraday) for value in self.timestamps[time_range]]
+
+        values = np.full((len(symbols), len(ts_axis), len(field_idx)), np.nan, dtype=np.float64)
+        rows = [self.symbol_index.get(symbol, -1) for symbol in symbols]
+        known = [i for i, row in enumerate(rows) if row >= 0]
+        if known:
+            block = self.ohlcv[[rows[i] for i in known], time_range, :]
+            values[known] = block[:, :, field_idx]
+        return ts_axis, values
+
+
+def _load_or_build(merged_path: Path) -> PriceArrays:
+    """Memory-map the .npy cache if it matches merged_path, otherwise rebuild and rewrite it"""
+    cache_dir = get_cache_dir(merged_path)
+    source_version = get_file_version(merged_path)
+    arrays = PriceArrays.load(cache_dir, source_version) if source_version else None
+    if arrays is None:
+        arrays = PriceArrays.from_merged_file(merged_path)
+        try:
+            arrays.save(cache_dir)
+        except OSError as e:
+            print(f"⚠️  Warning: failed to write price array cache to {cache_dir}: {e}")
+    return arrays
+
+
+_arrays: HotReloadCache[PriceArrays] = HotReloadCache(_load_or_build, lambda arrays: arrays.version)
+
+
+def get_price_arrays(merged_path: Path) -> Optional[PriceArrays]:
+    """
+    Get the columnar arrays for a merged.jsonl file
+
+    Loads the memory-mapped .npy cache when it matches the source file's mtime, size and inode,
+    otherwise rebuilds the arrays and rewrites the cache. A rewritten source file is picked up
+    in the background like PriceStore.
+
+    Args:
+        merged_path: Path of the merged.jsonl file
+
+    Returns:
+        PriceArrays instance, or None if the file does not exist
+    """
+    return _arrays.get(merged_path)
+
+
+if __name__ == "__main__":
+    # 预先生成各市场的 .npy 缓存，例如在 merge 脚本之后运行：python tools/price_arrays.py
+    from tools.price_tools import get_merged_file_path
+
+    for market in ("us", "cn", "crypto"):
+        merged_file = get_merged_file_path(market)
+        arrays = get_price_arrays(merged_file)
+        if arrays is None:
+            print(f"⚠️  {merged_file} not found, skipping")
+            continue
+        print(f"✅ {market}: {arrays.ohlcv.shape} -> {get_cache_dir(merged_file)}")
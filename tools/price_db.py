@@ -0,0 +1,353 @@
+"""
+SQLite 行情数据库（可选后端）
+Loads the us / cn / crypto merged.jsonl files into one local SQLite file with a
+(market, symbol, ts) clustered primary key and REAL price columns. WAL mode lets the
+MCP server processes read concurrently while the loader writes.
+
+Enable it with PRICE_BACKEND=sqlite (in .env or the runtime config); the database path
+defaults to data/prices.db and can be overridden with PRICE_DB_PATH. Build or refresh it
+after running the merge scripts:
+
+    python tools/price_db.py            # all markets
+    python tools/price_db.py cn crypto  # selected markets
+"""
+
+import os
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+# 将项目根目录加入 Python 路径，便于从子目录直接运行本文件
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+from tools.general_tools import get_config_value
+from tools.price_store import (BAR_FIELDS, DAY_END, FileVersion, PriceBar,
+                               PriceStore, get_file_version)
+
+MARKETS = ("us", "cn", "crypto")
+
+# Price columns of the bars table
+COLUMNS = BAR_FIELDS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bars (
+    market TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    ts     TEXT NOT NULL,
+    open   REAL,
+    high   REAL,
+    low    REAL,
+    close  REAL,
+    volume REAL,
+    PRIMARY KEY (market, symbol, ts)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_bars_market_ts ON bars (market, ts);
+
+CREATE TABLE IF NOT EXISTS symbols (
+    market TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    name   TEXT NOT NULL DEFAULT '',
+    series TEXT NOT NULL,
+    PRIMARY KEY (market, symbol)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS sources (
+    market   TEXT PRIMARY KEY,
+    path     TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size     INTEGER NOT NULL,
+    ino      INTEGER NOT NULL
+);
+"""
+
+
+def get_price_db_path() -> Path:
+    """Database path from PRICE_DB_PATH, relative paths resolve from the project root"""
+    path = Path(get_config_value("PRICE_DB_PATH", "data/prices.db"))
+    if not path.is_absolute():
+        path = Path(project_root) / path
+    return path
+
+
+def connect(db_path: Optional[Path] = None, readonly: bool = False) -> sqlite3.Connection:
+    """Open the price database in WAL mode; read-only connections never create the file"""
+    db_path = Path(db_path) if db_path else get_price_db_path()
+    if readonly:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+    else:
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(db_path))
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+def _source_version(conn: sqlite3.Connection, market: str) -> Optional[FileVersion]:
+    row = conn.execute("SELECT mtime_ns, size, ino FROM sources WHERE market = ?", (market,)).fetchone()
+    return tuple(row) if row else None
+
+
+def load_market(conn: sqlite3.Connection, market: str, merged_path: Path, force: bool = False) -> int:
+    """
+    Replace one market's rows with the content of its merged.jsonl in a single transaction
+
+    Args:
+        conn: Writable connection from connect()
+        market: "us", "cn" or "crypto"
+        merged_path: merged.jsonl of that market
+        force: Reload even if the recorded source version matches the file
+
+    Returns:
+        Number of bars written, 0 if the database was already up to date
+    """
+    if not force and _source_version(conn, market) == get_file_version(merged_path):
+        return 0
+
+    store = PriceStore(merged_path)
+
+    def rows() -> Iterable[Tuple[Any, ...]]:
+        for symbol, series in store.bars.items():
+            for ts, bar in series.items():
+                yield (market, symbol, ts, bar.open, bar.high, bar.low, bar.close, bar.volume)
+
+    with conn:
+        conn.execute("DELETE FROM bars WHERE market = ?", (market,))
+        conn.execute("DELETE FROM symbols WHERE market = ?", (market,))
+        cursor = conn.executemany(
+            "INSERT INTO bars (market, symbol, ts, open, high, low, close, volume) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows(),
+        )
+        written = cursor.rowcount
+        conn.executemany(
+            "INSERT INTO symbols (market, symbol, name, series) VALUES (?, ?, ?, ?)",
+            [
+                (market, symbol, store.names.get(symbol, ""), store.series_keys.get(symbol, ""))
+                for symbol in store.bars
+            ],
+        )
+        mtime_ns, size, ino = store.version
+        conn.execute(
+            "INSERT OR REPLACE INTO sources (market, path, mtime_ns, size, ino) VALUES (?, ?, ?, ?, ?)",
+            (market, str(merged_path), mtime_ns, size, ino),
+        )
+    return written
+
+
+def build_price_db(
+    markets: Sequence[str] = MARKETS, db_path: Optional[Path] = None, force: bool = False
+) -> Dict[str, int]:
+    """
+    Load the merged.jsonl of each market into the price database
+
+    Args:
+        markets: Markets to load, any of "us", "cn", "crypto"
+        db_path: Database file, defaults to get_price_db_path()
+        force: Reload markets whose merged.jsonl has not changed since the last load
+
+    Returns:
+        {market: bars written}; markets without a merged file are skipped
+    """
+    from tools.price_tools import get_merged_file_path
+
+    results: Dict[str, int] = {}
+    conn = connect(db_path)
+    try:
+        for market in markets:
+            merged_file = get_merged_file_path(market)
+            if not merged_file.exists():
+                print(f"⚠️  {merged_file} not found, skipping {market}")
+                continue
+            results[market] = load_market(conn, market, merged_file, force=force)
+        conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
+    return results
+
+
+class SqlitePriceStore:
+    """
+    Read-only view of one market in the price database, with the same lookup
+    interface as PriceStore (get_bar, has_symbol, is_trading_day, previous_timestamp,
+    next_timestamp, names, daily_dates) plus a PriceArrays-style window()
+
+    Every call is an indexed query, so rows written by a concurrent reload are
+    visible immediately. Connections are kept per thread.
+    """
+
+    def __init__(self, market: str, db_path: Optional[Path] = None):
+        self.market = market
+        self.path = Path(db_path) if db_path else get_price_db_path()
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.path, readonly=True)
+            self._local.conn = conn
+        return conn
+
+    @property
+    def version(self) -> Optional[FileVersion]:
+        """Version of the merged.jsonl this market was last loaded from"""
+        return _source_version(self._conn(), self.market)
+
+    @property
+    def names(self) -> Dict[str, str]:
+        rows = self._conn().execute(
+            "SELECT symbol, name FROM symbols WHERE market = ? AND name != ''", (self.market,)
+        )
+        return dict(rows.fetchall())
+
+    @property
+    def daily_dates(self) -> Set[str]:
+        rows = self._conn().execute(
+            "SELECT DISTINCT b.ts FROM bars b JOIN symbols s ON s.market = b.market AND s.symbol = b.symbol "
+            "WHERE b.market = ? AND s.series = 'Time Series (Daily)'",
+            (self.market,),
+        )
+        return {ts for (ts,) in rows}
+
+    def get_bar(self, symbol: str, timestamp: str) -> Optional[PriceBar]:
+        """Return the bar of symbol at timestamp, or None if missing"""
+        row = self._conn().execute(
+            "SELECT open, high, low, close, volume FROM bars WHERE market = ? AND symbol = ? AND ts = ?",
+            (self.market, symbol, timestamp),
+        ).fetchone()
+        return PriceBar(*row) if row is not None else None
+
+    def has_symbol(self, symbol: str) -> bool:
+        row = self._conn().execute(
+            "SELECT 1 FROM symbols WHERE market = ? AND symbol = ?", (self.market, symbol)
+        ).fetchone()
+        return row is not None
+
+    def is_trading_day(self, date: str) -> bool:
+        row = self._conn().execute(
+            "SELECT 1 FROM bars WHERE market = ? AND ts >= ? AND ts < ? LIMIT 1",
+            (self.market, date, date + DAY_END),
+        ).fetchone()
+        return row is not None
+
+    def previous_timestamp(self, timestamp: str) -> Optional[str]:
+        """Same semantics as PriceStore.previous_timestamp"""
+        if " " in timestamp:
+            sql = "SELECT MAX(ts) FROM bars WHERE market = ? AND ts < ? AND instr(ts, ' ') > 0"
+            (ts,) = self._conn().execute(sql, (self.market, timestamp)).fetchone()
+            return ts
+        (ts,) = self._conn().execute(
+            "SELECT MAX(ts) FROM bars WHERE market = ? AND ts < ?", (self.market, timestamp)
+        ).fetchone()
+        return ts[:10] if ts else None
+
+    def next_timestamp(self, timestamp: str) -> Optional[str]:
+        """Same semantics as PriceStore.next_timestamp"""
+        if " " in timestamp:
+            sql = "SELECT MIN(ts) FROM bars WHERE market = ? AND ts > ? AND instr(ts, ' ') > 0"
+            (ts,) = self._conn().execute(sql, (self.market, timestamp)).fetchone()
+            return ts
+        (ts,) = self._conn().execute(
+            "SELECT MIN(ts) FROM bars WHERE market = ? AND ts >= ?", (self.market, timestamp + DAY_END)
+        ).fetchone()
+        return ts[:10] if ts else None
+
+    def calendar_between(self, start: str, end: str, include_start: bool = False) -> List[str]:
+        """Same semantics as PriceStore.calendar_between"""
+        conn = self._conn()
+        if " " in start:
+            op = ">=" if include_start else ">"
+            rows = conn.execute(
+                f"SELECT DISTINCT ts FROM bars WHERE market = ? AND ts {op} ? AND ts <= ? "
+                "AND instr(ts, ' ') > 0 ORDER BY ts",
+                (self.market, start, end),
+            )
+            return [ts for (ts,) in rows]
+        lo = start if include_start else start + DAY_END
+        rows = conn.execute(
+            "SELECT DISTINCT substr(ts, 1, 10) AS day FROM bars WHERE market = ? AND ts >= ? AND ts < ? ORDER BY day",
+            (self.market, lo, end + DAY_END),
+        )
+        return [day for (day,) in rows]
+
+    def window(
+        self,
+        symbols: Sequence[str],
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        fields: Sequence[str] = COLUMNS,
+    ) -> Tuple[List[str], np.ndarray]:
+        """
+        Indexed range scan with the same contract as PriceArrays.window
+
+        Returns:
+            (timestamps, values): every timestamp of the market within [start, end] and a float64
+            array of shape [len(symbols), len(timestamps), len(fields)], NaN where missing
+        """
+        unknown = [field for field in fields if field not in COLUMNS]
+        if unknown:
+            raise ValueError(f"fields must be chosen from {COLUMNS}, got {list(fields)}")
+
+        lo = start or ""
+        hi = (end + DAY_END) if end and " " not in end else end
+        bounds = "ts >= ?" + (" AND ts <= ?" if hi else "")
+        params: List[Any] = [self.market, lo] + ([hi] if hi else [])
+
+        conn = self._conn()
+        ts_axis = [ts for (ts,) in conn.execute(
+            f"SELECT DISTINCT ts FROM bars WHERE market = ? AND {bounds} ORDER BY ts", params
+        )]
+        ts_index = {ts: i for i, ts in enumerate(ts_axis)}
+        values = np.full((len(symbols), len(ts_axis), len(fields)), np.nan, dtype=np.float64)
+
+        columns = ", ".join(fields)
+        for i, symbol in enumerate(symbols):
+            rows = conn.execute(
+                f"SELECT ts, {columns} FROM bars WHERE market = ? AND symbol = ? AND {bounds}",
+                [self.market, symbol] + params[1:],
+            )
+            for ts, *row in rows:
+                values[i, ts_index[ts]] = [np.nan if value is None else value for value in row]
+        return ts_axis, values
+
+
+_sqlite_stores: Dict[Tuple[str, str], SqlitePriceStore] = {}
+_sqlite_stores_lock = threading.Lock()
+
+
+def get_sqlite_price_store(market: str, db_path: Optional[Path] = None) -> Optional[SqlitePriceStore]:
+    """
+    Get the process-wide SqlitePriceStore of a market
+
+    Args:
+        market: "us", "cn" or "crypto"
+        db_path: Database file, defaults to get_price_db_path()
+
+    Returns:
+        SqlitePriceStore instance, or None if the database has not been built
+    """
+    db_path = Path(db_path) if db_path else get_price_db_path()
+    if not db_path.exists():
+        return None
+    key = (str(db_path.resolve()), market)
+    store = _sqlite_stores.get(key)
+    if store is None:
+        with _sqlite_stores_lock:
+            store = _sqlite_stores.setdefault(key, SqlitePriceStore(market, db_path))
+    return store
+
+
+if __name__ == "__main__":
+    markets = sys.argv[1:] or list(MARKETS)
+    db_path = get_price_db_path()
+    for market, written in build_price_db(markets, db_path).items():
+        if written:
+            print(f"✅ {market}: {written} bars -> {db_path}")
+        else:
+            print(f"✅ {market}: already up to date in {db_path}")
@@ -0,0 +1,261 @@
+"""
+Parquet 行情导出与读取（可选后端）
+Exports each market's merged.jsonl to a hive-partitioned Parquet dataset
+(<root>/market=<market>/symbol=<symbol>/*.parquet) with a timestamp column and float64
+OHLCV columns, for notebooks and for price_tools.get_price_matrix. Reads push the symbol
+and date-range predicates down to partition pruning and row-group statistics.
+
+Requires pyarrow (optional, imported lazily). Enable the reader with PRICE_BACKEND=parquet;
+the dataset root defaults to data/parquet and can be overridden with PRICE_PARQUET_PATH.
+Export or refresh it after running the merge scripts:
+
+    python tools/price_parquet.py            # all markets
+    python tools/price_parquet.py us         # selected markets
+"""
+
+import json
+import os
+import shutil
+import sys
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 将项目根目录加入 Python 路径，便于从子目录直接运行本文件
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+from tools.general_tools import get_config_value
+from tools.price_arrays import FIELDS, PriceArrays, int_to_timestamp
+from tools.price_store import (DAY_END, FileVersion, HotReloadCache,
+                               get_file_version)
+
+MARKETS = ("us", "cn", "crypto")
+
+# Written last into each market directory; holds the source version and the timestamp axis
+META_FILE = "_meta.json"
+
+
+def get_parquet_root() -> Path:
+    """Dataset root from PRICE_PARQUET_PATH, relative paths resolve from the project root"""
+    path = Path(get_config_value("PRICE_PARQUET_PATH", "data/parquet"))
+    if not path.is_absolute():
+        path = Path(project_root) / path
+    return path
+
+
+def get_market_dir(market: str, root: Optional[Path] = None) -> Path:
+    return (Path(root) if root else get_parquet_root()) / f"market={market}"
+
+
+def _read_meta(market_dir: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(market_dir / META_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def export_market(market: str, merged_path: Path, root: Optional[Path] = None, force: bool = False) -> int:
+    """
+    Export one market's merged.jsonl to <root>/market=<market>/symbol=<symbol>/
+
+    The new partition tree is written next to the old one and swapped in with a rename,
+    so readers never see a half-written market.
+
+    Args:
+        market: "us", "cn" or "crypto"
+        merged_path: merged.jsonl of that market
+        root: Dataset root, defaults to get_parquet_root()
+        force: Export even if the recorded source version matches the file
+
+    Returns:
+        Number of bars written, 0 if the export was already up to date
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    market_dir = get_market_dir(market, root)
+    meta = _read_meta(market_dir)
+    if not force and meta and meta.get("source_version") == list(get_file_version(merged_path) or ()):
+        return 0
+
+    arrays = PriceArrays.from_merged_file(merged_path)
+    # 每个标的只保留至少有一个字段的行
+    present = ~np.isnan(arrays.ohlcv).all(axis=2)
+    sym_idx, ts_idx = np.nonzero(present)
+
+    columns: Dict[str, Any] = {
+        "symbol": pa.array([arrays.symbols[i] for i in sym_idx], type=pa.string()),
+        "ts": pa.array(arrays.timestamps[ts_idx], type=pa.timestamp("s")),
+    }
+    for k, field in enumerate(FIELDS):
+        columns[field] = pa.array(arrays.ohlcv[sym_idx, ts_idx, k], type=pa.float64(), from_pandas=True)
+    table = pa.table(columns)
+
+    tmp_dir = market_dir.with_name(market_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    ds.write_dataset(
+        table,
+        tmp_dir,
+        format="parquet",
+        partitioning=ds.partitioning(pa.schema([("symbol", pa.string())]), flavor="hive"),
+        basename_template="part-{i}.parquet",
+    )
+
+    meta = {
+        "source_version": list(arrays.version) if arrays.version else None,
+        "symbols": arrays.symbols,
+        "intraday": arrays.intraday,
+        "timestamps": [int_to_timestamp(value, arrays.intraday) for value in arrays.timestamps],
+    }
+    with open(tmp_dir / META_FILE, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    old_dir = market_dir.with_name(market_dir.name + ".old")
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if market_dir.exists():
+        os.replace(market_dir, old_dir)
+    os.replace(tmp_dir, market_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return table.num_rows
+
+
+def export_parquet(
+    markets: Sequence[str] = MARKETS, root: Optional[Path] = None, force: bool = False
+) -> Dict[str, int]:
+    """
+    Export the merged.jsonl of each market to the Parquet dataset
+
+    Args:
+        markets: Markets to export, any of "us", "cn", "crypto"
+        root: Dataset root, defaults to get_parquet_root()
+        force: Export markets whose merged.jsonl has not changed since the last export
+
+    Returns:
+        {market: bars written}; markets without a merged file are skipped
+    """
+    from tools.price_tools import get_merged_file_path
+
+    results: Dict[str, int] = {}
+    for market in markets:
+        merged_file = get_merged_file_path(market)
+        if not merged_file.exists():
+            print(f"⚠️  {merged_file} not found, skipping {market}")
+            continue
+        results[market] = export_market(market, merged_file, root, force=force)
+    return results
+
+
+class ParquetPriceSource:
+    """
+    Reader over one market directory of the Parquet dataset, with the same window()
+    contract as PriceArrays and SqlitePriceStore
+
+    Attributes:
+        path: market=<market> directory
+        timestamps: Sorted timestamp strings of the market, from the export metadata
+        intraday: True if timestamps carry a time part
+        version: FileVersion of the metadata file, changes on every export
+    """
+
+    def __init__(self, market_dir: Path):
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        self.path = Path(market_dir)
+        self.version: Optional[FileVersion] = get_file_version(self.path / META_FILE)
+        meta = _read_meta(self.path)
+        if meta is None:
+            raise FileNotFoundError(f"Parquet export metadata not found in {self.path}")
+        self.timestamps: List[str] = meta["timestamps"]
+        self.intraday: bool = meta.get("intraday", False)
+        self.dataset = ds.dataset(
+            self.path,
+            format="parquet",
+            partitioning=ds.partitioning(pa.schema([("symbol", pa.string())]), flavor="hive"),
+        )
+
+    def window(
+        self,
+        symbols: Sequence[str],
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        fields: Sequence[str] = FIELDS,
+    ) -> Tuple[List[str], np.ndarray]:
+        """
+        Read symbols x [start, end] x fields with symbol and date predicates pushed down
+
+        Returns:
+            (timestamps, values): every timestamp of the market within [start, end] and a float64
+            array of shape [len(symbols), len(timestamps), len(fields)], NaN where missing
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+
+        unknown = [field for field in fields if field not in FIELDS]
+        if unknown:
+            raise ValueError(f"fields must be chosen from {FIELDS}, got {list(fields)}")
+
+        lo = 0 if start is None else bisect_left(self.timestamps, start)
+        if end is None:
+            hi = len(self.timestamps)
+        else:
+            hi = bisect_right(self.timestamps, end if " " in end else end + DAY_END)
+        ts_axis = self.timestamps[lo:hi]
+        values = np.full((len(symbols), len(ts_axis), len(fields)), np.nan, dtype=np.float64)
+        if not ts_axis or not symbols:
+            return ts_axis, values
+
+        ts_type = pa.timestamp("s")
+        first = pa.scalar(np.datetime64(ts_axis[0].replace(" ", "T"), "s"), type=ts_type)
+        last = pa.scalar(np.datetime64(ts_axis[-1].replace(" ", "T"), "s"), type=ts_type)
+        predicate = ds.field("symbol").isin(list(symbols)) & (ds.field("ts") >= first) & (ds.field("ts") <= last)
+        table = self.dataset.to_table(columns=["symbol", "ts", *fields], filter=predicate)
+        if table.num_rows == 0:
+            return ts_axis, values
+
+        axis = np.array([np.datetime64(ts.replace(" ", "T"), "s") for ts in ts_axis])
+        ts = table["ts"].to_numpy()
+        cols = np.searchsorted(axis, ts)
+        # 重新导出后分区文件可能比读取到的时间轴新，不在轴上的行直接丢弃
+        on_axis = cols < len(axis)
+        on_axis[on_axis] = axis[cols[on_axis]] == ts[on_axis]
+        row_of = {symbol: i for i, symbol in enumerate(symbols)}
+        rows = np.array([row_of[symbol] for symbol in pc.cast(table["symbol"], pa.string()).to_pylist()], dtype=np.intp)
+        for k, field in enumerate(fields):
+            column = table[field].to_numpy(zero_copy_only=False)
+            values[rows[on_axis], cols[on_axis], k] = column[on_axis]
+        return ts_axis, values
+
+
+_sources: HotReloadCache[ParquetPriceSource] = HotReloadCache(
+    lambda meta_path: ParquetPriceSource(Path(meta_path).parent), lambda source: source.version
+)
+
+
+def get_parquet_source(market: str, root: Optional[Path] = None) -> Optional[ParquetPriceSource]:
+    """
+    Get the process-wide Parquet reader of a market, reopened when the market is re-exported
+
+    Args:
+        market: "us", "cn" or "crypto"
+        root: Dataset root, defaults to get_parquet_root()
+
+    Returns:
+        ParquetPriceSource instance, or None if the market has not been exported
+    """
+    return _sources.get(get_market_dir(market, root) / META_FILE)
+
+
+if __name__ == "__main__":
+    markets = sys.argv[1:] or list(MARKETS)
+    root = get_parquet_root()
+    for market, written in export_parquet(markets, root).items():
+        if written:
+            print(f"✅ {market}: {written} bars -> {get_market_dir(market, root)}")
+        else:
+            print(f"✅ {market}: already up to date in {get_market_dir(market, root)}")
@@ -0,0 +1,307 @@
+"""
+PriceStore - 进程级行情索引缓存
+Parses each market's merged.jsonl once and keeps a symbol -> timestamp -> bar index in memory,
+so price lookups no longer re-read and re-parse the whole file on every tool call.
+
+The cache is stat-aware: when the nightly merge scripts replace a merged file, a new index is
+built in a background thread and swapped in, while callers keep using the previous snapshot.
+"""
+
+import json
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from typing import Any, Callable, Dict, Generic, List, Optional, Set, Tuple, TypeVar
+
+# (st_mtime_ns, st_size, st_ino) of a data file, used to detect rewrites
+FileVersion = Tuple[int, int, int]
+
+# Sorts after any "YYYY-MM-DD HH:MM:SS" suffix, so a date-only upper bound (date + DAY_END)
+# covers the whole day in string comparisons of timestamps
+DAY_END = "\uffff"
+
+
+def stat_version(stat_result: os.stat_result) -> FileVersion:
+    return (stat_result.st_mtime_ns, stat_result.st_size, stat_result.st_ino)
+
+
+def get_file_version(path: Path) -> Optional[FileVersion]:
+    """Cheap change detection for a data file, None if it does not exist"""
+    try:
+        return stat_version(os.stat(path))
+    except FileNotFoundError:
+        return None
+
+
+# Bar fields, and the merged.jsonl key each field is parsed from
+BAR_FIELDS = ("open", "high", "low", "close", "volume")
+BAR_KEYS = {
+    "open": "1. buy price",
+    "high": "2. high",
+    "low": "3. low",
+    "close": "4. sell price",
+    "volume": "5. volume",
+}
+
+
+def _parse_price(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class PriceBar:
+    """
+    One OHLCV bar with prices parsed to float once at load time
+
+    open is the "1. buy price" and close the "4. sell price" of merged.jsonl; a field that
+    is missing or not a number is None.
+    """
+
+    __slots__ = BAR_FIELDS
+
+    def __init__(
+        self,
+        open: Optional[float] = None,
+        high: Optional[float] = None,
+        low: Optional[float] = None,
+        close: Optional[float] = None,
+        volume: Optional[float] = None,
+    ):
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    @classmethod
+    def from_raw(cls, raw: Dict[str, Any]) -> "PriceBar":
+        """Parse an Alpha Vantage-style bar dict with string values"""
+        return cls(*(_parse_price(raw.get(BAR_KEYS[field])) for field in BAR_FIELDS))
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{field}={getattr(self, field)}" for field in BAR_FIELDS)
+        return f"PriceBar({values})"
+
+
+class PriceStore:
+    """
+    In-memory index over one merged.jsonl file
+
+    Attributes:
+        path: Path of the merged.jsonl file this store was built from
+        bars: {symbol: {timestamp: PriceBar}}
+        names: {symbol: name}, only for symbols whose Meta Data carries "2.1. Name"
+        series_keys: {symbol: "Time Series (...)"} key the symbol's bars were read from
+        timestamps: All timestamps found in any symbol's time series
+        daily_dates: All dates found in "Time Series (Daily)" series
+        trading_days: All dates (YYYY-MM-DD) that have at least one bar
+        calendar_dates: Sorted trading days, daily granularity
+        calendar_times: Sorted intraday timestamps (YYYY-MM-DD HH:MM:SS), 60-minute granularity
+        version: FileVersion of the file content this store was parsed from
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.bars: Dict[str, Dict[str, PriceBar]] = {}
+        self.names: Dict[str, str] = {}
+        self.series_keys: Dict[str, str] = {}
+        self.timestamps: Set[str] = set()
+        self.daily_dates: Set[str] = set()
+        self.trading_days: Set[str] = set()
+        self.calendar_dates: List[str] = []
+        self.calendar_times: List[str] = []
+        self.version: Optional[FileVersion] = None
+        self._load()
+
+    def _load(self) -> None:
+        """Parse merged.jsonl line by line and build the indexes"""
+        with self.path.open("r", encoding="utf-8") as f:
+            # 记录实际读取的文件版本（文件可能在打开之后被替换）
+            self.version = stat_version(os.fstat(f.fileno()))
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    doc = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if not isinstance(doc, dict):
+                    continue
+
+                meta = doc.get("Meta Data", {})
+                symbol = meta.get("2. Symbol")
+                name = meta.get("2.1. Name", "")
+                if symbol and name:
+                    self.names[symbol] = name
+
+                # 查找第一个以 "Time Series" 开头的键（日线或小时线）
+                series = None
+                series_key = None
+                for key, value in doc.items():
+                    if key.startswith("Time Series"):
+                        series, series_key = value, key
+                        break
+                if not isinstance(series, dict):
+                    continue
+
+                if symbol:
+                    self.bars[symbol] = {
+                        ts: PriceBar.from_raw(bar) for ts, bar in series.items() if isinstance(bar, dict)
+                    }
+                    self.series_keys[symbol] = series_key
+                self.timestamps.update(series.keys())
+                self.daily_dates.update(doc.get("Time Series (Daily)", {}).keys())
+
+        self.trading_days = {ts[:10] for ts in self.timestamps}
+        # ISO 格式的时间字符串按字典序排序即为时间顺序，可直接二分查找
+        self.calendar_dates = sorted(self.trading_days)
+        self.calendar_times = sorted(ts for ts in self.timestamps if " " in ts)
+
+    def get_bar(self, symbol: str, timestamp: str) -> Optional[PriceBar]:
+        """Return the bar of symbol at timestamp, or None if missing"""
+        return self.bars.get(symbol, {}).get(timestamp)
+
+    def has_symbol(self, symbol: str) -> bool:
+        return symbol in self.bars
+
+    def is_trading_day(self, date: str) -> bool:
+        """True if date is a daily timestamp or the date part of any intraday timestamp"""
+        return date in self.timestamps or date in self.trading_days
+
+    def _calendar_for(self, timestamp: str) -> List[str]:
+        return self.calendar_times if " " in timestamp else self.calendar_dates
+
+    def previous_timestamp(self, timestamp: str) -> Optional[str]:
+        """
+        Latest calendar entry strictly before timestamp
+
+        Args:
+            timestamp: "YYYY-MM-DD" searches the daily calendar, "YYYY-MM-DD HH:MM:SS" the intraday one
+
+        Returns:
+            Previous trading day / bar time in the same format, or None if there is none
+        """
+        calendar = self._calendar_for(timestamp)
+        i = bisect_left(calendar, timestamp)
+        return calendar[i - 1] if i > 0 else None
+
+    def next_timestamp(self, timestamp: str) -> Optional[str]:
+        """Earliest calendar entry strictly after timestamp, same format rules as previous_timestamp"""
+        calendar = self._calendar_for(timestamp)
+        i = bisect_right(calendar, timestamp)
+        return calendar[i] if i < len(calendar) else None
+
+    def calendar_between(self, start: str, end: str, include_start: bool = False) -> List[str]:
+        """
+        Slice of the calendar between start and end
+
+        Args:
+            start: Lower bound; its format selects the daily or intraday calendar like previous_timestamp
+            end: Inclusive upper bound, same format as start
+            include_start: Include an entry equal to start (default: strictly after start)
+
+        Returns:
+            Sorted trading days / bar times in the same format as start
+        """
+        calendar = self._calendar_for(start)
+        lo = bisect_left(calendar, start) if include_start else bisect_right(calendar, start)
+        hi = bisect_right(calendar, end)
+        return calendar[lo:hi]
+
+
+T = TypeVar("T")
+
+
+class HotReloadCache(Generic[T]):
+    """
+    Per-file cache that follows rewrites of the underlying file
+
+    Every lookup stats the file. The first build is synchronous; when the file's
+    (mtime, size, inode) later changes, a rebuild runs in a background thread and the
+    new value is swapped in atomically once complete. Until then callers keep getting
+    the previous value, so a call that already holds a snapshot never sees a mix of
+    old and new data.
+    """
+
+    def __init__(self, builder: Callable[[Path], T], version_of: Callable[[T], Optional[FileVersion]]):
+        """
+        Args:
+            builder: Builds the cached value from a file path
+            version_of: Returns the FileVersion a built value was read from
+        """
+        self._builder = builder
+        self._version_of = version_of
+        self._entries: Dict[str, T] = {}
+        self._rebuilding: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def get(self, path: Path) -> Optional[T]:
+        """Current value for path, or None if the file does not exist"""
+        path = Path(path).resolve()
+        version = get_file_version(path)
+        if version is None:
+            return None
+
+        key = str(path)
+        value = self._entries.get(key)
+        if value is None:
+            with self._lock:
+                value = self._entries.get(key)
+                if value is None:
+                    value = self._builder(path)
+                    self._entries[key] = value
+            return value
+
+        if self._version_of(value) != version:
+            self._schedule_rebuild(key, path)
+        return value
+
+    def _schedule_rebuild(self, key: str, path: Path) -> None:
+        with self._lock:
+            if key in self._rebuilding:
+                return
+            self._rebuilding.add(key)
+        thread = threading.Thread(target=self._rebuild, args=(key, path), name=f"reload-{path.name}", daemon=True)
+        thread.start()
+
+    def _rebuild(self, key: str, path: Path) -> None:
+        try:
+            value = self._builder(path)
+            self._entries[key] = value
+            print(f"🔄 Reloaded {path} (version {self._version_of(value)})")
+        except Exception as e:
+            print(f"⚠️  Warning: failed to reload {path}, keeping previous data: {e}")
+        finally:
+            with self._lock:
+                self._rebuilding.discard(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_stores: HotReloadCache[PriceStore] = HotReloadCache(PriceStore, lambda store: store.version)
+
+
+def get_price_store(path: Path) -> Optional[PriceStore]:
+    """
+    Get the process-wide PriceStore for a merged.jsonl file
+
+    Built on first use; if the file has been rewritten since, the previous store is returned
+    while a fresh one is built in the background.
+
+    Args:
+        path: Path of the merged.jsonl file
+
+    Returns:
+        PriceStore instance, or None if the file does not exist
+    """
+    return _stores.get(path)
+
+
+def clear_price_stores() -> None:
+    """Drop all cached stores, the next lookup re-parses the merged files"""
+    _stores.clear()
@@ -14,6 +14,9 @@ project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 from tools.general_tools import get_config_value
+from tools.position_ledger import (format_positions, get_position_file,
+                                   open_position_ledger, to_dense)
+from tools.price_store import get_price_store
 
 
 def get_market_type() -> str:
@@ -218,6 +221,31 @@ def get_merged_file_path(market: str = "us") -> Path:
         return base_dir / "data" / "merged.jsonl"
 
 
+def get_market_store(market: str = "us", merged_path: Optional[str] = None):
+    """按 PRICE_BACKEND 配置获取行情存储。
+
+    Args:
+        market: 市场类型，"us" 为美股，"cn" 为A股，"crypto" 为加密货币
+        merged_path: 可选，自定义 merged.jsonl 路径；指定时总是直接读取该文件。
+
+    Returns:
+        PRICE_BACKEND=sqlite 时为 SqlitePriceStore（见 tools/price_db.py），否则为 merged.jsonl 的 PriceStore；
+        数据不存在时返回 None。两者提供相同的查询接口。
+    """
+    if merged_path is not None:
+        return get_price_store(Path(merged_path))
+
+    if get_config_value("PRICE_BACKEND", "jsonl") == "sqlite":
+        from tools.price_db import get_sqlite_price_store
+
+        store = get_sqlite_price_store(market)
+        if store is not None:
+            return store
+        print("⚠️  Warning: PRICE_BACKEND=sqlite but the price database has not been built, using merged.jsonl")
+
+    return get_price_store(get_merged_file_path(market))
+
+
 def is_trading_day(date: str, market: str = "us") -> bool:
     """Check if a given date is a trading day by looking up merged.jsonl.
 
@@ -256,36 +284,19 @@ def is_trading_day(date: str, market: str = "us") -> bool:
 
     merged_file_path = get_merged_file_path(market)
 
-    if not merged_file_path.exists():
-        print(f"⚠️  Warning: {merged_file_path} not found, cannot validate trading day")
-        return False
-
     try:
-        with open(merged_file_path, "r", encoding="utf-8") as f:
-            # Read first line to check if date exists
-            for line in f:
-                try:
-                    data = json.loads(line.strip())
-                    # Check for daily time series first
-                    time_series = data.get("Time Series (Daily)", {})
-                    if date in time_series:
-                        return True
-
-                    # If no daily data, check for hourly data (e.g., "Time Series (60min)")
-                    for key, value in data.items():
-                        if key.startswith("Time Series") and isinstance(value, dict):
-                            # Check if any hourly timestamp starts with the date
-                            for timestamp in value.keys():
-                                if timestamp.startswith(date):
-                                    return True
-                except json.JSONDecodeError:
-                    continue
-            # If we get here, checked all stocks and date was not found in any
-            return False
+        store = get_market_store(market)
     except Exception as e:
         print(f"⚠️  Error checking trading day: {e}")
         return False
 
+    if store is None:
+        print(f"⚠️  Warning: {merged_file_path} not found, cannot validate trading day")
+        return False
+
+    # Daily dates match directly; hourly timestamps match by their date part
+    return store.is_trading_day(date)
+
 
 def get_all_trading_days(market: str = "us") -> List[str]:
     """Get all available trading days from merged.jsonl.
@@ -298,26 +309,52 @@ def get_all_trading_days(market: str = "us") -> List[str]:
     """
     merged_file_path = get_merged_file_path(market)
 
-    if not merged_file_path.exists():
+    try:
+        store = get_market_store(market)
+    except Exception as e:
+        print(f"⚠️  Error reading trading days: {e}")
+        return []
+
+    if store is None:
         print(f"⚠️  Warning: {merged_file_path} not found")
         return []
 
-    trading_days = set()
+    return sorted(store.daily_dates)
+
+
+def get_trading_dates_between(
+    start_date: str, end_date: str, market: str = "us", include_start: bool = False
+) -> List[str]:
+    """从预先计算好的交易日历中切片出区间内的交易日，替代逐日调用 is_trading_day。
+
+    Args:
+        start_date: 起始日期，格式 YYYY-MM-DD（日线日历）或 YYYY-MM-DD HH:MM:SS（小时线日历）
+        end_date: 结束日期（含），格式同 start_date
+        market: 市场类型，"us" 为美股，"cn" 为A股，"crypto" 为加密货币
+        include_start: 是否包含 start_date 本身，默认只返回严格晚于 start_date 的交易日
+
+    Returns:
+        排好序的交易日列表。加密货币按每天交易处理，截止到今天（与 is_trading_day 一致）。
+    """
+    if market == "crypto":
+        start_day = datetime.strptime(start_date[:10], "%Y-%m-%d").date()
+        last_day = min(datetime.strptime(end_date[:10], "%Y-%m-%d").date(), datetime.now().date())
+        if not include_start:
+            start_day += timedelta(days=1)
+        return [(start_day + timedelta(days=i)).strftime("%Y-%m-%d") for i in range((last_day - start_day).days + 1)]
+
     try:
-        with open(merged_file_path, "r", encoding="utf-8") as f:
-            for line in f:
-                try:
-                    data = json.loads(line.strip())
-                    time_series = data.get("Time Series (Daily)", {})
-                    # Add all dates from this stock's time series
-                    trading_days.update(time_series.keys())
-                except json.JSONDecodeError:
-                    continue
-        return sorted(list(trading_days))
+        store = get_market_store(market)
     except Exception as e:
         print(f"⚠️  Error reading trading days: {e}")
         return []
 
+    if store is None:
+        print(f"⚠️  Warning: {get_merged_file_path(market)} not found")
+        return []
+
+    return store.calendar_between(start_date, end_date, include_start=include_start)
+
 
 def get_stock_name_mapping(market: str = "us") -> Dict[str, str]:
     """Get mapping from stock symbols to names.
@@ -330,27 +367,17 @@ def get_stock_name_mapping(market: str = "us") -> Dict[str, str]:
     """
     merged_file_path = get_merged_file_path(market)
 
-    if not merged_file_path.exists():
-        return {}
-
-    name_map = {}
     try:
-        with open(merged_file_path, "r", encoding="utf-8") as f:
-            for line in f:
-                try:
-                    data = json.loads(line.strip())
-                    meta = data.get("Meta Data", {})
-                    symbol = meta.get("2. Symbol")
-                    name = meta.get("2.1. Name", "")
-                    if symbol and name:
-                        name_map[symbol] = name
-                except json.JSONDecodeError:
-                    continue
-        return name_map
+        store = get_market_store(market)
     except Exception as e:
         print(f"⚠️  Error reading stock names: {e}")
         return {}
 
+    if store is None:
+        return {}
+
+    return dict(store.names)
+
 
 def format_price_dict_with_names(
     price_dict: Dict[str, Optional[float]], market: str = "us"
@@ -388,10 +415,17 @@ def format_price_dict_with_names(
     return formatted_dict
 
 
+def _parse_trading_time(date_str: str) -> Tuple[datetime, bool]:
+    """解析 YYYY-MM-DD 或 YYYY-MM-DD HH:MM:SS，返回 (datetime, 是否仅日期)。"""
+    if " " in date_str:
+        return datetime.strptime(date_str, "%Y-%m-%d %H:%M:%S"), False
+    return datetime.strptime(date_str, "%Y-%m-%d"), True
+
+
 def get_yesterday_date(today_date: str, merged_path: Optional[str] = None, market: str = "us") -> str:
     """
     获取输入日期的上一个交易日或时间点。
-    从 merged.jsonl 读取所有可用的交易时间，然后找到 today_date 的上一个时间。
+    在 merged.jsonl 对应的有序交易日历（日线 / 60分钟线）上二分查找 today_date 的上一个时间。
     
     Args:
         today_date: 日期字符串，格式 YYYY-MM-DD 或 YYYY-MM-DD HH:MM:SS。
@@ -401,89 +435,55 @@ def get_yesterday_date(today_date: str, merged_path: Optional[str] = None, marke
     Returns:
         yesterday_date: 上一个交易日或时间点的字符串，格式与输入一致。
     """
-    # 解析输入日期/时间
-    if ' ' in today_date:
-        input_dt = datetime.strptime(today_date, "%Y-%m-%d %H:%M:%S")
-        date_only = False
-    else:
-        input_dt = datetime.strptime(today_date, "%Y-%m-%d")
-        date_only = True
-    
+    # 解析输入日期/时间，并规范化为日历中的字符串格式
+    input_dt, date_only = _parse_trading_time(today_date)
+    fmt = "%Y-%m-%d" if date_only else "%Y-%m-%d %H:%M:%S"
+
     # 获取 merged.jsonl 文件路径
     if merged_path is None:
         merged_file = get_merged_file_path(market)
     else:
         merged_file = Path(merged_path)
-    
-    if not merged_file.exists():
-        # 如果文件不存在，根据输入类型回退
+
+    store = get_market_store(market, merged_path)
+    if store is None:
         print(f"merged.jsonl file does not exist at {merged_file}")
-        if date_only:
-            yesterday_dt = input_dt - timedelta(days=1)
-            while yesterday_dt.weekday() >= 5:
-                yesterday_dt -= timedelta(days=1)
-            return yesterday_dt.strftime("%Y-%m-%d")
-        else:
-            yesterday_dt = input_dt - timedelta(hours=1)
-            return yesterday_dt.strftime("%Y-%m-%d %H:%M:%S")
-    
-    # 从 merged.jsonl 读取所有可用的交易时间
-    all_timestamps = set()
-    
-    with merged_file.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                doc = json.loads(line)
-                # 查找所有以 "Time Series" 开头的键
-                for key, value in doc.items():
-                    if key.startswith("Time Series"):
-                        if isinstance(value, dict):
-                            all_timestamps.update(value.keys())
-                        break
-            except Exception:
-                continue
-    
-    if not all_timestamps:
-        # 如果没有找到任何时间戳，根据输入类型回退
-        if date_only:
-            yesterday_dt = input_dt - timedelta(days=1)
-            while yesterday_dt.weekday() >= 5:
-                yesterday_dt -= timedelta(days=1)
-            return yesterday_dt.strftime("%Y-%m-%d")
-        else:
-            yesterday_dt = input_dt - timedelta(hours=1)
-            return yesterday_dt.strftime("%Y-%m-%d %H:%M:%S")
-    
-    # 将所有时间戳转换为 datetime 对象，并找到小于 today_date 的最大时间戳
-    previous_timestamp = None
-    
-    for ts_str in all_timestamps:
-        try:
-            ts_dt = datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S")
-            if ts_dt < input_dt:
-                if previous_timestamp is None or ts_dt > previous_timestamp:
-                    previous_timestamp = ts_dt
-        except Exception:
-            continue
-    
-    # 如果没有找到更早的时间戳，根据输入类型回退
-    if previous_timestamp is None:
-        if date_only:
-            yesterday_dt = input_dt - timedelta(days=1)
-            while yesterday_dt.weekday() >= 5:
-                yesterday_dt -= timedelta(days=1)
-            return yesterday_dt.strftime("%Y-%m-%d")
-        else:
-            yesterday_dt = input_dt - timedelta(hours=1)
-            return yesterday_dt.strftime("%Y-%m-%d %H:%M:%S")
+        previous_timestamp = None
+    else:
+        previous_timestamp = store.previous_timestamp(input_dt.strftime(fmt))
+
+    if previous_timestamp is not None:
+        return previous_timestamp
 
-    # 返回结果
+    # 文件不存在或没有更早的时间戳，根据输入类型回退
     if date_only:
-        return previous_timestamp.strftime("%Y-%m-%d")
+        yesterday_dt = input_dt - timedelta(days=1)
+        while yesterday_dt.weekday() >= 5:
+            yesterday_dt -= timedelta(days=1)
     else:
-        return previous_timestamp.strftime("%Y-%m-%d %H:%M:%S")
+        yesterday_dt = input_dt - timedelta(hours=1)
+    return yesterday_dt.strftime(fmt)
+
+
+def get_next_date(today_date: str, merged_path: Optional[str] = None, market: str = "us") -> Optional[str]:
+    """
+    获取输入日期的下一个交易日或时间点。
+
+    Args:
+        today_date: 日期字符串，格式 YYYY-MM-DD 或 YYYY-MM-DD HH:MM:SS。
+        merged_path: 可选，自定义 merged.jsonl 路径；默认根据 market 参数读取对应市场的 merged.jsonl。
+        market: 市场类型，"us" 为美股，"cn" 为A股
+
+    Returns:
+        下一个交易日或时间点的字符串，格式与输入一致；若已是最后一个交易时间则返回 None。
+    """
+    input_dt, date_only = _parse_trading_time(today_date)
+    fmt = "%Y-%m-%d" if date_only else "%Y-%m-%d %H:%M:%S"
+
+    store = get_market_store(market, merged_path)
+    if store is None:
+        return None
+    return store.next_timestamp(input_dt.strftime(fmt))
 
 
 
@@ -501,46 +501,18 @@ def get_open_prices(
     Returns:
         {symbol_price: open_price 或 None} 的字典；若未找到对应日期或标的，则值为 None。
     """
-    wanted = set(symbols)
+    wanted = list(dict.fromkeys(symbols))
     results: Dict[str, Optional[float]] = {}
 
-    if merged_path is None:
-        merged_file = get_merged_file_path(market)
-    else:
-        merged_file = Path(merged_path)
-
-    if not merged_file.exists():
+    store = get_market_store(market, merged_path)
+    if store is None:
         return results
 
-    with merged_file.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                doc = json.loads(line)
-            except Exception:
-                continue
-            meta = doc.get("Meta Data", {}) if isinstance(doc, dict) else {}
-            sym = meta.get("2. Symbol")
-            if sym not in wanted:
-                continue
-            # 查找所有以 "Time Series" 开头的键
-            series = None
-            for key, value in doc.items():
-                if key.startswith("Time Series"):
-                    series = value
-                    break
-            if not isinstance(series, dict):
-                continue
-            bar = series.get(today_date)
-            
-            if isinstance(bar, dict):
-                open_val = bar.get("1. buy price")
-                
-                try:
-                    results[f"{sym}_price"] = float(open_val) if open_val is not None else None
-                except Exception:
-                    results[f"{sym}_price"] = None
+    for sym in wanted:
+        bar = store.get_bar(sym, today_date)
+        if bar is None:
+            continue
+        results[f"{sym}_price"] = bar.open
 
     return results
 
@@ -559,96 +531,87 @@ def get_yesterday_open_and_close_price(
     Returns:
         (买入价字典, 卖出价字典) 的元组；若未找到对应日期或标的，则值为 None。
     """
-    wanted = set(symbols)
+    wanted = list(dict.fromkeys(symbols))
     buy_results: Dict[str, Optional[float]] = {}
     sell_results: Dict[str, Optional[float]] = {}
 
-    if merged_path is None:
-        merged_file = get_merged_file_path(market)
-    else:
-        merged_file = Path(merged_path)
-
-    if not merged_file.exists():
+    store = get_market_store(market, merged_path)
+    if store is None:
         return buy_results, sell_results
 
     yesterday_date = get_yesterday_date(today_date, merged_path=merged_path, market=market)
 
-    with merged_file.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                doc = json.loads(line)
-            except Exception:
-                continue
-            meta = doc.get("Meta Data", {}) if isinstance(doc, dict) else {}
-            sym = meta.get("2. Symbol")
-            if sym not in wanted:
-                continue
-            # 查找所有以 "Time Series" 开头的键
-            series = None
-            for key, value in doc.items():
-                if key.startswith("Time Series"):
-                    series = value
-                    break
-            if not isinstance(series, dict):
-                continue
+    for sym in wanted:
+        if not store.has_symbol(sym):
+            continue
 
-            # 尝试获取昨日买入价和卖出价
-            bar = series.get(yesterday_date)
-            if isinstance(bar, dict):
-                buy_val = bar.get("1. buy price")  # 买入价字段
-                sell_val = bar.get("4. sell price")  # 卖出价字段
-
-                try:
-                    buy_price = float(buy_val) if buy_val is not None else None
-                    sell_price = float(sell_val) if sell_val is not None else None
-                    buy_results[f"{sym}_price"] = buy_price
-                    sell_results[f"{sym}_price"] = sell_price
-                except Exception:
-                    buy_results[f"{sym}_price"] = None
-                    sell_results[f"{sym}_price"] = None
-            else:
-                # 如果昨日没有数据，尝试向前查找最近的交易日
-                # raise ValueError(f"No data found for {sym} on {yesterday_date}")
-                # print(f"No data found for {sym} on {yesterday_date}")
-                buy_results[f'{sym}_price'] = None
-                sell_results[f'{sym}_price'] = None
-                # today_dt = datetime.strptime(today_date, "%Y-%m-%d")
-                # yesterday_dt = today_dt - timedelta(days=1)
-                # current_date = yesterday_dt
-                # found_data = False
-                
-                # # 最多向前查找5个交易日
-                # for _ in range(5):
-                #     current_date -= timedelta(days=1)
-                #     # 跳过周末
-                #     while current_date.weekday() >= 5:
-                #         current_date -= timedelta(days=1)
-                    
-                #     check_date = current_date.strftime("%Y-%m-%d")
-                #     bar = series.get(check_date)
-                #     if isinstance(bar, dict):
-                #         buy_val = bar.get("1. buy price")
-                #         sell_val = bar.get("4. sell price")
-                        
-                #         try:
-                #             buy_price = float(buy_val) if buy_val is not None else None
-                #             sell_price = float(sell_val) if sell_val is not None else None
-                #             buy_results[f'{sym}_price'] = buy_price
-                #             sell_results[f'{sym}_price'] = sell_price
-                #             found_data = True
-                #             break
-                #         except Exception:
-                #             continue
-                
-                # if not found_data:
-                #     buy_results[f'{sym}_price'] = None
-                #     sell_results[f'{sym}_price'] = None
+        # 尝试获取昨日买入价和卖出价
+        bar = store.get_bar(sym, yesterday_date)
+        if bar is not None:
+            # 价格已在加载时解析为 float：open 为买入价，close 为卖出价
+            buy_results[f"{sym}_price"] = bar.open
+            sell_results[f"{sym}_price"] = bar.close
+        else:
+            # 昨日没有数据
+            buy_results[f"{sym}_price"] = None
+            sell_results[f"{sym}_price"] = None
 
     return buy_results, sell_results
 
 
+def get_price_matrix(
+    symbols: List[str],
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    merged_path: Optional[str] = None,
+    market: str = "us",
+):
+    """一次性读取多个标的在时间区间内的价格矩阵，替代逐日、逐标的的查询。
+
+    Args:
+        symbols: 需要查询的股票代码列表。
+        start_date: 起始时间（含），格式 YYYY-MM-DD 或 YYYY-MM-DD HH:MM:SS；None 表示不限。
+        end_date: 结束时间（含），格式同上；仅日期时包含当天所有小时线。None 表示不限。
+        fields: 字段列表，取值为 "open"(买入价), "high", "low", "close"(卖出价), "volume"；默认全部字段。
+        merged_path: 可选，自定义 merged.jsonl 路径；默认根据 market 参数读取对应市场的 merged.jsonl。
+        market: 市场类型，"us" 为美股，"cn" 为A股，"crypto" 为加密货币
+
+    Returns:
+        pandas.DataFrame：index 为时间戳字符串，columns 为 (field, symbol) 的 MultiIndex，缺失值为 NaN。
+        例如 df["close"] 即为各标的的卖出价矩阵。
+    """
+    import pandas as pd
+
+    from tools.price_arrays import FIELDS, get_price_arrays
+
+    fields = list(fields) if fields else list(FIELDS)
+    symbols = list(dict.fromkeys(symbols))
+    columns = pd.MultiIndex.from_product([fields, symbols], names=["field", "symbol"])
+
+    source = None
+    backend = get_config_value("PRICE_BACKEND", "jsonl") if merged_path is None else "jsonl"
+    if backend == "sqlite":
+        from tools.price_db import get_sqlite_price_store
+
+        # SQLite 后端直接在 (market, symbol, ts) 主键上做区间扫描
+        source = get_sqlite_price_store(market)
+    elif backend == "parquet":
+        from tools.price_parquet import get_parquet_source
+
+        # Parquet 后端按 symbol 分区裁剪，日期区间下推到 row group 统计信息
+        source = get_parquet_source(market)
+    if source is None:
+        source = get_price_arrays(get_merged_file_path(market) if merged_path is None else Path(merged_path))
+    if source is None:
+        return pd.DataFrame(index=pd.Index([], name="date"), columns=columns, dtype=float)
+
+    ts_axis, values = source.window(symbols, start_date, end_date, fields)
+    # [symbol, timestamp, field] -> [timestamp, field * symbol]
+    data = values.transpose(1, 2, 0).reshape(len(ts_axis), len(fields) * len(symbols))
+    return pd.DataFrame(data, index=pd.Index(ts_axis, name="date"), columns=columns)
+
+
 def get_yesterday_profit(
     today_date: str,
     yesterday_buy_prices: Dict[str, Optional[float]],
@@ -694,7 +657,9 @@ def get_yesterday_profit(
 
     return profit_dict
 
-def get_today_init_position(today_date: str, signature: str) -> Dict[str, float]:
+def get_today_init_position(
+    today_date: str, signature: str, symbols: Optional[List[str]] = None
+) -> Dict[str, float]:
     """
     获取今日开盘时的初始持仓（即文件中上一个交易日代表的持仓）。从../data/agent_data/{signature}/position/position.jsonl中读取。
     如果同一日期有多条记录，选择id最大的记录作为初始持仓。
@@ -702,62 +667,23 @@ def get_today_init_position(today_date: str, signature: str) -> Dict[str, float]
     Args:
         today_date: 日期字符串，格式 YYYY-MM-DD，代表今天日期。
         signature: 模型名称，用于构建文件路径。
+        symbols: 可选，传入时展开为包含所有标的（未持有为 0）的完整持仓；
+                 默认按 POSITION_MODE 返回（sparse 模式下只含非零持仓和 CASH）。
 
     Returns:
         {symbol: weight} 的字典；若未找到对应日期，则返回空字典。
     """
-    from tools.general_tools import get_config_value
-    import os
-
-    base_dir = Path(__file__).resolve().parents[1]
-
-    # Get log_path from config, default to "agent_data" for backward compatibility
-    log_path = get_config_value("LOG_PATH", "./data/agent_data")
-
-    # Handle different path formats:
-    # - If it's an absolute path (like temp directory), use it directly
-    # - If it's a relative path starting with "./data/", remove the prefix and prepend base_dir/data
-    # - Otherwise, treat as relative to base_dir/data
-    if os.path.isabs(log_path):
-        # Absolute path (like temp directory) - use directly
-        position_file = Path(log_path) / signature / "position" / "position.jsonl"
-    else:
-        if log_path.startswith("./data/"):
-            log_path = log_path[7:]  # Remove "./data/" prefix
-        position_file = base_dir / "data" / log_path / signature / "position" / "position.jsonl"
-#     position_file = base_dir / "data" / "agent_data" / signature / "position" / "position.jsonl"
-
+    position_file = get_position_file(signature)
     if not position_file.exists():
         print(f"Position file {position_file} does not exist")
         return {}
-    
-    # 获取市场类型，智能判断
-    market = get_market_type()
-    yesterday_date = get_yesterday_date(today_date, market=market)
-    
-    max_id = -1
-    latest_positions = {}
-    all_records = []
-  
-    with position_file.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                doc = json.loads(line)
-                record_date = doc.get("date")
-                if record_date and record_date < today_date:
-                    all_records.append(doc)
-            except Exception:
-                continue
 
-    if not all_records:
+    # 今天之前 (date, id) 最大的记录
+    record = open_position_ledger(signature).latest_before(today_date)
+    if record is None:
         return {}
-
-    # Sort by date (descending) then by id (descending) to get the most recent record
-    all_records.sort(key=lambda x: (x.get("date", ""), x.get("id", 0)), reverse=True)
-
-    return all_records[0].get("positions", {})
+    positions = format_positions(dict(record.get("positions", {})))
+    return to_dense(positions, symbols) if symbols is not None else positions
 
 
 def get_latest_position(today_date: str, signature: str) -> Tuple[Dict[str, float], int]:
@@ -775,95 +701,32 @@ def get_latest_position(today_date: str, signature: str) -> Tuple[Dict[str, floa
           - positions: {symbol: weight} 的字典；若未找到任何记录，则为空字典。
           - max_id: 选中记录的最大 id；若未找到任何记录，则为 -1.
     """
-    from tools.general_tools import get_config_value
-    import os
-
-    base_dir = Path(__file__).resolve().parents[1]
-
-    # Get log_path from config, default to "agent_data" for backward compatibility
-    log_path = get_config_value("LOG_PATH", "./data/agent_data")
-
-    # Handle different path formats:
-    # - If it's an absolute path (like temp directory), use it directly
-    # - If it's a relative path starting with "./data/", remove the prefix and prepend base_dir/data
-    # - Otherwise, treat as relative to base_dir/data
-    if os.path.isabs(log_path):
-        # Absolute path (like temp directory) - use directly
-        position_file = Path(log_path) / signature / "position" / "position.jsonl"
-    else:
-        if log_path.startswith("./data/"):
-            log_path = log_path[7:]  # Remove "./data/" prefix
-        position_file = base_dir / "data" / log_path / signature / "position" / "position.jsonl"
-
+    position_file = get_position_file(signature)
     if not position_file.exists():
         return {}, -1
 
-    # 获取市场类型，智能判断
-    market = get_market_type()
-    
+    # PositionLedger 只解析上次读取之后追加的行，每条日期的最新记录都已在内存中；
+    # POSITION_BACKEND=sqlite 时走 (signature, date, id) 索引查询
+    ledger = open_position_ledger(signature)
+
     # Step 1: 先查找当天的记录
-    max_id_today = -1
-    latest_positions_today: Dict[str, float] = {}
-    
-    with position_file.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                doc = json.loads(line)
-                if doc.get("date") == today_date:
-                    current_id = doc.get("id", -1)
-                    if current_id > max_id_today:
-                        max_id_today = current_id
-                        latest_positions_today = doc.get("positions", {})
-            except Exception:
-                continue
-    
-    # 如果当天有记录，直接返回
-    if max_id_today >= 0 and latest_positions_today:
-        return latest_positions_today, max_id_today
-    
+    record = ledger.latest_on(today_date)
+    if record is not None and record.get("id", -1) >= 0 and record.get("positions"):
+        return dict(record["positions"]), record["id"]
+
     # Step 2: 当天没有记录，则回退到上一个交易日
+    market = get_market_type()
     prev_date = get_yesterday_date(today_date, market=market)
-    
-    max_id_prev = -1
-    latest_positions_prev: Dict[str, float] = {}
+    record = ledger.latest_on(prev_date)
+
+    # 如果前一天也没有记录，取今天之前最新的记录（按日期和id）
+    if record is None or record.get("id", -1) < 0 or not record.get("positions"):
+        record = ledger.latest_before(today_date)
+        if record is None:
+            return {}, -1
+
+    return dict(record.get("positions", {})), record.get("id", -1)
 
-    with position_file.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                doc = json.loads(line)
-                if doc.get("date") == prev_date:
-                    current_id = doc.get("id", -1)
-                    if current_id > max_id_prev:
-                        max_id_prev = current_id
-                        latest_positions_prev = doc.get("positions", {})
-            except Exception:
-                continue
-    
-    # 如果前一天也没有记录，尝试找文件中最新的记录（按日期和id排序）
-    if max_id_prev < 0 or not latest_positions_prev:
-        all_records = []
-        with position_file.open("r", encoding="utf-8") as f:
-            for line in f:
-                if not line.strip():
-                    continue
-                try:
-                    doc = json.loads(line)
-                    if doc.get("date") and doc.get("date") < today_date:
-                        all_records.append(doc)
-                except Exception:
-                    continue
-        
-        if all_records:
-            # 按日期和id排序，取最新的一条
-            all_records.sort(key=lambda x: (x.get("date", ""), x.get("id", 0)), reverse=True)
-            latest_positions_prev = all_records[0].get("positions", {})
-            max_id_prev = all_records[0].get("id", -1)
-    
-    return latest_positions_prev, max_id_prev
 
 def add_no_trade_record(today_date: str, signature: str):
     """
@@ -875,37 +738,21 @@ def add_no_trade_record(today_date: str, signature: str):
     Returns:
         None
     """
-    save_item = {}
-    current_position, current_action_id = get_latest_position(today_date, signature)
-    
-    save_item["date"] = today_date
-    save_item["id"] = current_action_id + 1
-    save_item["this_action"] = {"action": "no_trade", "symbol": "", "amount": 0}
+    from tools.position_lock import get_position_lock
 
-    save_item["positions"] = current_position
+    ledger = open_position_ledger(signature)
+    # 与交易工具共用同一把 (log_path, signature) 锁，避免与并发的 buy/sell 交错
+    with get_position_lock(signature), ledger.transaction():
+        save_item = {}
+        current_position, current_action_id = get_latest_position(today_date, signature)
 
-    from tools.general_tools import get_config_value
-    import os
+        save_item["date"] = today_date
+        save_item["id"] = current_action_id + 1
+        save_item["this_action"] = {"action": "no_trade", "symbol": "", "amount": 0}
 
-    base_dir = Path(__file__).resolve().parents[1]
-
-    # Get log_path from config, default to "agent_data" for backward compatibility
-    log_path = get_config_value("LOG_PATH", "./data/agent_data")
-
-    # Handle different path formats:
-    # - If it's an absolute path (like temp directory), use it directly
-    # - If it's a relative path starting with "./data/", remove the prefix and prepend base_dir/data
-    # - Otherwise, treat as relative to base_dir/data
-    if os.path.isabs(log_path):
-        # Absolute path (like temp directory) - use directly
-        position_file = Path(log_path) / signature / "position" / "position.jsonl"
-    else:
-        if log_path.startswith("./data/"):
-            log_path = log_path[7:]  # Remove "./data/" prefix
-        position_file = base_dir / "data" / log_path / signature / "position" / "position.jsonl"
+        save_item["positions"] = current_position
 
-    with position_file.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(save_item) + "\n")
+        ledger.append(save_item)
     return
 
 
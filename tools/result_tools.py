@@ -1,6 +1,7 @@
 import json
 import os
 import sys
+import warnings
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
@@ -14,6 +15,7 @@ if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
 from tools.general_tools import get_config_value
+from tools.position_ledger import get_position_file, get_position_ledger
 from tools.price_tools import (all_nasdaq_100_symbols, get_latest_position,
                                get_open_prices, get_today_init_position,
                                get_yesterday_date,
@@ -52,6 +54,17 @@ def calculate_portfolio_value(
     return total_value
 
 
+def _signature_arg(signature: Optional[str], modelname: Optional[str]) -> str:
+    """Resolve the deprecated modelname= keyword of the metrics functions (renamed to signature)"""
+    if modelname is not None:
+        warnings.warn("modelname= is deprecated, use signature=", DeprecationWarning, stacklevel=3)
+        if signature is None:
+            signature = modelname
+    if signature is None:
+        raise TypeError("missing required argument: 'signature'")
+    return signature
+
+
 def get_available_date_range(signature: str) -> Tuple[str, str]:
     """
     Get available data date range
@@ -62,43 +75,24 @@ def get_available_date_range(signature: str) -> Tuple[str, str]:
     Returns:
         Tuple of (earliest date, latest date) in YYYY-MM-DD format
     """
-    from tools.general_tools import get_config_value
-
-    base_dir = Path(__file__).resolve().parents[1]
-
-    # Get log_path from config, default to "agent_data" for backward compatibility
-    log_path = get_config_value("LOG_PATH", "./data/agent_data")
-    if log_path.startswith("./data/"):
-        log_path = log_path[7:]  # Remove "./data/" prefix
-
-    position_file = base_dir / "data" / log_path / signature / "position" / "position.jsonl"
-
+    position_file = get_position_file(signature)
     if not position_file.exists():
         return "", ""
 
-    dates = []
-
-    with position_file.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                doc = json.loads(line)
-                date = doc.get("date")
-                if date:
-                    dates.append(date)
-            except Exception:
-                continue
-
-    if not dates:
+    # 每个日期的最新记录，按日期排序
+    records = get_position_ledger(position_file).range()
+    if not records:
         return "", ""
 
-    dates.sort()
-    return dates[0], dates[-1]
+    return records[0]["date"], records[-1]["date"]
 
 
 def get_daily_portfolio_values(
-    modelname: str, start_date: Optional[str] = None, end_date: Optional[str] = None, market: str = "us"
+    signature: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    market: str = "us",
+    modelname: Optional[str] = None,
 ) -> Dict[str, float]:
     """
     Get daily portfolio values
@@ -108,22 +102,16 @@ def get_daily_portfolio_values(
         start_date: Start date in YYYY-MM-DD format, uses earliest date if None
         end_date: End date in YYYY-MM-DD format, uses latest date if None
         market: Market type, "us" for US stocks or "cn" for A-shares
+        modelname: Deprecated alias of signature
 
     Returns:
         Dictionary of daily portfolio values in format {date: portfolio_value}
     """
-    from tools.general_tools import get_config_value
+    signature = _signature_arg(signature, modelname)
     from tools.price_tools import (all_nasdaq_100_symbols, all_sse_50_symbols,
-                                   get_merged_file_path)
-
-    base_dir = Path(__file__).resolve().parents[1]
+                                   get_merged_file_path, get_price_matrix)
 
-    # Get log_path from config, default to "agent_data" for backward compatibility
-    log_path = get_config_value("LOG_PATH", "./data/agent_data")
-    if log_path.startswith("./data/"):
-        log_path = log_path[7:]  # Remove "./data/" prefix
-
-    position_file = base_dir / "data" / log_path / signature / "position" / "position.jsonl"
+    position_file = get_position_file(signature)
     merged_file = get_merged_file_path(market)
 
     if not position_file.exists() or not merged_file.exists():
@@ -140,77 +128,29 @@ def get_daily_portfolio_values(
         if end_date is None:
             end_date = latest_date
 
-    # Read position data
-    position_data = []
-    with position_file.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                doc = json.loads(line)
-                position_data.append(doc)
-            except Exception:
-                continue
-
-    # Read price data
-    price_data = {}
-    with merged_file.open("r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            try:
-                doc = json.loads(line)
-                meta = doc.get("Meta Data", {})
-                symbol = meta.get("2. Symbol")
-                if symbol:
-                    # 查找所有以 "Time Series" 开头的键
-                    series = None
-                    for key, value in doc.items():
-                        if key.startswith("Time Series"):
-                            series = value
-                            break
-                    price_data[symbol] = series if series else {}
-            except Exception:
-                continue
+    # Latest record of each date in [start_date, end_date]; the ledger rebuilds positions stored as snapshot + delta records
+    latest_records = get_position_ledger(position_file).range(start_date, end_date)
 
     # Select stock symbols based on market
     stock_symbols = all_sse_50_symbols if market == "cn" else all_nasdaq_100_symbols
 
+    # Read closing (sell) prices of all symbols over the whole range in one batch
+    close_prices = get_price_matrix(stock_symbols, start_date, end_date, fields=["close"], market=market)["close"]
+
     # Calculate daily portfolio values
     daily_values = {}
 
-    # Group position data by date
-    positions_by_date = {}
-    for record in position_data:
-        date = record.get("date")
-        if date:
-            if date not in positions_by_date:
-                positions_by_date[date] = []
-            positions_by_date[date].append(record)
-
-    # For each date, sort records by id and take latest position
-    for date, records in positions_by_date.items():
-        if start_date and date < start_date:
-            continue
-        if end_date and date > end_date:
-            continue
-
-        # Sort by id and take latest position
-        latest_record = max(records, key=lambda x: x.get("id", 0))
+    # For each date, take the latest position
+    for latest_record in latest_records:
+        date = latest_record["date"]
         positions = latest_record.get("positions", {})
 
-        # Get daily prices
+        # Get daily prices, use closing (sell) price to calculate value
         daily_prices = {}
-        for symbol in stock_symbols:
-            if symbol in price_data:
-                symbol_prices = price_data[symbol]
-                if date in symbol_prices:
-                    price_info = symbol_prices[date]
-                    buy_price = price_info.get("1. buy price")
-                    sell_price = price_info.get("4. sell price")
-                    # Use closing (sell) price to calculate value
-                    if sell_price is not None:
-                        daily_prices[f"{symbol}_price"] = float(sell_price)
+        if date in close_prices.index:
+            for symbol, sell_price in close_prices.loc[date].items():
+                if not np.isnan(sell_price):
+                    daily_prices[f"{symbol}_price"] = float(sell_price)
 
         # Calculate portfolio value
         cash = positions.get("CASH", 0.0)
@@ -452,7 +392,11 @@ def calculate_profit_loss_ratio(returns: List[float]) -> float:
 
 
 def calculate_all_metrics(
-    modelname: str, start_date: Optional[str] = None, end_date: Optional[str] = None, market: str = "us"
+    signature: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    market: str = "us",
+    modelname: Optional[str] = None,
 ) -> Dict[str, any]:
     """
     Calculate all performance metrics
@@ -462,10 +406,12 @@ def calculate_all_metrics(
         start_date: Start date in YYYY-MM-DD format, uses earliest date if None
         end_date: End date in YYYY-MM-DD format, uses latest date if None
         market: Market type, "us" for US stocks or "cn" for A-shares
+        modelname: Deprecated alias of signature
 
     Returns:
         Dictionary containing all metrics
     """
+    signature = _signature_arg(signature, modelname)
     # Get available date range if not specified
     if start_date is None or end_date is None:
         earliest_date, latest_date = get_available_date_range(signature)
@@ -494,7 +440,7 @@ def calculate_all_metrics(
             end_date = latest_date
 
     # 获取每日投资组合价值
-    portfolio_values = get_daily_portfolio_values(modelname, start_date, end_date, market)
+    portfolio_values = get_daily_portfolio_values(signature, start_date, end_date, market)
 
     if not portfolio_values:
         return {
@@ -763,7 +709,10 @@ def get_latest_metrics(signature: str, output_dir: Optional[str] = None) -> Opti
 
 
 def get_metrics_history(
-    modelname: str, output_dir: Optional[str] = None, limit: Optional[int] = None
+    signature: Optional[str] = None,
+    output_dir: Optional[str] = None,
+    limit: Optional[int] = None,
+    modelname: Optional[str] = None,
 ) -> List[Dict[str, any]]:
     """
     Get performance metrics history
@@ -772,10 +721,12 @@ def get_metrics_history(
         signature: Model name
         output_dir: Output directory, defaults to data/agent_data/{signature}/metrics/
         limit: Limit number of records returned, None returns all records
+        modelname: Deprecated alias of signature
 
     Returns:
         List of metrics records, sorted by ID
     """
+    signature = _signature_arg(signature, modelname)
     from tools.general_tools import get_config_value
 
     base_dir = Path(__file__).resolve().parents[1]
@@ -866,12 +817,13 @@ def print_metrics_summary(signature: str, output_dir: Optional[str] = None) -> N
 
 
 def calculate_and_save_metrics(
-    modelname: str,
+    signature: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     output_dir: Optional[str] = None,
     print_report: bool = True,
     market: str = "us",
+    modelname: Optional[str] = None,
 ) -> Dict[str, any]:
     """
     Entry function to calculate all metrics and save in JSONL format
@@ -883,10 +835,12 @@ def calculate_and_save_metrics(
         output_dir: Output directory, defaults to data/agent_data/{signature}/metrics/
         print_report: Whether to print report
         market: Market type ("us" or "cn")
+        modelname: Deprecated alias of signature
 
     Returns:
         Dictionary containing all metrics and saved file path
     """
+    signature = _signature_arg(signature, modelname)
     print(f"Analyzing model: {signature}")
     
     # Show date range to be used if not specified